@@ -2,12 +2,26 @@
 #
 # This package contains:
 #   ee_utils         - Earth Engine initialization and cloud masking
-#   classification   - Vegetation classification model and constants
+#   classification   - Vegetation classification model, shared model registry and constants
 #   analysis_worker  - AnalysisWorker QThread for data analysis
+#   geometry_pipeline - Field polygon cleanup (precision, repair, simplification) before EE
 #   map_layer_worker - MapLayerWorker QThread for map tile generation
 #   database         - LicenseManager (Firebase)
 #   cache_utils      - AnalysisCache (SQLite)
 #   weather_service  - WeatherWorker (Open-Meteo API)
-#   historical_analysis - TrendWorker for historical trends
+#   weather_analytics - Cached daily weather, GDD / water balance / heat stress
+#   historical_analysis - TrendWorker / MultiYearTrendWorker for historical trends
+#   trend_series     - TrendSeries columnar (classes x indices x dates) trend data,
+#                      MultiYearSeries seasons aligned by day of year
+#   smoothing        - Vectorized gap-filling / smoothing of index time series
+#   phenology_metrics - SOS / EOS / peak / green-up extraction and stage estimate
+#   landcover_history - Multi-year class shares and crop-rotation statistics
+#   climatology      - Same-date multi-year index baseline and anomaly z-scores
 #   map_utils        - Map HTML generation
-#   geo_utils        - GeoJSON/view parsing utilities
+#   tile_proxy       - Local disk-caching HTTP proxy for map tiles
+#   map_id_cache     - Map ids cached per layer recipe, refreshed before they expire
+#   image_selection  - Shared, memoized S2 scene resolution for the stats and the map layer
+#   class_raster     - Downloaded class rasters coloured locally into map overlays
+#   thumbnails       - Parallel, disk-cached RGB previews of candidate scenes
+#   saved_fields     - Compact (simplified, quantized) saved-field outlines for the map
+#   geo_utils        - Saved-location navigation helpers
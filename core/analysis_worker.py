@@ -1,12 +1,30 @@
 import ee
 from PyQt5.QtCore import QThread, pyqtSignal
 from datetime import datetime
-from core.ee_utils import mask_s2_clouds
 from core.database import LicenseManager
-from core.cache_utils import cache_manager
+from core.cache_utils import cache_manager, geometry_hash
 from core.classification import (
-    build_classification_model, PRODUCT_LABELS, ID_TO_PALETTE_IDX, PALETTE_COLORS
+    get_classification_model, fetch_class_histograms, model_key, histogram_is_final, PRODUCT_LABELS,
+    ID_TO_PALETTE_IDX, PALETTE_COLORS
 )
+from core.climatology import climatology_request, cached_climatology, store_climatology, anomalies
+from core.map_id_cache import layer_url
+from core.class_raster import fetch_class_raster, overlay_url
+from core.image_selection import resolve_selection, target_image as target_image_of, s2_collection
+from core.thumbnails import attach_thumbnails
+from core.geometry_pipeline import to_ee_geometry
+
+# Baseline windows for change detection, all fetched in the master request:
+# key -> (label, offset, offset unit, half window in days)
+BASELINE_WINDOWS = {
+    '30d': ("30 days ago", -30, 'day', 7),
+    '60d': ("60 days ago", -60, 'day', 7),
+    '1y': ("Same date last year", -1, 'year', 10),
+}
+
+
+def normalized_difference(a, b):
+    return (a - b) / (a + b) if a is not None and b is not None and (a + b) != 0 else None
 
 
 class AnalysisWorker(QThread):
@@ -53,15 +71,8 @@ class AnalysisWorker(QThread):
         self.status_signal.emit(f"License Approved: {message}")
 
         try:
-            if isinstance(self.geo_data, dict):
-                if 'geometry' in self.geo_data:
-                    raw_geometry = ee.Geometry(self.geo_data['geometry'])
-                else:
-                    raw_geometry = ee.Geometry(self.geo_data)
-            else:
-                raw_geometry = self.geo_data
-
-            self.geometry = raw_geometry
+            # Simplified / repaired before anything is sent to EE
+            self.geometry = to_ee_geometry(self.geo_data)
 
             # --- 0. CACHE CHECK ---
             print("DEBUG: Checking Cache...")
@@ -79,39 +90,27 @@ class AnalysisWorker(QThread):
             target_image = None
             ee_current_date = ee.Date(self.date1)
 
-            # --- 1. IMAGE IDENTIFICATION (Metadata Checks) ---
+            # --- 1. IMAGE IDENTIFICATION (shared with MapLayerWorker, resolved once) ---
             try:
-                if self.mode == "range":
-                    target_image = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                                    .filterBounds(self.geometry)
-                                    .filterDate(self.date1, self.date2)
-                                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                                    .map(mask_s2_clouds).median())
-                elif self.mode == "single":
-                    found_exact = False
-                    if not self.specific_date:
-                        exact_date_str = self.find_exact_match(ee_current_date)
-                        if exact_date_str:
-                            self.specific_date = exact_date_str
-                            self.status_signal.emit(f"✓ Exact cloudy-free image found: {exact_date_str}")
-                            found_exact = True
-
-                    if self.specific_date:
-                        self.status_signal.emit(f"Processing target date: {self.specific_date}...")
-                        t_date = ee.Date(self.specific_date)
-                        target_image = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                                        .filterBounds(self.geometry)
-                                        .filterDate(t_date, t_date.advance(1, 'day'))
-                                        .map(mask_s2_clouds).first())
-                    else:
-                        self.status_signal.emit(f"Searching for best images around {self.date1}...")
-                        candidates = self.find_candidates(ee_current_date)
-                        if candidates:
-                            self.date_selection_signal.emit(candidates)
-                            return
-                        else:
-                            self.error_signal.emit("No suitable images found.")
-                            return
+                if self.mode == "single" and not self.specific_date:
+                    self.status_signal.emit(f"Searching for best images around {self.date1}...")
+                selection = resolve_selection(self.geometry, model_key(self.geo_data), self.mode,
+                                              self.date1, self.date2, self.specific_date)
+                if selection['kind'] == 'candidates':
+                    self.status_signal.emit("Preparing previews of the closest images...")
+                    candidates = [dict(c) for c in selection['candidates']]
+                    attach_thumbnails(self.geometry, model_key(self.geo_data), candidates)
+                    self.date_selection_signal.emit(candidates)
+                    return
+                if selection['kind'] == 'none':
+                    self.error_signal.emit("No suitable images found.")
+                    return
+                if selection.get('exact'):
+                    self.specific_date = selection['date']
+                    self.status_signal.emit(f"✓ Exact cloudy-free image found: {selection['date']}")
+                elif self.specific_date:
+                    self.status_signal.emit(f"Processing target date: {self.specific_date}...")
+                target_image = target_image_of(self.geometry, selection)
             except Exception as e:
                 self.error_signal.emit(f"Image error: {e}")
                 return
@@ -142,16 +141,26 @@ class AnalysisWorker(QThread):
                 # B. Historical Data Prep
                 past_start = ee_current_date.advance(-45, 'day')
                 past_end = ee_current_date.advance(-15, 'day')
-                past_image = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                              .filterBounds(self.geometry)
-                              .filterDate(past_start, past_end)
-                              .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                              .map(mask_s2_clouds).median())
+                past_image = s2_collection(self.geometry, past_start, past_end).median()
                 
                 past_stats = past_image.select(['B4', 'B8']).reduceRegion(
                     reducer=ee.Reducer.mean(), geometry=self.geometry, scale=10, maxPixels=1e9
                 )
                 master_request['past_stats'] = past_stats
+
+                # B2. Configurable baseline windows (same request, no extra round trip),
+                # centred on the date the analysis represents like the climatology below
+                clim_date = self.reference_date()
+                ee_reference_date = ee.Date(clim_date)
+                master_request['baselines'] = ee.Dictionary(
+                    {key: self.baseline_stats(ee_reference_date, offset, unit, half_window)
+                     for key, (_, offset, unit, half_window) in BASELINE_WINDOWS.items()})
+
+                # C2. Same-date climatology (previous years), only fetched once per field/date
+                clim_key = geometry_hash(self.geo_data) if isinstance(self.geo_data, dict) else model_key(self.geometry)
+                climatology = cached_climatology(clim_key, clim_date)
+                if climatology is None:
+                    master_request['climatology'] = climatology_request(self.geometry, clim_date)
             
             # C. Radar (S1) Data Prep
             s1 = (ee.ImageCollection('COPERNICUS/S1_GRD')
@@ -198,6 +207,8 @@ class AnalysisWorker(QThread):
             results = ee.Dictionary(master_request).getInfo()
             
             # --- 4. PROCESS RESULTS ---
+            if 'climatology' in results:
+                climatology = store_climatology(clim_key, clim_date, results['climatology'])
             
             # A. Process Optical
             if 'optical_stats' in results:
@@ -231,6 +242,14 @@ class AnalysisWorker(QThread):
                              stats['ndvi_change'] = curr_ndvi - past_ndvi
                          else:
                              stats['past_ndvi'] = None
+
+                         # Process baseline windows: NDVI / NDMI and their change
+                         stats['baselines'] = self.process_baselines(stats, results.get('baselines') or {})
+
+                         # Anomaly against the same date in previous years
+                         if climatology:
+                             stats['climatology'] = climatology
+                             stats['anomaly_z'] = anomalies(stats, climatology)
             
             # B. Process Radar (Fallback or Merge)
             s1_data = results.get('s1_stats', {})
@@ -281,71 +300,46 @@ class AnalysisWorker(QThread):
             self.error_signal.emit(str(e))
 
 
-    def find_candidates(self, center_date):
-        """Finds best image before and after the center date."""
-        try:
-            candidates = []
-            
-            # 1. Search BEFORE
-            before_col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                          .filterBounds(self.geometry)
-                          .filterDate(center_date.advance(-60, 'day'), center_date)
-                          .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                          .sort('system:time_start', False)) # Closest to date first
-            
-            # Take the closest valid image
-            best_before = before_col.first()
-            info_before = best_before.getInfo()
-            
-            if info_before:
-                dt = info_before['properties']['system:time_start'] # ms
-                date_str = datetime.fromtimestamp(dt / 1000.0).strftime('%Y-%m-%d')
-                cloud_cov = info_before['properties']['CLOUDY_PIXEL_PERCENTAGE']
-                candidates.append({'label': 'BEFORE', 'date': date_str, 'cloud': cloud_cov})
-
-            # 2. Search AFTER
-            after_col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                          .filterBounds(self.geometry)
-                          .filterDate(center_date, center_date.advance(60, 'day'))
-                          .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 40))
-                          .sort('system:time_start', True)) # Closest to date first (ascending)
-            
-            best_after = after_col.first()
-            info_after = best_after.getInfo()
-            
-            if info_after:
-                dt = info_after['properties']['system:time_start'] # ms
-                date_str = datetime.fromtimestamp(dt / 1000.0).strftime('%Y-%m-%d')
-                cloud_cov = info_after['properties']['CLOUDY_PIXEL_PERCENTAGE']
-                candidates.append({'label': 'AFTER', 'date': date_str, 'cloud': cloud_cov})
-
-            return candidates
-
-        except Exception as e:
-            print(f"Candidate Search Error: {e}")
-            return []
-
-    def find_exact_match(self, date):
-        """Checks if the exact requested date (or very close) has a clean image."""
-        try:
-            col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                   .filterBounds(self.geometry)
-                   .filterDate(date, date.advance(1, 'day'))
-                   .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30)))
-            
-            img = col.first()
-            info = img.getInfo()
-            
-            if info:
-                dt = info['properties']['system:time_start']
-                date_str = datetime.fromtimestamp(dt / 1000.0).strftime('%Y-%m-%d')
-                cloud = info['properties']['CLOUDY_PIXEL_PERCENTAGE']
-                print(f"DEBUG: Exact match found! Date: {date_str}, Cloud: {cloud}")
-                return date_str
-            return None
-        except Exception as e:
-            print(f"Exact match check warning: {e}")
-            return None
+    def baseline_stats(self, ee_date, offset, unit, half_window):
+        """Band means of the median composite around 'ee_date' shifted by 'offset' 'unit's."""
+        center = ee_date.advance(offset, unit)
+        col = s2_collection(self.geometry, center.advance(-half_window, 'day'), center.advance(half_window, 'day'))
+        # Empty windows give an empty dict instead of failing the whole request
+        return ee.Algorithms.If(
+            col.size().gt(0),
+            col.median().select(['B4', 'B8', 'B11']).reduceRegion(
+                reducer=ee.Reducer.mean(), geometry=self.geometry, scale=10, maxPixels=1e9, bestEffort=True),
+            ee.Dictionary({}))
+
+    def process_baselines(self, stats, baselines):
+        """{key: {'label', 'ndvi', 'ndmi', 'ndvi_change', 'ndmi_change'}} for the windows with data."""
+        curr_ndvi = normalized_difference(stats.get('B8'), stats.get('B4'))
+        curr_ndmi = normalized_difference(stats.get('B8'), stats.get('B11'))
+        out = {}
+        for key, (label, _, _, _) in BASELINE_WINDOWS.items():
+            data = baselines.get(key) or {}
+            ndvi = normalized_difference(data.get('B8'), data.get('B4'))
+            ndmi = normalized_difference(data.get('B8'), data.get('B11'))
+            if ndvi is None and ndmi is None:
+                continue
+            out[key] = {
+                'label': label,
+                'ndvi': ndvi,
+                'ndmi': ndmi,
+                'ndvi_change': curr_ndvi - ndvi if curr_ndvi is not None and ndvi is not None else None,
+                'ndmi_change': curr_ndmi - ndmi if curr_ndmi is not None and ndmi is not None else None,
+            }
+        return out
+
+    def reference_date(self):
+        """Date the analysis represents: the chosen image date, or the middle of a range."""
+        if self.specific_date:
+            return self.specific_date[:10]
+        if self.mode == "range" and self.date2:
+            d1 = datetime.strptime(self.date1, "%Y-%m-%d")
+            d2 = datetime.strptime(self.date2, "%Y-%m-%d")
+            return (d1 + (d2 - d1) / 2).strftime("%Y-%m-%d")
+        return self.date1
 
 
 class PhenologyWorker(QThread):
@@ -361,19 +355,20 @@ class PhenologyWorker(QThread):
 
     def run(self):
         try:
-            classified, has_transition = build_classification_model(self.year, self.geometry)
+            # Keyed by the field as drawn (shared with the trend and forest caches),
+            # sent to EE after the geometry pipeline
+            self.field_key = model_key(self.geometry)
+            self.geometry = to_ee_geometry(self.geometry)
+
+            # Registered for reuse by the trend and forest workers
+            classified, has_transition = get_classification_model(self.year, self.geometry, field_key=self.field_key)
             
             if classified is None:
                 self.finished_signal.emit({"Insufficient Data": 100})
                 return
 
-            stats = classified.reduceRegion(reducer=ee.Reducer.frequencyHistogram(), geometry=self.geometry, scale=30,
-                                            maxPixels=1e9, tileScale=4).getInfo()
-
-            if not stats: self.finished_signal.emit({"No Result": 0}); return
-            values_view = list(stats.values())
-            if not values_view: self.finished_signal.emit({"No Data": 0}); return
-            histogram = values_view[0]
+            # Histogram from the per-year cache when available (shared with the forest analysis)
+            histogram = fetch_class_histograms([self.year], self.geometry, field_key=self.field_key)[self.year]
             if not histogram: self.finished_signal.emit({"No Data": 0}); return
 
             total = sum(histogram.values())
@@ -435,32 +430,42 @@ class PhenologyWorker(QThread):
                 
                 final_results['legend_colors'] = legend_colors
 
-                # EE Remap Logic
-                from_vals = [int(k) for k in id_to_palette_idx.keys()]
-                to_vals =   [v for v in id_to_palette_idx.values()]
-                
-                vis_classified = classified.remap(from_vals, to_vals).clip(self.geometry)
+                # Local overlay: class raster downloaded once, coloured with a palette LUT
+                # (product filtering is a local lookup, no new server image)
+                product = self.product_id if self.analysis_type == "product" and self.product_id else None
+                try:
+                    classes, bounds = fetch_class_raster(classified, self.geometry, self.field_key, self.year)
+                    final_results['tile_url'] = overlay_url(
+                        ('class', self.field_key, self.year, product), classes, bounds, product)
+                except Exception as e:
+                    print(f"Class raster unavailable, using map tiles: {e}")
+
+                if 'tile_url' not in final_results:
+                    # EE Remap Logic
+                    from_vals = [int(k) for k in id_to_palette_idx.keys()]
+                    to_vals =   [v for v in id_to_palette_idx.values()]
                 
-                # --- PRODUCT SCANNING MODE ---
-                if self.analysis_type == "product" and self.product_id:
-                    try:
-                        target_id = int(self.product_id)
-                        if str(target_id) in id_to_palette_idx:
-                            remapped_target = id_to_palette_idx[str(target_id)]
-                            vis_classified = vis_classified.updateMask(vis_classified.eq(remapped_target))
-                        else:
-                            print(f"Product ID {target_id} not in palette map")
-                    except Exception as e:
-                        print(f"Product Mask Error: {e}")
-
-                vis_params = {'min': 0, 'max': 12, 'palette': palette}
+                    vis_classified = classified.remap(from_vals, to_vals).clip(self.geometry)
                 
-                # Create Tile URL
-                map_id_dict = vis_classified.getMapId(vis_params)
-                tile_url = map_id_dict['tile_fetcher'].url_format
+                    # --- PRODUCT SCANNING MODE ---
+                    if self.analysis_type == "product" and self.product_id:
+                        try:
+                            target_id = int(self.product_id)
+                            if str(target_id) in id_to_palette_idx:
+                                remapped_target = id_to_palette_idx[str(target_id)]
+                                vis_classified = vis_classified.updateMask(vis_classified.eq(remapped_target))
+                            else:
+                                print(f"Product ID {target_id} not in palette map")
+                        except Exception as e:
+                            print(f"Product Mask Error: {e}")
+
+                    vis_params = {'min': 0, 'max': 12, 'palette': palette}
                 
-                # Add to results
-                final_results['tile_url'] = tile_url
+                    # Tile URL (map id cached per layer recipe, served through the local tile cache)
+                    recipe = ('class', self.field_key, self.year, self.analysis_type, self.product_id)
+                    final_results['tile_url'] = layer_url(
+                        recipe, lambda: vis_classified.getMapId(vis_params)['tile_fetcher'].url_format,
+                        final=histogram_is_final(self.year))
 
             except Exception as e:
                 print(f"Viz Error: {e}")
@@ -3,13 +3,33 @@ import sqlite3
 import json
 import hashlib
 import os
+import threading
 from datetime import datetime, timedelta
 
 CACHE_FILE = os.path.join(os.getcwd(), 'analysis_cache.db')
 
+
+def geometry_hash(geometry):
+    """
+    Stable hash of a field geometry (GeoJSON dict, Feature or JSON string).
+    Used to key per-field caches independently of dict ordering.
+    """
+    if isinstance(geometry, dict) and 'geometry' in geometry:
+        geometry = geometry['geometry']
+    if isinstance(geometry, str):
+        try:
+            geometry = json.loads(geometry)
+        except ValueError:
+            pass
+    raw_str = json.dumps(geometry, sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(raw_str.encode('utf-8')).hexdigest()
+
+
 class AnalysisCache:
     def __init__(self):
         self.conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        # Workers share one connection from several threads
+        self.lock = threading.RLock()
         self.create_table()
 
     def create_table(self):
@@ -21,6 +41,18 @@ class AnalysisCache:
                     timestamp DATETIME
                 )
             """)
+            # Per-scene trend results: one row per (field, model year, S2 scene)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS trend_scenes (
+                    field_hash TEXT,
+                    year INTEGER,
+                    scene_id TEXT,
+                    date TEXT,
+                    data TEXT,
+                    timestamp DATETIME,
+                    PRIMARY KEY (field_hash, year, scene_id)
+                )
+            """)
 
     def _generate_key(self, geometry, date1, date2, mode, analysis_type):
         """
@@ -31,18 +63,26 @@ class AnalysisCache:
         raw_str = f"{str(geometry)}_{date1}_{date2}_{mode}_{analysis_type}"
         return hashlib.md5(raw_str.encode('utf-8')).hexdigest()
 
-    def get(self, geometry, date1, date2, mode, analysis_type="area"):
+    def get(self, geometry, date1, date2, mode, analysis_type="area", max_age=None):
+        """
+        Cached result or None. 'max_age' (timedelta) treats older entries as missing;
+        by default entries never expire.
+        """
         key = self._generate_key(geometry, date1, date2, mode, analysis_type)
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT data, timestamp FROM results WHERE key = ?", (key,))
-        row = cursor.fetchone()
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT data, timestamp FROM results WHERE key = ?", (key,))
+            row = cursor.fetchone()
         
         if row:
             data_json, timestamp_str = row
-            # Optional: Check expiry (e.g. 24 hours)
-            # stored_time = datetime.fromisoformat(timestamp_str)
-            # if datetime.now() - stored_time > timedelta(hours=24):
-            #     return None
+            if max_age is not None:
+                try:
+                    stored_time = datetime.fromisoformat(timestamp_str)
+                except (TypeError, ValueError):
+                    return None
+                if datetime.now() - stored_time > max_age:
+                    return None
             
             try:
                 return json.loads(data_json)
@@ -59,7 +99,7 @@ class AnalysisCache:
             data_json = json.dumps(data)
             timestamp = datetime.now().isoformat()
             
-            with self.conn:
+            with self.lock, self.conn:
                 self.conn.execute("""
                     INSERT OR REPLACE INTO results (key, data, timestamp)
                     VALUES (?, ?, ?)
@@ -67,6 +107,56 @@ class AnalysisCache:
         except Exception as e:
             print(f"Cache Set Error: {e}")
 
+    def get_trend_scenes(self, field_hash, year, scene_ids=None):
+        """
+        Returns cached per-class results for the given scenes (all scenes of the
+        field/year if scene_ids is None), as packed rows for TrendSeries.from_rows:
+        {scene_id: {'date': 'YYYY-MM-DD', 'groups': [[class, 7 index means], ...]}}
+        Entries written by older versions keep their [{'class', 'mean'}, ...] groups.
+        """
+        found = {}
+        with self.lock:
+            cursor = self.conn.cursor()
+            if scene_ids is None:
+                cursor.execute("""
+                    SELECT scene_id, date, data FROM trend_scenes WHERE field_hash = ? AND year = ?
+                """, (field_hash, int(year)))
+                for scene_id, date, data_json in cursor.fetchall():
+                    try:
+                        found[scene_id] = {'date': date, 'groups': json.loads(data_json)}
+                    except ValueError:
+                        pass
+                return found
+
+            scene_ids = list(scene_ids)
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(scene_ids), 500):
+                batch = scene_ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                cursor.execute(f"""
+                    SELECT scene_id, date, data FROM trend_scenes
+                    WHERE field_hash = ? AND year = ? AND scene_id IN ({marks})
+                """, [field_hash, int(year)] + batch)
+                for scene_id, date, data_json in cursor.fetchall():
+                    try:
+                        found[scene_id] = {'date': date, 'groups': json.loads(data_json)}
+                    except ValueError:
+                        pass
+            return found
+
+    def set_trend_scenes(self, field_hash, year, rows):
+        """Stores rows of {'scene': id, 'date': 'YYYY-MM-DD', 'groups': [[class, 7 index means], ...]}."""
+        timestamp = datetime.now().isoformat()
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany("""
+                    INSERT OR REPLACE INTO trend_scenes (field_hash, year, scene_id, date, data, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(field_hash, int(year), r['scene'], r['date'], json.dumps(r['groups'] or []), timestamp)
+                      for r in rows])
+        except Exception as e:
+            print(f"Trend Cache Set Error: {e}")
+
     def clear_old(self, days=7):
         # Cleanup old entries
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
@@ -0,0 +1,133 @@
+import io
+import os
+import math
+import base64
+import threading
+from collections import OrderedDict
+import ee
+import numpy as np
+import requests
+from PIL import Image
+from core.classification import PALETTE_COLORS, ID_TO_PALETTE_IDX, histogram_is_final
+from core.tile_proxy import tile_proxy
+
+# --- CLASS RASTER SETTINGS ---
+CLASS_RASTER_DIR = os.path.join(os.getcwd(), 'class_rasters')
+RASTER_SCALE = 10              # Metres per pixel (coarsened for large fields)
+MAX_RASTER_PIXELS = 4_000_000  # Keeps the NPY download well below EE's request size limit
+NODATA = 255                   # Outside the field / masked
+MAX_MEMO_RASTERS = 8
+
+_lock = threading.Lock()
+_memo = OrderedDict()  # (field key, year) -> (classes, bounds)
+
+
+def geojson_of(geometry):
+    """Client-side GeoJSON geometry of a dict, Feature or ee.Geometry."""
+    if isinstance(geometry, dict):
+        return geometry.get('geometry', geometry)
+    return geometry.toGeoJSON()
+
+
+def raster_grid(geojson, scale=RASTER_SCALE):
+    """
+    EPSG:4326 pixel grid over the field bounds with ~'scale' metre pixels.
+    Returns (bounds [south, west, north, east], width, height, crs_transform).
+    """
+    coords = np.array(_flatten(geojson['coordinates']), dtype=np.float64).reshape(-1, 2)
+    west, south = (float(v) for v in coords.min(axis=0))
+    east, north = (float(v) for v in coords.max(axis=0))
+
+    lat = math.radians((south + north) / 2)
+    dx = scale / (111320.0 * max(math.cos(lat), 0.01))
+    dy = scale / 110540.0
+    width = max(1, math.ceil((east - west) / dx))
+    height = max(1, math.ceil((north - south) / dy))
+    if width * height > MAX_RASTER_PIXELS:
+        factor = math.sqrt(width * height / MAX_RASTER_PIXELS)
+        dx, dy = dx * factor, dy * factor
+        width = max(1, math.ceil((east - west) / dx))
+        height = max(1, math.ceil((north - south) / dy))
+
+    bounds = [north - height * dy, west, north, west + width * dx]
+    return bounds, width, height, [dx, 0, west, 0, -dy, north]
+
+
+def _flatten(coords):
+    if coords and isinstance(coords[0], (int, float)):
+        return list(coords[:2])
+    out = []
+    for c in coords:
+        out.extend(_flatten(c))
+    return out
+
+
+def fetch_class_raster(classified, geometry, field_key, year):
+    """
+    Class ids of the field as a uint8 array (NODATA outside) and its bounds,
+    downloaded once as NPY. Finished seasons are kept on disk, others in memory.
+    """
+    key = (field_key, int(year))
+    with _lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    path = os.path.join(CLASS_RASTER_DIR, f"{field_key}_{int(year)}.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            result = (data['classes'], data['bounds'].tolist())
+    else:
+        geojson = geojson_of(geometry)
+        bounds, width, height, transform = raster_grid(geojson)
+        image = classified.clip(ee.Geometry(geojson)).unmask(NODATA).toUint8()
+        url = image.getDownloadURL({
+            'format': 'NPY', 'crs': 'EPSG:4326', 'crs_transform': transform, 'dimensions': [width, height]})
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+
+        data = np.load(io.BytesIO(response.content))
+        classes = data[data.dtype.names[0]] if data.dtype.names else data
+        result = (np.ascontiguousarray(classes, dtype=np.uint8), bounds)
+        print(f"DEBUG: Class raster {width}x{height} downloaded ({len(response.content)} bytes)")
+
+        if histogram_is_final(year):
+            os.makedirs(CLASS_RASTER_DIR, exist_ok=True)
+            np.savez_compressed(path, classes=result[0], bounds=np.array(bounds))
+
+    with _lock:
+        _memo[key] = result
+        while len(_memo) > MAX_MEMO_RASTERS:
+            _memo.popitem(last=False)
+    return result
+
+
+def palette_lut(product_id=None, alpha=255):
+    """(256, 4) RGBA lookup table: class id -> palette colour, transparent elsewhere."""
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for cls_id, idx in ID_TO_PALETTE_IDX.items():
+        if product_id is not None and str(cls_id) != str(product_id):
+            continue
+        hex_color = PALETTE_COLORS[idx].lstrip('#')
+        lut[int(cls_id)] = [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)] + [alpha]
+    return lut
+
+
+def colorize(classes, product_id=None):
+    """RGBA image of a class raster (product mode keeps only that class)."""
+    return palette_lut(product_id)[classes]
+
+
+def overlay_url(name, classes, bounds, product_id=None):
+    """
+    Renders the overlay PNG and returns its URL with '#bounds=south,west,north,east'
+    appended (the map turns such URLs into an image overlay instead of a tile layer).
+    Served by the local tile proxy, or inlined as a data URL without it.
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(colorize(classes, product_id), 'RGBA').save(buffer, format='PNG', optimize=False)
+    png = buffer.getvalue()
+    url = tile_proxy.register_overlay(name, png)
+    if url is None:
+        url = "data:image/png;base64," + base64.b64encode(png).decode('ascii')
+    return url + "#bounds=" + ",".join(f"{b:.7f}" for b in bounds)
@@ -1,5 +1,9 @@
 import ee
+import threading
+from collections import OrderedDict
+from datetime import datetime
 from core.ee_utils import mask_s2_clouds
+from core.cache_utils import cache_manager, geometry_hash
 
 # --- CONSTANTS ---
 PRODUCT_LABELS = {
@@ -31,7 +35,151 @@ PALETTE_COLORS = [
     '#FFA726'  # 12: Sunflower (Deep Orange)
 ]
 
-def build_classification_model(year, geometry):
+# --- SHARED MODEL REGISTRY ---
+# Built models are reused by every worker of the same field/year
+# (classification -> trends -> forest analysis) instead of being rebuilt.
+MAX_REGISTERED_MODELS = 16
+
+_registry_lock = threading.Lock()
+_model_registry = OrderedDict()  # (year, field key) -> (classified, has_transition)
+_build_locks = {}                # (year, field key) -> lock held while building
+
+
+def model_key(geometry):
+    """Registry key of a field: GeoJSON hash, or the serialized expression for EE objects."""
+    if isinstance(geometry, ee.ComputedObject):
+        try:
+            return geometry_hash(geometry.toGeoJSON())
+        except Exception:
+            return geometry_hash(geometry.serialize())
+    return geometry_hash(geometry)
+
+
+def get_classification_model(year, geometry, field_key=None):
+    """
+    Returns (classified, has_transition) for the field/year, building it only once.
+    Concurrent callers for the same field/year wait for the first build.
+    'field_key' can be passed when the caller already has the field hash.
+    """
+    key = (int(year), field_key or model_key(geometry))
+    with _registry_lock:
+        if key in _model_registry:
+            _model_registry.move_to_end(key)
+            return _model_registry[key]
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    try:
+        with build_lock:
+            with _registry_lock:
+                if key in _model_registry:
+                    return _model_registry[key]
+            result = build_classification_model(year, geometry)
+            register_classification_model(year, geometry, result, key[1])
+    finally:
+        # Also after a failed build, so failed field/years do not leave locks behind
+        with _registry_lock:
+            _build_locks.pop(key, None)
+    return result
+
+
+def register_classification_model(year, geometry, result, field_key=None):
+    """Stores an already built (classified, has_transition) pair for reuse."""
+    key = (int(year), field_key or model_key(geometry))
+    with _registry_lock:
+        _model_registry[key] = result
+        _model_registry.move_to_end(key)
+        while len(_model_registry) > MAX_REGISTERED_MODELS:
+            _model_registry.popitem(last=False)
+
+
+def get_classification_models(years, geometry, field_key=None):
+    """
+    Models of several years for one field. The metadata of every year that is not
+    registered yet is fetched in a single getInfo() instead of one per year.
+    Returns {year: (classified, has_transition)}.
+    """
+    key = field_key or model_key(geometry)
+    models = {}
+    todo = []
+    with _registry_lock:
+        for year in years:
+            if (int(year), key) in _model_registry:
+                models[year] = _model_registry[(int(year), key)]
+            else:
+                todo.append(year)
+
+    if todo:
+        collections = {year: model_collections(year, geometry) for year in todo}
+        counts = ee.Dictionary({str(year): model_metadata(collections[year]) for year in todo}).getInfo()
+        for year in todo:
+            result = build_classification_model(year, geometry, collections[year], counts[str(year)])
+            register_classification_model(year, geometry, result, key)
+            models[year] = result
+    return models
+
+
+# --- CLASS HISTOGRAM CACHE ---
+
+def histogram_is_final(year):
+    """A year's classification stops changing once its last input window (October) is over."""
+    return datetime.now() >= datetime(int(year), 11, 1)
+
+
+def cached_class_histogram(field_key, year):
+    return cache_manager.get(field_key, int(year), None, "histogram", analysis_type="classification")
+
+
+def store_class_histogram(field_key, year, histogram):
+    """Caches a year's class histogram; only final years are stored."""
+    if histogram and histogram_is_final(year):
+        cache_manager.set(field_key, int(year), None, "histogram", histogram, analysis_type="classification")
+
+
+def class_histogram_request(classified, geometry):
+    """Pixel count per class id (unevaluated reduceRegion dictionary)."""
+    return classified.reduceRegion(reducer=ee.Reducer.frequencyHistogram(), geometry=geometry, scale=30,
+                                   maxPixels=1e9, tileScale=4)
+
+
+def first_histogram(stats):
+    """Histogram of the single band of a frequencyHistogram result, or None."""
+    if not stats:
+        return None
+    values_view = list(stats.values())
+    if not values_view:
+        return None
+    return values_view[0] or None
+
+
+def fetch_class_histograms(years, geometry, field_key=None):
+    """
+    Class histograms {year: {class_id: count} or None} for several years.
+    Cached years are reused; the rest come from one batched model metadata
+    request and one ee.Dictionary with every year's histogram.
+    """
+    key = field_key or model_key(geometry)
+    histograms = {}
+    for year in years:
+        cached = cached_class_histogram(key, year)
+        if cached:
+            histograms[year] = cached
+    todo = [y for y in years if y not in histograms]
+    if not todo:
+        return histograms
+
+    models = get_classification_models(todo, geometry, key)
+    request = {str(y): class_histogram_request(models[y][0], geometry) for y in todo if models[y][0] is not None}
+    stats = ee.Dictionary(request).getInfo() if request else {}
+
+    for year in todo:
+        histogram = first_histogram(stats.get(str(year)))
+        store_class_histogram(key, year, histogram)
+        histograms[year] = histogram
+    return histograms
+
+
+def model_collections(year, geometry):
+    """Input collections of the classification model for one year."""
     # --- Image Collections ---
     spring_col = (
         ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterDate(f'{year}-03-23', f'{year}-05-20').filter(
@@ -49,23 +197,39 @@ def build_classification_model(year, geometry):
         ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterDate(f'{year}-06-01', f'{year}-06-20').filter(
             ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)).map(mask_s2_clouds))
 
-    # --- OPTIMIZATION: BATCH METADATA FETCHING ---
-    
-    # 1. Define S1 Collection FIRST (Fix for UnboundLocalError)
+    # S1 Collection (radar, bounded to the field)
     s1_col = (ee.ImageCollection('COPERNICUS/S1_GRD').filterBounds(geometry).filterDate(f'{year}-07-01',
                                                                                              f'{year}-08-30')
               .filter(ee.Filter.listContains('transmitterReceiverPolarisation', 'VH'))
               .filter(ee.Filter.eq('instrumentMode', 'IW')).select('VH'))
 
-    # 2. Batch Metadata Fetching
-    console_counts = ee.Dictionary({
-        'spring': spring_col.size(),
-        'summer': summer_col.size(),
-        'sept': sept_col.size(),
-        'oct': oct_col.size(),
-        'trans': transition_col.size(),
-        's1': s1_col.size()
-    }).getInfo()
+    return {'spring': spring_col, 'summer': summer_col, 'sept': sept_col,
+            'oct': oct_col, 'trans': transition_col, 's1': s1_col}
+
+
+def model_metadata(collections):
+    """Server-side image counts the model branches on (evaluate with getInfo)."""
+    return ee.Dictionary({name: col.size() for name, col in collections.items()})
+
+
+def build_classification_model(year, geometry, collections=None, console_counts=None):
+    """
+    Builds the classified image of one year.
+    'collections'/'console_counts' can be passed when the metadata of several
+    years was fetched together (see get_classification_models).
+    """
+    if collections is None:
+        collections = model_collections(year, geometry)
+    spring_col = collections['spring']
+    summer_col = collections['summer']
+    sept_col = collections['sept']
+    oct_col = collections['oct']
+    transition_col = collections['trans']
+    s1_col = collections['s1']
+
+    # --- OPTIMIZATION: BATCH METADATA FETCHING ---
+    if console_counts is None:
+        console_counts = model_metadata(collections).getInfo()
 
     if console_counts['spring'] == 0 or console_counts['summer'] == 0:
         return None, False # Insufficient Data
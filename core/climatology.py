@@ -0,0 +1,98 @@
+import ee
+import numpy as np
+from core.cache_utils import cache_manager
+from core.ee_utils import mask_s2_clouds
+
+# --- CLIMATOLOGY SETTINGS ---
+CLIMATOLOGY_YEARS = 5      # Previous seasons in the baseline
+WINDOW_DAYS = 15           # +/- days around the same day of year
+MIN_YEARS_FOR_Z = 3        # Fewer valid years give no meaningful spread
+CLIMATOLOGY_BANDS = ['B3', 'B4', 'B5', 'B8', 'B11']
+
+# Normalized difference indices computed from the band means: name -> (a, b)
+INDEX_BANDS = {
+    'NDVI': ('B8', 'B4'),
+    'GNDVI': ('B8', 'B3'),
+    'NDRE': ('B8', 'B5'),
+    'NDMI': ('B8', 'B11'),
+}
+
+
+def band_indices(bands):
+    """Indices from a dict of band means (same formula as the current-date stats)."""
+    out = {}
+    for name, (a, b) in INDEX_BANDS.items():
+        va, vb = bands.get(a), bands.get(b)
+        if va is None or vb is None or (va + vb) == 0:
+            out[name] = None
+        else:
+            out[name] = (va - vb) / (va + vb)
+    return out
+
+
+def climatology_request(geometry, date_str, n_years=CLIMATOLOGY_YEARS):
+    """
+    Server-side per-year band means of the same day-of-year window over the
+    previous 'n_years', as one mapped reduction (add it to a batched getInfo).
+    Evaluates to [{'year': 2022, 'B4': ..., ...}, ...]; years without images have only 'year'.
+    """
+    center = ee.Date(date_str)
+
+    def year_stats(k):
+        day = center.advance(ee.Number(k).multiply(-1), 'year')
+        col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+               .filterBounds(geometry)
+               .filterDate(day.advance(-WINDOW_DAYS, 'day'), day.advance(WINDOW_DAYS, 'day'))
+               .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
+               .map(mask_s2_clouds))
+        means = ee.Algorithms.If(
+            col.size().gt(0),
+            col.median().select(CLIMATOLOGY_BANDS).reduceRegion(
+                reducer=ee.Reducer.mean(), geometry=geometry, scale=20, maxPixels=1e9, bestEffort=True),
+            ee.Dictionary({}))
+        return ee.Dictionary(means).set('year', day.get('year'))
+
+    return ee.List.sequence(1, n_years).map(year_stats)
+
+
+def _cache_args(field_key, date_str, n_years):
+    # Previous years never change, so the entry is keyed by day of year and season
+    return field_key, date_str[5:10], date_str[:4], f"climatology_{n_years}"
+
+
+def cached_climatology(field_key, date_str, n_years=CLIMATOLOGY_YEARS):
+    return cache_manager.get(*_cache_args(field_key, date_str, n_years), analysis_type="climatology")
+
+
+def store_climatology(field_key, date_str, per_year, n_years=CLIMATOLOGY_YEARS):
+    """Summarizes the evaluated climatology_request and caches it permanently."""
+    summary = summarize(per_year)
+    cache_manager.set(*_cache_args(field_key, date_str, n_years), summary, analysis_type="climatology")
+    return summary
+
+
+def summarize(per_year):
+    """Per-index mean / std / count over the years (indices computed per year first)."""
+    rows = [band_indices(entry) for entry in per_year or [] if entry.get('B4') is not None]
+    summary = {'years': [int(e['year']) for e in per_year or [] if e.get('B4') is not None],
+               'mean': {}, 'std': {}, 'count': {}}
+    for name in INDEX_BANDS:
+        values = np.array([r[name] for r in rows if r[name] is not None], dtype=np.float64)
+        summary['count'][name] = int(values.size)
+        summary['mean'][name] = float(values.mean()) if values.size else None
+        summary['std'][name] = float(values.std(ddof=1)) if values.size > 1 else None
+    return summary
+
+
+def anomalies(current_bands, summary):
+    """Z-scores of the current indices against the climatology ({index: z or None})."""
+    current = band_indices(current_bands)
+    z_scores = {}
+    for name, value in current.items():
+        mean = summary['mean'].get(name)
+        std = summary['std'].get(name)
+        if value is None or mean is None or not std or summary['count'].get(name, 0) < MIN_YEARS_FOR_Z:
+            z_scores[name] = None
+        else:
+            z_scores[name] = (value - mean) / std
+    return z_scores
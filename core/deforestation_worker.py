@@ -1,12 +1,66 @@
 import ee
 from PyQt5.QtCore import QThread, pyqtSignal
-from core.classification import build_classification_model, PRODUCT_LABELS
+from core.cache_utils import cache_manager
+from core.classification import (
+    get_classification_models, model_key, histogram_is_final, cached_class_histogram, store_class_histogram,
+    class_histogram_request, first_histogram, PRODUCT_LABELS
+)
+from core.map_id_cache import layer_url
+
+# Forest = 'Tall Trees' (4) + 'Orchard/Shrub/Nursery' (7)
+FOREST_CLASS_IDS = ('4', '7')
+
+# Change map codes and colors
+CHANGE_LOSS = 1    # forest -> other
+CHANGE_GAIN = 2    # other -> forest
+CHANGE_OTHER = 3   # any other class change
+CHANGE_PALETTE = ['#D32F2F', '#2E7D32', '#FBC02D']
+
+
+def transition_request(classified_old, classified_new, geometry):
+    """
+    Grouped reducer: histogram of the new class for every old class, in one pass.
+    Result: {'groups': [{'from': 4, 'histogram': {'4': n, '6': m, ...}}, ...]}
+    """
+    pair = classified_new.rename('to').addBands(classified_old.rename('from'))
+    return pair.reduceRegion(
+        reducer=ee.Reducer.frequencyHistogram().group(groupField=1, groupName='from'),
+        geometry=geometry,
+        scale=30,
+        maxPixels=1e9,
+        tileScale=4
+    )
+
+
+def parse_transitions(stats):
+    """{from_id: {to_id: pixel count}} with string class ids."""
+    transitions = {}
+    for grp in (stats or {}).get('groups') or []:
+        from_id = str(int(grp['from']))
+        row = transitions.setdefault(from_id, {})
+        for to_id, count in (grp.get('histogram') or {}).items():
+            to_id = str(int(float(to_id)))
+            row[to_id] = row.get(to_id, 0) + count
+    return transitions
+
+
+def change_image(classified_old, classified_new):
+    """Change codes (loss / gain / other), unchanged pixels masked."""
+    forest_old = classified_old.eq(int(FOREST_CLASS_IDS[0])).Or(classified_old.eq(int(FOREST_CLASS_IDS[1])))
+    forest_new = classified_new.eq(int(FOREST_CLASS_IDS[0])).Or(classified_new.eq(int(FOREST_CLASS_IDS[1])))
+    changed = classified_old.neq(classified_new)
+    code = (ee.Image(0)
+            .where(changed, CHANGE_OTHER)
+            .where(forest_old.And(forest_new.Not()), CHANGE_LOSS)
+            .where(forest_new.And(forest_old.Not()), CHANGE_GAIN))
+    return code.updateMask(code.gt(0)).rename('change')
 
 
 class DeforestationWorker(QThread):
     """
     Compares 'Tall Trees' (class ID '4') percentages between two years
-    to compute deforestation/reforestation change.
+    to compute deforestation/reforestation change, with the per-pixel
+    class transition matrix behind it.
     """
     finished_signal = pyqtSignal(dict)
     status_signal = pyqtSignal(str)
@@ -16,9 +70,10 @@ class DeforestationWorker(QThread):
     TREE_CLASS_ID = '4'
     SHRUB_CLASS_ID = '7'
 
-    def __init__(self, geometry, mode, date1, date2=None):
+    def __init__(self, geometry, mode, date1, date2=None, field_hash=None):
         super().__init__()
         self.geometry = geometry
+        self.field_hash = field_hash
         self.mode = mode
         self.date1 = date1
         self.date2 = date2
@@ -46,32 +101,11 @@ class DeforestationWorker(QThread):
             # Single mode: compare with previous year
             return year1 - 1, year1
 
-    def _get_forest_percentage(self, year):
+    def _forest_percentage(self, histogram):
         """
-        Run classification for a given year and extract the sum of
-        'Tall Trees' (4) and 'Orchard/Shrub/Nursery' (7) percentage.
+        Sum of 'Tall Trees' (4) and 'Orchard/Shrub/Nursery' (7) percentage
+        of a class histogram.
         """
-        classified, has_transition = build_classification_model(year, self.geometry)
-
-        if classified is None:
-            return None
-
-        stats = classified.reduceRegion(
-            reducer=ee.Reducer.frequencyHistogram(),
-            geometry=self.geometry,
-            scale=30,
-            maxPixels=1e9,
-            tileScale=4
-        ).getInfo()
-
-        if not stats:
-            return None
-
-        values_view = list(stats.values())
-        if not values_view:
-            return None
-
-        histogram = values_view[0]
         if not histogram:
             return None
 
@@ -84,17 +118,78 @@ class DeforestationWorker(QThread):
         
         return ((tree_count + shrub_count) / total) * 100
 
+    def _fetch_histograms_and_transitions(self, year_old, year_new):
+        """
+        Single-year class histograms of both years and the class transition matrix
+        between them. Cached parts are reused; whatever is missing comes from one
+        model metadata request and one ee.Dictionary (histograms + transitions).
+        Returns ({year: histogram or None}, transitions or None).
+        """
+        key = self.field_hash or model_key(self.geometry)
+        years = [year_old, year_new]
+        histograms = {y: cached_class_histogram(key, y) for y in years}
+        transitions = cache_manager.get(key, year_old, year_new, "transitions", analysis_type="classification")
+
+        todo = [y for y in years if not histograms[y]]
+        if not todo and transitions:
+            return histograms, transitions
+
+        models = get_classification_models(years if not transitions else todo, self.geometry, key)
+        request = {str(y): class_histogram_request(models[y][0], self.geometry)
+                   for y in todo if models[y][0] is not None}
+        classified_old, classified_new = models.get(year_old, (None,))[0], models.get(year_new, (None,))[0]
+        if not transitions and classified_old is not None and classified_new is not None:
+            request['transitions'] = transition_request(classified_old, classified_new, self.geometry)
+        stats = ee.Dictionary(request).getInfo() if request else {}
+
+        for year in todo:
+            histograms[year] = first_histogram(stats.get(str(year)))
+            store_class_histogram(key, year, histograms[year])
+
+        if 'transitions' in stats:
+            transitions = parse_transitions(stats['transitions']) or None
+            # Only the matrix is cached: its marginals count pixels valid in both years
+            # and must not replace the single-year class histograms
+            if transitions and histogram_is_final(year_new):
+                cache_manager.set(key, year_old, year_new, "transitions", transitions, analysis_type="classification")
+        return histograms, transitions
+
+    def _summarize_transitions(self, transitions):
+        """Gross forest loss / gain and the largest class changes, in % of the field."""
+        total = sum(sum(row.values()) for row in transitions.values()) or 1
+        loss = gain = 0
+        changes = []
+        for from_id, row in transitions.items():
+            for to_id, count in row.items():
+                if from_id == to_id:
+                    continue
+                if from_id in FOREST_CLASS_IDS and to_id not in FOREST_CLASS_IDS:
+                    loss += count
+                elif to_id in FOREST_CLASS_IDS and from_id not in FOREST_CLASS_IDS:
+                    gain += count
+                changes.append((count, from_id, to_id))
+
+        top_changes = [{'from': PRODUCT_LABELS.get(f, f'Class {f}'),
+                        'to': PRODUCT_LABELS.get(t, f'Class {t}'),
+                        'pct': count / total * 100}
+                       for count, f, t in sorted(changes, reverse=True)[:5]]
+        return {
+            'transitions': transitions,
+            'forest_loss_pct': loss / total * 100,
+            'forest_gain_pct': gain / total * 100,
+            'top_changes': top_changes,
+        }
+
     def run(self):
         try:
             year_old, year_new = self._determine_years()
 
-            # --- Period 1 (older/baseline year) ---
-            self.status_signal.emit(f"Forest Analysis: Analyzing {year_old}...")
-            pct_old = self._get_forest_percentage(year_old)
-
-            # --- Period 2 (newer/current year) ---
-            self.status_signal.emit(f"Forest Analysis: Analyzing {year_new}...")
-            pct_new = self._get_forest_percentage(year_new)
+            # Both periods and their transition matrix in one request (cached parts skipped).
+            # The percentages always come from the single-year histograms.
+            self.status_signal.emit(f"Forest Analysis: Analyzing {year_old} and {year_new}...")
+            histograms, transitions = self._fetch_histograms_and_transitions(year_old, year_new)
+            pct_old = self._forest_percentage(histograms.get(year_old))
+            pct_new = self._forest_percentage(histograms.get(year_new))
 
             # --- Compute change ---
             if pct_old is None and pct_new is None:
@@ -112,6 +207,8 @@ class DeforestationWorker(QThread):
                 'period2_pct': pct_new,
                 'change_pct': change,
             }
+            if transitions:
+                result.update(self._summarize_transitions(transitions))
 
             self.status_signal.emit("Forest analysis complete.")
             self.finished_signal.emit(result)
@@ -119,3 +216,34 @@ class DeforestationWorker(QThread):
         except Exception as e:
             print(f"DEFORESTATION WORKER ERROR: {e}")
             self.error_signal.emit(str(e))
+
+
+class ChangeMapWorker(QThread):
+    """Tile URL of the forest change map between two years (models from the registry)."""
+    finished_signal = pyqtSignal(str)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, geometry, year_old, year_new, field_hash=None):
+        super().__init__()
+        self.geometry = geometry
+        self.year_old = year_old
+        self.year_new = year_new
+        self.field_hash = field_hash
+
+    def run(self):
+        try:
+            models = get_classification_models([self.year_old, self.year_new], self.geometry, self.field_hash)
+            classified_old, classified_new = models[self.year_old][0], models[self.year_new][0]
+            if classified_old is None or classified_new is None:
+                self.error_signal.emit("Insufficient data for a change map.")
+                return
+
+            change = change_image(classified_old, classified_new).clip(self.geometry)
+            vis_params = {'min': CHANGE_LOSS, 'max': CHANGE_OTHER, 'palette': CHANGE_PALETTE}
+            recipe = ('change', self.field_hash or model_key(self.geometry), self.year_old, self.year_new)
+            self.finished_signal.emit(layer_url(recipe, lambda: change.getMapId(vis_params)['tile_fetcher'].url_format,
+                                                final=histogram_is_final(self.year_new)))
+
+        except Exception as e:
+            print(f"Change Map Error: {e}")
+            self.error_signal.emit(str(e))
@@ -0,0 +1,278 @@
+import json
+import math
+import threading
+from collections import OrderedDict
+import ee
+import numpy as np
+from core.cache_utils import geometry_hash
+
+# --- GEOMETRY PIPELINE SETTINGS ---
+SIMPLIFY_TOLERANCE_M = 0.5   # Sub-pixel (Sentinel-2 pixels are 10 m)
+MAX_AREA_CHANGE_PCT = 0.1    # Douglas-Peucker cuts convex outlines inward; beyond this, simplify less
+COORD_DECIMALS = 6           # ~0.1 m
+MIN_LOOP_AREA_M2 = 1.0       # Slivers left by the repair are dropped
+MAX_SIMPLIFY_RETRIES = 3     # Tolerance is halved while simplification breaks the topology or the area
+MAX_PREPARED = 32
+CROSSING_BLOCK = 256         # Edges tested at once by the self-intersection check
+
+M_PER_DEG_LAT = 110540.0
+M_PER_DEG_LNG = 111320.0     # At the equator; scaled by cos(latitude)
+
+_lock = threading.Lock()
+_prepared = OrderedDict()    # geometry hash -> (geojson, metrics)
+
+
+def simplify_ring(ring, tolerance):
+    """Douglas-Peucker simplification of a closed ring ((N, 2) array); keeps at least 4 points."""
+    ring = np.asarray(ring, dtype=np.float64)
+    if len(ring) <= 4:
+        return ring
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = ring[end] - ring[start]
+        pts = ring[start + 1:end] - ring[start]
+        seg_len = np.hypot(seg[0], seg[1])
+        if seg_len == 0:
+            dist = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    if keep.sum() < 4:
+        # Degenerate after simplification: keep the original shape
+        return ring
+    return ring[keep]
+
+
+def ring_area(ring):
+    """Signed shoelace area of a closed ring (positive when counter-clockwise)."""
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def _first_crossing(ring):
+    """
+    First proper crossing of two non-adjacent edges of a closed ring:
+    (i, j, point) with edge i = ring[i] -> ring[i + 1] and i < j, or None.
+    Edges are tested in blocks against all others (vectorized).
+    """
+    starts, ends = ring[:-1], ring[1:]
+    dirs = ends - starts
+    m = len(starts)
+    js = np.arange(m)[None, :]
+    for block in range(0, m, CROSSING_BLOCK):
+        ii = np.arange(block, min(block + CROSSING_BLOCK, m))[:, None]
+        p0, p1, d = starts[ii], ends[ii], dirs[ii]
+        proper = ((_cross(d, starts[None, :] - p0) * _cross(d, ends[None, :] - p0) < 0) &
+                  (_cross(dirs[None, :], p0 - starts[None, :]) * _cross(dirs[None, :], p1 - starts[None, :]) < 0))
+        # Only later, non-adjacent edges (the first and last edges share the closing vertex)
+        proper &= (js >= ii + 2) & ~((ii == 0) & (js == m - 1))
+        rows, cols = np.nonzero(proper)
+        if len(rows):
+            i, j = int(ii[rows[0], 0]), int(cols[0])
+            t = _cross(starts[j] - starts[i], dirs[j]) / _cross(dirs[i], dirs[j])
+            return i, j, starts[i] + t * dirs[i]
+    return None
+
+
+def _rings_cross(a, b):
+    """True if any edge of ring a properly crosses an edge of ring b."""
+    a0, a1 = a[:-1, None, :], a[1:, None, :]
+    b0, b1 = b[None, :-1, :], b[None, 1:, :]
+    da, db = a1 - a0, b1 - b0
+    return bool(np.any((_cross(da, b0 - a0) * _cross(da, b1 - a0) < 0) &
+                       (_cross(db, a0 - b0) * _cross(db, a1 - b0) < 0)))
+
+
+def _contains(ring, point):
+    """Even-odd point in polygon test."""
+    x, y = point
+    x0, y0, x1, y1 = ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]
+    spans = (y0 > y) != (y1 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return bool(np.count_nonzero(spans & (x < x_at)) % 2)
+
+
+def unkink_ring(ring):
+    """
+    Splits a self-intersecting ring at its crossings into simple loops
+    (a bow-tie becomes two triangles). Sliver loops are dropped.
+    """
+    loops, stack = [], [ring]
+    while stack:
+        current = stack.pop()
+        hit = _first_crossing(current)
+        if hit is None:
+            if len(current) >= 4 and abs(ring_area(current)) >= MIN_LOOP_AREA_M2:
+                loops.append(current)
+            continue
+        i, j, point = hit
+        stack.append(np.vstack([point, current[i + 1:j + 1], point]))
+        stack.append(np.vstack([current[:i + 1], point, current[j + 1:]]))
+    return loops
+
+
+def _repair(ring, tolerance):
+    """
+    Simple loops of a ring. A ring whose simplified form does not cross itself is
+    kept as is (any kink is below the tolerance), which skips the full check on dense rings.
+    """
+    if _first_crossing(simplify_ring(ring, tolerance)) is None:
+        return [ring]
+    return unkink_ring(ring)
+
+
+def _simplify_preserving(ring, others, tolerance):
+    """
+    Simplifies a ring, halving the tolerance while it would cross itself or a neighbouring
+    ring, or change the ring area by more than MAX_AREA_CHANGE_PCT. Falls back to the ring as is.
+    """
+    area = abs(ring_area(ring))
+    for _ in range(MAX_SIMPLIFY_RETRIES + 1):
+        simplified = simplify_ring(ring, tolerance)
+        simplified_area = abs(ring_area(simplified))
+        if (simplified_area >= MIN_LOOP_AREA_M2
+                and abs(simplified_area - area) <= area * MAX_AREA_CHANGE_PCT / 100
+                and _first_crossing(simplified) is None
+                and not any(_rings_cross(simplified, other) for other in others)):
+            return simplified
+        tolerance /= 2
+    return ring
+
+
+def _clean_coords(coords, origin, scale):
+    """Rounded, de-duplicated, closed ring in local metres."""
+    ring = np.round(np.asarray(coords, dtype=np.float64)[:, :2], COORD_DECIMALS)
+    if len(ring) == 0:
+        return ring
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:] = np.any(ring[1:] != ring[:-1], axis=1)
+    ring = ring[keep]
+    if len(ring) and np.any(ring[0] != ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+    return (ring - origin) * scale
+
+
+def _clean_polygon(rings, origin, scale, tolerance):
+    """
+    One GeoJSON polygon (list of rings) -> (simplified polygons, repaired polygons before
+    simplification, repaired flag), all valid and in local metres.
+    """
+    metric = [_clean_coords(r, origin, scale) for r in rings]
+    metric = [r for r in metric if len(r) >= 4]
+    if not metric:
+        return [], [], False
+
+    shells = _repair(metric[0], tolerance)
+    holes = [loop for hole in metric[1:] for loop in _repair(hole, tolerance)]
+    repaired = len(shells) != 1 or len(holes) != len(metric) - 1 or shells[0] is not metric[0]
+
+    repaired_polygons, polygons = [], []
+    for shell in shells:
+        inner = [h for h in holes if _contains(shell, h[0])]
+        repaired_polygons.append([shell] + inner)
+        shell = _simplify_preserving(shell, inner, tolerance)
+        inner = [_simplify_preserving(h, [shell], tolerance) for h in inner]
+        polygons.append([shell] + inner)
+    return polygons, repaired_polygons, repaired
+
+
+def _polygon_rings(geometry):
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return list(geometry['coordinates'])
+    return None
+
+
+def _vertex_count(polygons):
+    return sum(len(r) for poly in polygons for r in poly)
+
+
+def _area_m2(polygons):
+    return sum(abs(ring_area(poly[0])) - sum(abs(ring_area(h)) for h in poly[1:]) for poly in polygons)
+
+
+def prepare_geometry(geo_data, tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """
+    Cleans a field geometry (GeoJSON dict, Feature or JSON string) before it is sent to EE:
+    coordinates rounded to COORD_DECIMALS, self-intersections split into simple polygons,
+    rings simplified (Douglas-Peucker, 'tolerance_m' metres) without creating new crossings.
+    Returns (geojson, metrics) with metrics
+      {'vertices_in', 'vertices_out', 'area_ha', 'area_change_pct', 'repaired'}.
+    Non-polygon geometries are returned unchanged. Results are memoized per geometry.
+    """
+    if isinstance(geo_data, str):
+        geo_data = json.loads(geo_data)
+    geometry = geo_data.get('geometry', geo_data)
+    key = (geometry_hash(geometry), tolerance_m)
+    with _lock:
+        if key in _prepared:
+            _prepared.move_to_end(key)
+            return _prepared[key]
+
+    polygons_in = _polygon_rings(geometry)
+    if not polygons_in:
+        return geometry, None
+
+    # Local metric frame around the south-west corner (fields are small)
+    all_coords = np.array([c[:2] for poly in polygons_in for ring in poly for c in ring], dtype=np.float64)
+    origin = all_coords.min(axis=0)
+    mid_lat = math.radians(float(all_coords[:, 1].mean()))
+    scale = np.array([M_PER_DEG_LNG * math.cos(mid_lat), M_PER_DEG_LAT])
+
+    polygons, valid, repaired = [], [], False
+    for poly in polygons_in:
+        cleaned, poly_valid, poly_repaired = _clean_polygon(poly, origin, scale, tolerance_m)
+        polygons.extend(cleaned)
+        valid.extend(poly_valid)
+        repaired = repaired or poly_repaired
+
+    if not polygons:
+        # Nothing valid left (degenerate input): let EE see the original
+        return geometry, None
+
+    coords = [[np.round(r / scale + origin, COORD_DECIMALS).tolist() for r in poly] for poly in polygons]
+    if len(coords) == 1:
+        geojson = {'type': 'Polygon', 'coordinates': coords[0]}
+    else:
+        geojson = {'type': 'MultiPolygon', 'coordinates': coords}
+
+    # Area change is the simplification loss (a self-intersecting input has no meaningful area)
+    area_in, area_out = _area_m2(valid), _area_m2(polygons)
+    metrics = {
+        'vertices_in': sum(len(r) for poly in polygons_in for r in poly),
+        'vertices_out': _vertex_count(polygons),
+        'area_ha': round(area_out / 10000.0, 4),
+        'area_change_pct': round((area_out - area_in) / area_in * 100, 3) if area_in else 0.0,
+        'repaired': repaired,
+    }
+    print(f"DEBUG: Geometry prepared: {metrics['vertices_in']} -> {metrics['vertices_out']} vertices, "
+          f"{metrics['area_ha']} ha ({metrics['area_change_pct']:+}%), repaired={repaired}")
+
+    with _lock:
+        _prepared[key] = (geojson, metrics)
+        while len(_prepared) > MAX_PREPARED:
+            _prepared.popitem(last=False)
+    return geojson, metrics
+
+
+def to_ee_geometry(geo_data):
+    """ee.Geometry of a field after the pipeline; EE objects are passed through."""
+    if isinstance(geo_data, (dict, str)):
+        return ee.Geometry(prepare_geometry(geo_data)[0])
+    return geo_data
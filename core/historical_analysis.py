@@ -1,19 +1,193 @@
 
 import ee
 import json
+import numpy as np
+import time
 import traceback
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from PyQt5.QtCore import QObject, pyqtSignal
-from core.classification import build_classification_model
+from core.classification import get_classification_model
 from core.ee_utils import mask_s2_clouds
+from core.cache_utils import cache_manager, geometry_hash
+from core.trend_series import TrendSeries, MultiYearSeries, INDEX_NAMES, labels_key
+
+# --- CHUNKED RETRIEVAL SETTINGS ---
+CHUNK_DAYS = 30            # Date window fetched per getInfo()
+MAX_PARALLEL_CHUNKS = 3    # Concurrent EE requests per trend run
+CHUNK_RETRIES = 3          # Attempts per chunk before giving up on it
+
+# --- MULTI-YEAR COMPARISON SETTINGS ---
+COMPARE_YEARS = 3          # Previous seasons compared with the selected one
+MAX_PARALLEL_YEARS = 2     # Seasons fetched at once (each runs its own chunk pool)
+
+def split_date_range(start, end, chunk_days=CHUNK_DAYS):
+    """Splits [start, end) into consecutive (chunk_start, chunk_end) datetime pairs."""
+    chunks = []
+    cur = start
+    while cur < end:
+        nxt = min(cur + timedelta(days=chunk_days), end)
+        chunks.append((cur, nxt))
+        cur = nxt
+    return chunks
+
+
+def mosaic_by_date(collection):
+    """
+    Server-side grouping of a S2 collection into one mosaic per acquisition date.
+    Fields on an MGRS tile boundary get one image per date instead of one per tile.
+    'scene_id' holds the sorted member system:index values joined with '+'.
+    """
+    dated = collection.map(lambda img: img.set('date', img.date().format('YYYY-MM-dd')))
+    dates = ee.List(dated.aggregate_array('date')).distinct()
+
+    def make_mosaic(d):
+        day = dated.filter(ee.Filter.eq('date', d))
+        scene_id = ee.List(day.aggregate_array('system:index')).sort().join('+')
+        return (day.mosaic()
+                .set('system:time_start', day.aggregate_min('system:time_start'))
+                .set('date', d)
+                .set('scene_id', scene_id))
+
+    return ee.ImageCollection.fromImages(dates.map(make_mosaic))
+
+
+def class_means_fn(classified_img, geometry):
+    """Returns the per-image reducer: mean of the 7 indices per class of 'classified_img'."""
+
+    # Define a function to calculate mean INDICES per class for an image
+    def calculate_class_means(img):
+        time_start = img.get('system:time_start')
+        scene_id = img.get('scene_id')
+
+        # Scale bands to 0-1 (Sentinel-2 L2A is 0-10000 range usually)
+        # We need to cast to float for division
+        img = img.divide(10000.0)
+
+        b2 = img.select('B2')
+        b3 = img.select('B3')
+        b4 = img.select('B4')
+        b5 = img.select('B5')
+        b6 = img.select('B6')
+        b8 = img.select('B8')
+        b11 = img.select('B11')
+
+        # Calculate Indices
+        # NDVI = (B8 - B4) / (B8 + B4)
+        ndvi = img.normalizedDifference(['B8', 'B4']).rename('NDVI')
+
+        # GNDVI = (B8 - B3) / (B8 + B3)
+        gndvi = img.normalizedDifference(['B8', 'B3']).rename('GNDVI')
+
+        # NDWI = (B8 - B11) / (B8 + B11)  (Gao - Water Content)
+        ndwi = img.normalizedDifference(['B8', 'B11']).rename('NDWI')
+
+        # NDRE = (B8 - B5) / (B8 + B5)
+        ndre = img.normalizedDifference(['B8', 'B5']).rename('NDRE')
+
+        # RENDVI = (B6 - B5) / (B6 + B5)
+        rendvi = img.normalizedDifference(['B6', 'B5']).rename('RENDVI')
+
+        # EVI = 2.5 * ((B8 - B4) / (B8 + 6*B4 - 7.5*B2 + 1))
+        # Note: using 1.0 instead of 10000 because we scaled bands to 0-1
+        evi = b8.subtract(b4).divide(
+            b8.add(b4.multiply(6)).subtract(b2.multiply(7.5)).add(1)
+        ).multiply(2.5).rename('EVI')
+
+        # SAVI = ((B8 - B4) / (B8 + B4 + 0.5)) * 1.5
+        savi = b8.subtract(b4).divide(
+            b8.add(b4).add(0.5)
+        ).multiply(1.5).rename('SAVI')
+
+        # Combine all bands
+        combined_indices = (ndvi
+                           .addBands(gndvi)
+                           .addBands(ndwi)
+                           .addBands(ndre)
+                           .addBands(rendvi)
+                           .addBands(evi)
+                           .addBands(savi)
+                           .addBands(classified_img)) # Add class as the last band (or check index)
+
+        # Reduce
+        # groupField is the index of the class band.
+        # Attributes added above: 0:NDVI, 1:GNDVI, 2:NDWI, 3:NDRE, 4:RENDVI, 5:EVI, 6:SAVI, 7:Class
+        # So groupField=7
+        # We have 7 inputs (indices) + 1 group input (class).
+        # The mean reducer needs 7 inputs. The group reducer needs 1 (group) + N (inputs for child reducer).
+        # Total inputs to group reducer = 7 + 1 = 8.
+        # groupField=7 selects the 8th input (0-indexed).
+
+        stats = combined_indices.reduceRegion(
+            reducer=ee.Reducer.mean().repeat(7).group(groupField=7, groupName='class'),
+            geometry=geometry,
+            scale=10,
+            maxPixels=1e9,
+            bestEffort=True
+        )
+
+        # Pack the groups as flat numbers: [class, 7 means] per class
+        groups = ee.List(stats.get('groups', ee.List([])))
+        packed = groups.map(lambda g: ee.List([ee.Dictionary(g).get('class')])
+                            .cat(ee.List(ee.Dictionary(g).get('mean'))))
+        return ee.Feature(None, {'scene': scene_id, 'time': time_start,
+                                 'n': groups.size(), 'rows': packed.flatten()})
+
+    return calculate_class_means
+
+
+def fetch_packed_means(collection, reduce_fn):
+    """
+    Runs 'reduce_fn' over the collection and downloads the result as flat arrays
+    (one getInfo, numbers only) instead of a nested FeatureCollection.
+    Returns (scene_ids, days, counts, table) where days/counts are per scene and
+    table is (rows x 8): [class, 7 means] with NaN for missing means.
+    """
+    reduced = collection.map(reduce_fn)
+    payload = ee.Dictionary({
+        'scenes': reduced.aggregate_array('scene'),
+        'times': reduced.aggregate_array('time'),
+        'counts': reduced.aggregate_array('n'),
+        'values': ee.List(reduced.aggregate_array('rows')).flatten(),
+    }).getInfo()
+
+    times = np.asarray(payload.get('times') or [], dtype=np.int64)
+    days = times.astype('datetime64[ms]').astype('datetime64[D]').astype(np.int64)
+    counts = np.asarray(payload.get('counts') or [], dtype=np.int64)
+    table = np.asarray(payload.get('values') or [], dtype=np.float64).reshape(-1, 1 + len(INDEX_NAMES))
+    return payload.get('scenes') or [], days, counts, table
+
+
+def packed_to_scene_rows(scene_ids, days, counts, table):
+    """Per-scene cache rows ({'scene', 'date', 'groups': [[class, 7 means], ...]})."""
+    date_strs = days.astype('datetime64[D]').astype(str)
+    groups = np.split(table, np.cumsum(counts)[:-1]) if len(counts) else []
+    rows = []
+    for sid, date_str, block in zip(scene_ids, date_strs, groups):
+        block = np.where(np.isnan(block), None, block.astype(object))
+        rows.append({'scene': sid, 'date': str(date_str), 'groups': block.tolist()})
+    return rows
+
+
+def shift_years(date, years):
+    """Same calendar day 'years' later (29 Feb falls back to 28 Feb)."""
+    try:
+        return date.replace(year=date.year + years)
+    except ValueError:
+        return date.replace(year=date.year + years, day=28)
+
 
 class TrendWorker(QObject):
-    finished_signal = pyqtSignal(dict)
+    finished_signal = pyqtSignal(object)  # TrendSeries
+    partial_signal = pyqtSignal(object)   # TrendSeries of one finished chunk, in date order
+    status_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
     
-    def __init__(self, geometry_json, year, start_date_str, end_date_str, legend_colors, label_mapping=None):
+    def __init__(self, geometry_json, year, start_date_str, end_date_str, legend_colors, label_mapping=None,
+                 field_hash=None):
         super().__init__()
         self.geometry_json = geometry_json
+        self.field_hash = field_hash or geometry_hash(geometry_json)
         self.year = year
         self.start_date_str = start_date_str
         self.end_date_str = end_date_str
@@ -24,167 +198,15 @@ class TrendWorker(QObject):
         print("DEBUG: TrendWorker process started", flush=True)
         try:
             # 1. Deserialize Geometry
-            print("DEBUG: Deserializing geometry...", flush=True)
-            if self.geometry_json:
-                self.geometry = ee.deserializer.fromJSON(self.geometry_json)
-            else:
-                 raise ValueError("No geometry provided")
-
-            # 2. Build Classification Model Locally
-            print(f"DEBUG: Building classification model for year {self.year}...", flush=True)
-            classified_img, _ = build_classification_model(self.year, self.geometry)
-            
-            if classified_img is None:
-                raise ValueError("Failed to build classification model (Insufficient Data)")
-            
-            # 3. Time Series Analysis
+            geometry = self.load_geometry()
+
+            # 2. Time Series Analysis (model is built inside, only if new scenes need reducing)
             print(f"DEBUG: Starting Time Series Analysis ({self.start_date_str} - {self.end_date_str})...", flush=True)
-            
-            # Parse dates
             s_date = datetime.strptime(self.start_date_str, "%d.%m.%Y")
             e_date = datetime.strptime(self.end_date_str, "%d.%m.%Y")
-            
-            ee_start = ee.Date(s_date.strftime("%Y-%m-%d"))
-            ee_end = ee.Date(e_date.strftime("%Y-%m-%d"))
-            
-            # Fetch Image Collection for trends (NDVI)
-            # Use Sentinel-2
-            collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                          .filterBounds(self.geometry)
-                          .filterDate(ee_start, ee_end)
-                          .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-                          .map(mask_s2_clouds))
-            
-            # Define a function to calculate mean INDICES per class for an image
-            def calculate_class_means(img):
-                date = img.date().format('YYYY-MM-dd')
-                
-                # Scale bands to 0-1 (Sentinel-2 L2A is 0-10000 range usually)
-                # We need to cast to float for division
-                img = img.divide(10000.0)
-                
-                b2 = img.select('B2')
-                b3 = img.select('B3')
-                b4 = img.select('B4')
-                b5 = img.select('B5')
-                b6 = img.select('B6')
-                b8 = img.select('B8')
-                b11 = img.select('B11')
-
-                # Calculate Indices
-                # NDVI = (B8 - B4) / (B8 + B4)
-                ndvi = img.normalizedDifference(['B8', 'B4']).rename('NDVI')
-                
-                # GNDVI = (B8 - B3) / (B8 + B3)
-                gndvi = img.normalizedDifference(['B8', 'B3']).rename('GNDVI')
-                
-                # NDWI = (B8 - B11) / (B8 + B11)  (Gao - Water Content)
-                ndwi = img.normalizedDifference(['B8', 'B11']).rename('NDWI')
-                
-                # NDRE = (B8 - B5) / (B8 + B5)
-                ndre = img.normalizedDifference(['B8', 'B5']).rename('NDRE')
-                
-                # RENDVI = (B6 - B5) / (B6 + B5)
-                rendvi = img.normalizedDifference(['B6', 'B5']).rename('RENDVI')
-                
-                # EVI = 2.5 * ((B8 - B4) / (B8 + 6*B4 - 7.5*B2 + 1))
-                # Note: using 1.0 instead of 10000 because we scaled bands to 0-1
-                evi = b8.subtract(b4).divide(
-                    b8.add(b4.multiply(6)).subtract(b2.multiply(7.5)).add(1)
-                ).multiply(2.5).rename('EVI')
-                
-                # SAVI = ((B8 - B4) / (B8 + B4 + 0.5)) * 1.5
-                savi = b8.subtract(b4).divide(
-                    b8.add(b4).add(0.5)
-                ).multiply(1.5).rename('SAVI')
-
-                # Combine all bands
-                combined_indices = (ndvi
-                                   .addBands(gndvi)
-                                   .addBands(ndwi)
-                                   .addBands(ndre)
-                                   .addBands(rendvi)
-                                   .addBands(evi)
-                                   .addBands(savi)
-                                   .addBands(classified_img)) # Add class as the last band (or check index)
-                
-                # Reduce
-                # groupField is the index of the class band.
-                # Attributes added above: 0:NDVI, 1:GNDVI, 2:NDWI, 3:NDRE, 4:RENDVI, 5:EVI, 6:SAVI, 7:Class
-                # So groupField=7
-                # We have 7 inputs (indices) + 1 group input (class).
-                # The mean reducer needs 7 inputs. The group reducer needs 1 (group) + N (inputs for child reducer).
-                # Total inputs to group reducer = 7 + 1 = 8.
-                # groupField=7 selects the 8th input (0-indexed).
-                
-                stats = combined_indices.reduceRegion(
-                    reducer=ee.Reducer.mean().repeat(7).group(groupField=7, groupName='class'),
-                    geometry=self.geometry,
-                    scale=10,
-                    maxPixels=1e9,
-                    bestEffort=True
-                )
-                
-                return ee.Feature(None, {'date': date, 'stats': stats.get('groups')})
-
-            # Map over collection
-            # Note: mapping over collection and getting info can be slow or overflow if too many images.
-            # Best to filter/limit.
-            # Let's limit to one image per 10 days? Or just use all?
-            # User wants 3 month period. S2 is every 5 days. Approx 18 images max. Should be fine.
-            
-            timeseries = collection.map(calculate_class_means).getInfo()
-            
-            # Process results into Python dict
-            # Structure: { 'ClassName': {'dates': [], 'NDVI': [], 'GNDVI': [], ...}, ... }
-            
-            print("DEBUG: Processing Time Series Results...", flush=True)
-            trend_data = {}
-            
-            # Initialize structure helpers
-            index_names = ['NDVI', 'GNDVI', 'NDWI', 'NDRE', 'RENDVI', 'EVI', 'SAVI']
-            
-            features = timeseries['features']
-            for ft in features:
-                props = ft['properties']
-                date_str = props['date']
-                groups = props['stats'] # List of dicts: [{'class': 1, 'mean': [0.5, 0.4, ...]}, ...]
-                
-                if not groups: continue
-                
-                for grp in groups:
-                    cls_id = str(int(grp['class'])) # Class ID as string
-                    
-                    # When using repeat(7), the output 'mean' is a LIST of 7 values.
-                    # grp = { 'class': 1, 'mean': [val0, val1, ..., val6] }
-                    
-                    mean_vals = grp.get('mean')
-                    if not mean_vals or not isinstance(mean_vals, list):
-                         # Fallback or skip
-                         continue
-                    
-                    # Get Class Name
-                    cls_name = self.label_mapping.get(cls_id, f"Class {cls_id}")
-                    
-                    if cls_name not in trend_data:
-                        trend_data[cls_name] = {'dates': []}
-                        for idx in index_names:
-                            trend_data[cls_name][idx] = []
-                    
-                    trend_data[cls_name]['dates'].append(date_str)
-                    
-                    # Map list values to index names
-                    # Order matches combined_indices order: NDVI, GNDVI, NDWI, NDRE, RENDVI, EVI, SAVI
-                    for i, idx_name in enumerate(index_names):
-                        if i < len(mean_vals):
-                            val = mean_vals[i]
-                            if val is None: val = 0.0
-                            trend_data[cls_name][idx_name].append(val)
-                        else:
-                            trend_data[cls_name][idx_name].append(0.0)
-                    
-            # Sort dates? They should be sorted by collection default.
-            
+
+            trend_data, _ = self.fetch_series(geometry, self.year, s_date, e_date, on_partial=self.partial_signal.emit)
+
             print("DEBUG: Analysis Complete.", flush=True)
             self.finished_signal.emit(trend_data)
 
@@ -192,3 +214,193 @@ class TrendWorker(QObject):
             print("DEBUG: Traceback:", flush=True)
             traceback.print_exc()
             self.error_signal.emit(str(e))
+
+    def load_geometry(self):
+        print("DEBUG: Deserializing geometry...", flush=True)
+        if not self.geometry_json:
+            raise ValueError("No geometry provided")
+        return ee.deserializer.fromJSON(self.geometry_json)
+
+    def fetch_series(self, geometry, year, s_date, e_date, on_partial=None, status_prefix=""):
+        """
+        Per-class index series of one model year over [s_date, e_date).
+        Cached scenes are reused; only new scenes are reduced, in parallel date chunks.
+        'on_partial' receives each finished part (cache first, then chunks in date order).
+        Returns (TrendSeries, complete) where complete is False if some chunks failed.
+        """
+        ee_start = ee.Date(s_date.strftime("%Y-%m-%d"))
+        ee_end = ee.Date(e_date.strftime("%Y-%m-%d"))
+
+        # Fetch Image Collection for trends (NDVI)
+        # Use Sentinel-2
+        collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+                      .filterBounds(geometry)
+                      .filterDate(ee_start, ee_end)
+                      .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
+                      .map(mask_s2_clouds))
+
+        # One mosaic per date (cloud mask applied first so tiles fill each other's gaps)
+        collection = mosaic_by_date(collection)
+
+        # --- INCREMENTAL UPDATE ---
+        # List the scenes in the window and only reduce the ones not cached yet.
+        listing = ee.Dictionary({
+            'ids': collection.aggregate_array('scene_id'),
+            'times': collection.aggregate_array('system:time_start')
+        }).getInfo()
+        scene_ids = listing.get('ids') or []
+        scene_times = listing.get('times') or []
+
+        cached = cache_manager.get_trend_scenes(self.field_hash, year, scene_ids)
+        missing = [(sid, t) for sid, t in zip(scene_ids, scene_times) if sid not in cached]
+        print(f"DEBUG: {year}: {len(cached)} scenes cached, {len(missing)} to reduce", flush=True)
+
+        trend_data = TrendSeries()
+        if cached:
+            part = TrendSeries.from_rows(list(cached.values()), self.label_mapping)
+            if not part.is_empty():
+                trend_data = trend_data.merge(part)
+                if on_partial:
+                    on_partial(part)
+            self.status_signal.emit(f"{status_prefix}Trend data: {len(cached)} scenes from cache, {len(missing)} new")
+
+        if not missing:
+            return trend_data, True
+
+        # Classification model: reused from the registry if the classification step built it
+        print(f"DEBUG: Getting classification model for year {year}...", flush=True)
+        classified_img, _ = get_classification_model(year, geometry, field_key=self.field_hash)
+        if classified_img is None:
+            raise ValueError("Failed to build classification model (Insufficient Data)")
+
+        reduce_fn = class_means_fn(classified_img, geometry)
+        collection = collection.filter(ee.Filter.inList('scene_id', [sid for sid, _ in missing]))
+
+        # Fetch the series in date-ordered chunks with bounded parallelism.
+        # Finished chunks are streamed in order so the dialog can draw early.
+        # Chunks without new scenes are skipped.
+        missing_dates = [datetime.fromtimestamp(t / 1000.0, tz=timezone.utc).replace(tzinfo=None) for _, t in missing]
+        chunks = [(c_start, c_end) for c_start, c_end in split_date_range(s_date, e_date)
+                  if any(c_start <= d < c_end for d in missing_dates)]
+
+        done = {}
+        failed = []
+        next_chunk = 0
+
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS) as executor:
+            futures = {executor.submit(self.fetch_chunk, collection, reduce_fn, c_start, c_end): i
+                       for i, (c_start, c_end) in enumerate(chunks)}
+
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    scene_ids, days, counts, table = future.result()
+                    cache_manager.set_trend_scenes(self.field_hash, year,
+                                                   packed_to_scene_rows(scene_ids, days, counts, table))
+                    done[i] = TrendSeries.from_table(np.repeat(days, counts), table[:, 0], table[:, 1:],
+                                                     self.label_mapping)
+                except Exception as e:
+                    print(f"DEBUG: Chunk {i} failed after retries: {e}", flush=True)
+                    done[i] = None
+                    failed.append(i)
+
+                # Release every chunk that is now contiguous from the start
+                while next_chunk in done:
+                    part = done.pop(next_chunk)
+                    next_chunk += 1
+                    if part is not None and not part.is_empty():
+                        trend_data = trend_data.merge(part)
+                        if on_partial:
+                            on_partial(part)
+                    self.status_signal.emit(f"{status_prefix}Trend data: {next_chunk}/{len(chunks)} periods loaded")
+
+        if failed and len(failed) == len(chunks) and trend_data.is_empty():
+            raise RuntimeError("All trend requests failed. Please try again.")
+        if failed:
+            self.status_signal.emit(f"{status_prefix}Trend data incomplete: {len(failed)} of {len(chunks)} periods could not be loaded.")
+        return trend_data, not failed
+
+    def fetch_chunk(self, collection, reduce_fn, c_start, c_end):
+        """Reduces one date chunk (retrying on EE errors) into packed per-scene arrays."""
+        sub = collection.filterDate(ee.Date(c_start.strftime("%Y-%m-%d")),
+                                         ee.Date(c_end.strftime("%Y-%m-%d")))
+        last_error = None
+        for attempt in range(CHUNK_RETRIES):
+            try:
+                return fetch_packed_means(sub, reduce_fn)
+            except Exception as e:
+                last_error = e
+                print(f"DEBUG: Chunk {c_start:%Y-%m-%d} attempt {attempt + 1} failed: {e}", flush=True)
+                time.sleep(2 ** attempt)
+        raise last_error
+
+
+class MultiYearTrendWorker(TrendWorker):
+    """
+    Same date window over the selected year and the previous 'n_years' seasons.
+    Seasons are fetched concurrently; finished past seasons are cached as whole
+    series, so repeat comparisons skip listing and model building entirely.
+    finished_signal emits a MultiYearSeries aligned by day of year.
+    """
+
+    def __init__(self, geometry_json, year, start_date_str, end_date_str, legend_colors, label_mapping=None,
+                 field_hash=None, n_years=COMPARE_YEARS):
+        super().__init__(geometry_json, year, start_date_str, end_date_str, legend_colors, label_mapping, field_hash)
+        self.n_years = n_years
+
+    def process(self):
+        print("DEBUG: MultiYearTrendWorker process started", flush=True)
+        try:
+            geometry = self.load_geometry()
+            s_date = datetime.strptime(self.start_date_str, "%d.%m.%Y")
+            e_date = datetime.strptime(self.end_date_str, "%d.%m.%Y")
+
+            offsets = range(-self.n_years, 1)
+            series_by_year = {}
+            failed = []
+
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_YEARS) as executor:
+                futures = {executor.submit(self.fetch_season, geometry, offset, s_date, e_date): self.year + offset
+                           for offset in offsets}
+                for future in as_completed(futures):
+                    year = futures[future]
+                    try:
+                        series_by_year[year] = future.result()
+                    except Exception as e:
+                        print(f"DEBUG: Season {year} failed: {e}", flush=True)
+                        series_by_year[year] = None
+                        failed.append(year)
+                    self.status_signal.emit(f"Season comparison: {len(series_by_year)}/{len(futures)} years loaded")
+
+            if len(failed) == len(offsets):
+                raise RuntimeError("All seasons failed to load. Please try again.")
+            if failed:
+                self.status_signal.emit(f"Season comparison incomplete: {', '.join(map(str, sorted(failed)))} could not be loaded.")
+
+            print("DEBUG: Multi-year Analysis Complete.", flush=True)
+            self.finished_signal.emit(MultiYearSeries.from_series(series_by_year))
+
+        except Exception as e:
+            print("DEBUG: Traceback:", flush=True)
+            traceback.print_exc()
+            self.error_signal.emit(str(e))
+
+    def fetch_season(self, geometry, offset, s_date, e_date):
+        """Series of one season, from the whole-season cache when it is already complete."""
+        year = self.year + offset
+        s_y = shift_years(s_date, offset)
+        e_y = shift_years(e_date, offset)
+        # The stored series has the labels applied, so they are part of the key
+        key = (self.field_hash, s_y.strftime("%Y-%m-%d"), e_y.strftime("%Y-%m-%d"),
+               f"series_{year}_{labels_key(self.label_mapping)}")
+
+        cached = cache_manager.get(*key, analysis_type="trend")
+        if cached:
+            print(f"DEBUG: Season {year} from cache", flush=True)
+            return TrendSeries.from_dict(cached)
+
+        series, complete = self.fetch_series(geometry, year, s_y, e_y, status_prefix=f"{year} ")
+        # Only a finished season is final; the current one keeps getting new scenes
+        if complete and e_y < datetime.now():
+            cache_manager.set(*key, series.to_dict(), analysis_type="trend")
+        return series
@@ -0,0 +1,174 @@
+import ee
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from core.ee_utils import mask_s2_clouds
+
+# --- IMAGE SELECTION SETTINGS ---
+S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
+MAX_SCENE_CLOUD = 30         # Scene cloud threshold shared by the stats and the map layer
+CANDIDATE_WINDOW_DAYS = 60   # Search window before / after a date without an exact scene
+MAX_RESOLVED = 64
+MAX_DAY_GRANULES = 4         # Granules of the closest day compared by the before / after search
+SCENE_INGEST_LAG_DAYS = 3    # Granules of a recent day can still be added to the catalog
+RECENT_SELECTION_TTL = 3600  # Seconds a selection whose search window reaches that lag stays memoized
+
+# Resolved selections are shared by AnalysisWorker and MapLayerWorker, so one
+# analysis queries the scene metadata once and both show the same image.
+_lock = threading.Lock()
+_resolved = OrderedDict()    # (field key, mode, date1, date2, specific date) -> (selection, expiry or None)
+_resolve_locks = {}          # same key -> lock held while resolving
+
+
+def filtered_collection(geometry, start, end, max_cloud=MAX_SCENE_CLOUD):
+    return (ee.ImageCollection(S2_COLLECTION)
+            .filterBounds(geometry)
+            .filterDate(start, end)
+            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', max_cloud)))
+
+
+def s2_collection(geometry, start, end, max_cloud=MAX_SCENE_CLOUD):
+    """Cloud-filtered and cloud-masked S2 collection every target image comes from."""
+    return filtered_collection(geometry, start, end, max_cloud).map(mask_s2_clouds)
+
+
+def pack_scenes(collection):
+    """Flat [time_ms, cloud %, scene id, ...] list of a (limited) collection; empty list if none."""
+    return (ee.List(collection.aggregate_array('system:time_start'))
+            .zip(collection.aggregate_array('CLOUDY_PIXEL_PERCENTAGE'))
+            .zip(collection.aggregate_array('system:index'))
+            .flatten())
+
+
+def least_cloudy(collection):
+    """Collection ordered least cloudy granule first, so .first() / .limit(1) picks the scene list's granule."""
+    return collection.sort('CLOUDY_PIXEL_PERCENTAGE')
+
+
+def list_scenes(geometry, start, end):
+    """
+    Usable scenes of a period in date order (one request):
+    [{'date': 'YYYY-MM-DD', 'cloud': %, 'scene': id}, ...], one entry per day (least cloudy granule).
+    """
+    values = pack_scenes(filtered_collection(geometry, start, end).sort('system:time_start')).getInfo() or []
+    by_date = {}
+    for t, cloud, scene_id in zip(values[0::3], values[1::3], values[2::3]):
+        date = datetime.fromtimestamp(t / 1000.0).strftime('%Y-%m-%d')
+        if date not in by_date or cloud < by_date[date]['cloud']:
+            by_date[date] = {'date': date, 'cloud': cloud, 'scene': scene_id}
+    return [by_date[d] for d in sorted(by_date)]
+
+
+def scene_selection(date, scene_id=None):
+    """
+    Selection of a catalog scene (same form as an exact match from resolve_selection).
+    With 'scene_id' (system:index) that granule is shown instead of the day's least cloudy one.
+    """
+    selection = {'kind': 'scene', 'date': date, 'exact': True}
+    if scene_id:
+        selection['scene'] = scene_id
+    return selection
+
+
+def _search(geometry, date_str):
+    """Exact-date scene, or the closest scene before / after the date (one request)."""
+    center = ee.Date(date_str)
+    packed = ee.Dictionary({
+        'EXACT': pack_scenes(
+            least_cloudy(filtered_collection(geometry, center, center.advance(1, 'day'))).limit(1)),
+        'BEFORE': pack_scenes(
+            filtered_collection(geometry, center.advance(-CANDIDATE_WINDOW_DAYS, 'day'), center)
+            .sort('system:time_start', False).limit(MAX_DAY_GRANULES)),
+        'AFTER': pack_scenes(
+            filtered_collection(geometry, center, center.advance(CANDIDATE_WINDOW_DAYS, 'day'))
+            .sort('system:time_start', True).limit(MAX_DAY_GRANULES)),
+    }).getInfo()
+
+    def scene(label):
+        # Closest day, least cloudy of its granules (as in list_scenes and target_image)
+        values = packed.get(label) or []
+        if len(values) < 3:
+            return None
+        dates = [datetime.fromtimestamp(t / 1000.0).strftime('%Y-%m-%d') for t in values[0::3]]
+        cloud, scene_id = min((c, i) for d, c, i in zip(dates, values[1::3], values[2::3]) if d == dates[0])
+        return {'label': label, 'date': dates[0], 'cloud': cloud, 'scene': scene_id}
+
+    exact = scene('EXACT')
+    if exact:
+        print(f"DEBUG: Exact match found! Date: {exact['date']}, Cloud: {exact['cloud']}")
+        return scene_selection(exact['date'], exact['scene'])
+    candidates = [c for c in (scene('BEFORE'), scene('AFTER')) if c]
+    if candidates:
+        return {'kind': 'candidates', 'candidates': candidates}
+    return {'kind': 'none'}
+
+
+def _memoized(key):
+    # Caller holds _lock
+    entry = _resolved.get(key)
+    if entry is None:
+        return None
+    selection, expiry = entry
+    if expiry is not None and time.monotonic() >= expiry:
+        del _resolved[key]
+        return None
+    _resolved.move_to_end(key)
+    return selection
+
+
+def resolve_selection(geometry, field_key, mode, date1, date2=None, specific_date=None):
+    """
+    What an analysis looks at, resolved once per (field, mode, dates) and memoized:
+      {'kind': 'composite', 'start', 'end'}  range mode: median of masked scenes
+      {'kind': 'scene', 'date'}              single scene of that day
+      {'kind': 'candidates', 'candidates'}   no scene on the date; the user picks one
+      {'kind': 'none'}                       nothing usable around the date
+    'none' is not memoized, and a search window reaching into the last
+    SCENE_INGEST_LAG_DAYS is kept for RECENT_SELECTION_TTL only (new scenes can still arrive).
+    Concurrent callers for the same key wait for the first resolution.
+    """
+    if mode == "range":
+        return {'kind': 'composite', 'start': date1, 'end': date2}
+    if specific_date:
+        return {'kind': 'scene', 'date': specific_date[:10]}
+
+    key = (field_key, mode, date1, date2, specific_date)
+    with _lock:
+        selection = _memoized(key)
+        if selection is not None:
+            return selection
+        resolve_lock = _resolve_locks.setdefault(key, threading.Lock())
+
+    try:
+        with resolve_lock:
+            with _lock:
+                selection = _memoized(key)
+            if selection is not None:
+                return selection
+            selection = _search(geometry, date1)
+            if selection['kind'] != 'none':
+                window_end = datetime.strptime(date1[:10], '%Y-%m-%d') + timedelta(days=CANDIDATE_WINDOW_DAYS)
+                recent = window_end > datetime.now() - timedelta(days=SCENE_INGEST_LAG_DAYS)
+                with _lock:
+                    _resolved[key] = (selection, time.monotonic() + RECENT_SELECTION_TTL if recent else None)
+                    while len(_resolved) > MAX_RESOLVED:
+                        _resolved.popitem(last=False)
+    finally:
+        with _lock:
+            _resolve_locks.pop(key, None)
+    return selection
+
+
+def target_image(geometry, selection):
+    """The ee.Image of a resolved selection (None when there is nothing to show yet)."""
+    if selection['kind'] == 'composite':
+        return s2_collection(geometry, selection['start'], selection['end']).median()
+    if selection['kind'] == 'scene':
+        if selection.get('scene'):
+            return mask_s2_clouds(ee.Image(f"{S2_COLLECTION}/{selection['scene']}"))
+        # A date picked by the user is used as is (clouds masked, not filtered)
+        max_cloud = MAX_SCENE_CLOUD if selection.get('exact') else 100
+        day = ee.Date(selection['date'])
+        return ee.Image(least_cloudy(s2_collection(geometry, day, day.advance(1, 'day'), max_cloud)).first())
+    return None
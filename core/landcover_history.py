@@ -0,0 +1,144 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.classification import fetch_class_histograms, model_key, PRODUCT_LABELS
+
+# --- HISTORY SETTINGS ---
+HISTORY_YEARS = 6          # Seasons classified by default (ending with the last finished one)
+YEARS_PER_REQUEST = 4      # Histograms per getInfo(), keeps each request within EE compute limits
+MAX_PARALLEL_REQUESTS = 2  # Batches in flight at once
+FALLOW_CLASS_ID = '6'      # Stubble / Plowed Soil dominating a season = fallow
+FALLOW_SHARE = 0.5         # ...or covering at least this share of the field
+
+
+class LandCoverHistory:
+    """
+    Class shares of a field over several years.
+
+    years     : list of years (rows)
+    class_ids : list of class id strings (columns, PRODUCT_LABELS keys)
+    shares    : float32 array (years x classes), fraction of the field; NaN rows
+                for years without a classification
+    """
+
+    def __init__(self, years, class_ids, shares):
+        self.years = list(years)
+        self.class_ids = list(class_ids)
+        self.shares = np.asarray(shares, dtype=np.float32)
+
+    @classmethod
+    def from_histograms(cls, histograms):
+        """Builds the matrix from {year: {class_id: pixel count} or None}."""
+        years = sorted(histograms)
+        class_ids = sorted({c for h in histograms.values() if h for c in h}, key=lambda c: int(float(c)))
+        shares = np.full((len(years), len(class_ids)), np.nan, dtype=np.float32)
+        for y, year in enumerate(years):
+            hist = histograms[year]
+            if not hist:
+                continue
+            counts = np.array([hist.get(c, 0) for c in class_ids], dtype=np.float64)
+            if counts.sum() > 0:
+                shares[y] = counts / counts.sum()
+        return cls(years, class_ids, shares)
+
+    def valid_years(self):
+        return ~np.isnan(self.shares).all(axis=1) if self.shares.size else np.zeros(len(self.years), dtype=bool)
+
+    def dominant(self):
+        """Dominant class id per year (None for years without data)."""
+        valid = self.valid_years()
+        if not self.class_ids:
+            return [None] * len(self.years)
+        idx = np.argmax(np.nan_to_num(self.shares, nan=-1.0), axis=1)
+        return [self.class_ids[i] if ok else None for i, ok in zip(idx, valid)]
+
+    def rotation_stats(self):
+        """
+        Rotation / fallow statistics from the dominant class sequence:
+        'dominant' (labels per year), 'changes', 'rotation_index' (changes per
+        consecutive year pair), 'longest_monoculture' (years), 'fallow_years',
+        'class_frequency' ({label: share of years dominant}).
+        """
+        dominant = self.dominant()
+        seq = [(year, cls_id) for year, cls_id in zip(self.years, dominant) if cls_id is not None]
+        labels = {year: PRODUCT_LABELS.get(cls_id, f"Class {cls_id}") for year, cls_id in seq}
+
+        changes = sum(1 for (_, a), (_, b) in zip(seq, seq[1:]) if a != b)
+        longest = run = 0
+        prev = None
+        for _, cls_id in seq:
+            run = run + 1 if cls_id == prev else 1
+            longest = max(longest, run)
+            prev = cls_id
+
+        fallow = []
+        if FALLOW_CLASS_ID in self.class_ids:
+            col = self.shares[:, self.class_ids.index(FALLOW_CLASS_ID)]
+            fallow = [year for year, share, cls_id in zip(self.years, col, dominant)
+                      if cls_id == FALLOW_CLASS_ID or (not np.isnan(share) and share >= FALLOW_SHARE)]
+
+        frequency = {}
+        for _, cls_id in seq:
+            label = PRODUCT_LABELS.get(cls_id, f"Class {cls_id}")
+            frequency[label] = frequency.get(label, 0) + 1.0 / len(seq)
+
+        return {
+            'dominant': labels,
+            'changes': changes,
+            'rotation_index': changes / (len(seq) - 1) if len(seq) > 1 else None,
+            'longest_monoculture': longest,
+            'fallow_years': fallow,
+            'class_frequency': frequency,
+        }
+
+
+def history_years(n_years=HISTORY_YEARS, last_year=None):
+    """The last 'n_years' seasons up to 'last_year' (default: the last finished one)."""
+    if last_year is None:
+        now = datetime.now()
+        last_year = now.year if now.month >= 11 else now.year - 1
+    return list(range(last_year - n_years + 1, last_year + 1))
+
+
+def fetch_history(geometry, years, field_key=None, progress=None):
+    """
+    Land-cover history of a field. Finished years come from the permanent
+    histogram cache; the rest are fetched YEARS_PER_REQUEST at a time (one
+    metadata and one histogram request per batch), batches in parallel.
+    'progress' is called with (years done, years total).
+    """
+    key = field_key or model_key(geometry)
+    batches = [years[i:i + YEARS_PER_REQUEST] for i in range(0, len(years), YEARS_PER_REQUEST)]
+    histograms = {}
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+        futures = [executor.submit(fetch_class_histograms, batch, geometry, key) for batch in batches]
+        for future in futures:
+            histograms.update(future.result())
+            if progress:
+                progress(len(histograms), len(years))
+
+    return LandCoverHistory.from_histograms(histograms)
+
+
+class LandCoverHistoryWorker(QThread):
+    finished_signal = pyqtSignal(object)  # LandCoverHistory
+    status_signal = pyqtSignal(str)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, geometry, years=None, field_hash=None):
+        super().__init__()
+        self.geometry = geometry
+        self.years = years or history_years()
+        self.field_hash = field_hash
+
+    def run(self):
+        try:
+            history = fetch_history(
+                self.geometry, self.years, self.field_hash,
+                progress=lambda done, total: self.status_signal.emit(f"Land cover history: {done}/{total} years"))
+            self.finished_signal.emit(history)
+        except Exception as e:
+            print(f"LAND COVER HISTORY ERROR: {e}")
+            self.error_signal.emit(str(e))
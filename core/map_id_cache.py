@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from core.cache_utils import cache_manager, geometry_hash
+from core.tile_proxy import tile_proxy, NON_FINAL_TILE_AGE
+
+# --- MAP ID CACHE SETTINGS ---
+# EE map ids stop working after roughly a day; stay safely below that
+MAP_ID_TTL = timedelta(hours=20)
+REFRESH_AFTER = timedelta(hours=12)   # Older entries are served and renewed in the background
+MAX_PARALLEL_REFRESHES = 2
+
+_lock = threading.Lock()
+_refreshing = set()
+_refresh_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_REFRESHES)
+
+
+def recipe_key(recipe):
+    """Canonical key of a layer recipe (tuple of plain values describing the layer)."""
+    return geometry_hash(list(recipe))
+
+
+def _store(key, url):
+    cache_manager.set(key, "", "", "map_id", {'url': url, 'created': datetime.now().isoformat()},
+                      analysis_type="map_id")
+
+
+def _refresh(key, recipe, build_url, max_age):
+    try:
+        url = build_url()
+        _store(key, url)
+        tile_proxy.register_layer(url, recipe, max_age)
+        print(f"DEBUG: Map id refreshed for {recipe[0]}")
+    except Exception as e:
+        print(f"Map Id Refresh Error: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def layer_url(recipe, build_url, final=True):
+    """
+    Tile URL of a layer, through the local tile proxy.
+
+    recipe    : tuple identifying the layer content, e.g. ('rgb', field hash, dates..., vis)
+    build_url : callable doing the getMapId() round trip, returns the remote URL template
+    final     : False while the layer content can still change (its tiles are then
+                reused for NON_FINAL_TILE_AGE only)
+
+    A cached map id younger than MAP_ID_TTL is returned immediately; past
+    REFRESH_AFTER it is renewed in the background (the proxy URL stays the same,
+    only its upstream template changes).
+    """
+    key = recipe_key(recipe)
+    max_age = None if final else NON_FINAL_TILE_AGE
+    entry = cache_manager.get(key, "", "", "map_id", analysis_type="map_id", max_age=MAP_ID_TTL)
+
+    if entry is None:
+        url = build_url()
+        _store(key, url)
+        return tile_proxy.register_layer(url, recipe, max_age)
+
+    age = datetime.now() - datetime.fromisoformat(entry['created'])
+    if age > REFRESH_AFTER:
+        with _lock:
+            start = key not in _refreshing
+            _refreshing.add(key)
+        if start:
+            _refresh_pool.submit(_refresh, key, recipe, build_url, max_age)
+    return tile_proxy.register_layer(entry['url'], recipe, max_age)
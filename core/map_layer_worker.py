@@ -1,6 +1,23 @@
-import ee
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt5.QtCore import QThread, pyqtSignal
-from core.ee_utils import mask_s2_clouds
+from core.image_selection import resolve_selection, target_image, list_scenes, scene_selection, selection_is_final
+from core.classification import model_key
+from core.map_id_cache import layer_url
+from core.geometry_pipeline import to_ee_geometry
+
+RGB_VIS = {'bands': ['B4', 'B3', 'B2'], 'min': 0, 'max': 3000, 'gamma': 1.4}
+MAX_PARALLEL_MAP_IDS = 4   # Timeline map ids prepared at once
+
+
+def rgb_layer_url(geo_data, geometry, selection):
+    """Tile URL of the RGB layer of a resolved selection (map id cached per recipe)."""
+    image = target_image(geometry, selection)
+    if not image:
+        return None
+    image = image.clip(geometry)
+    recipe = ('rgb', model_key(geo_data), sorted(selection.items()), sorted(RGB_VIS.items()))
+    return layer_url(recipe, lambda: image.getMapId(RGB_VIS)['tile_fetcher'].url_format,
+                     final=selection_is_final(selection))
 
 
 class MapLayerWorker(QThread):
@@ -17,57 +34,17 @@ class MapLayerWorker(QThread):
 
     def run(self):
         try:
-            # 1. Geometry Setup
-            if isinstance(self.geo_data, dict):
-                if 'geometry' in self.geo_data:
-                    geometry = ee.Geometry(self.geo_data['geometry'])
-                else:
-                    geometry = ee.Geometry(self.geo_data)
-            else:
-                geometry = self.geo_data
-
-            # 2. Image Selection Logic
-            image = None
-            vis_params = {'bands': ['B4', 'B3', 'B2'], 'min': 0, 'max': 3000, 'gamma': 1.4}
-            
-            ee_date = ee.Date(self.date1)
-
-            if self.mode == "range":
-                col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                         .filterBounds(geometry)
-                         .filterDate(self.date1, self.date2)
-                         .map(mask_s2_clouds))
-                
-                # Sort by Cloud Cover (Ascending)
-                image = col.sort('CLOUDY_PIXEL_PERCENTAGE', True).first()
-                
-                if image:
-                    image = image.clip(geometry)
-            
-            elif self.mode == "single":
-                target_date = ee.Date(self.specific_date) if self.specific_date else ee_date
-                
-                search_col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                              .filterBounds(geometry)
-                              .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)))
-
-                if self.specific_date:
-                     col = search_col.filterDate(target_date, target_date.advance(1, 'day'))
-                     image = col.first()
-                else:
-                    col = (search_col
-                           .filterDate(target_date.advance(-30, 'day'), target_date.advance(30, 'day'))
-                           .sort('CLOUDY_PIXEL_PERCENTAGE', True))
-                    
-                    image = col.first()
-
-                if image:
-                    image = image.clip(geometry)
-
-            # 3. Fetch Map ID
-            if image:
-                map_id_dict = image.getMapId(vis_params)
-                tile_url = map_id_dict['tile_fetcher'].url_format
+            geometry = to_ee_geometry(self.geo_data)
+
+            # Same resolved scene as AnalysisWorker
+            selection = resolve_selection(geometry, model_key(self.geo_data), self.mode,
+                                          self.date1, self.date2, self.specific_date)
+            if selection['kind'] == 'candidates':
+                # The analysis asks the user for a date; the layer follows that choice
+                return
+
+            tile_url = rgb_layer_url(self.geo_data, geometry, selection)
+            if tile_url:
                 self.finished_signal.emit(tile_url)
             else:
                 self.error_signal.emit("No suitable map image found.")
@@ -75,3 +52,47 @@ class MapLayerWorker(QThread):
         except Exception as e:
             print(f"Map Worker Error: {e}")
             self.error_signal.emit(str(e))
+
+
+class TimelineWorker(QThread):
+    """
+    Lists every usable scene of a field/period and prepares their RGB map ids in
+    parallel, so stepping along the timeline only swaps an already prepared layer.
+    """
+    scenes_signal = pyqtSignal(list)       # [{'date', 'cloud'}, ...] in date order
+    layer_signal = pyqtSignal(int, str)    # (scene index, tile URL) as each one is ready
+    finished_signal = pyqtSignal()
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, geo_data, date1, date2):
+        super().__init__()
+        self.geo_data = geo_data
+        self.date1 = date1
+        self.date2 = date2
+
+    def run(self):
+        try:
+            geometry = to_ee_geometry(self.geo_data)
+            scenes = list_scenes(geometry, self.date1, self.date2)
+            self.scenes_signal.emit(scenes)
+            if not scenes:
+                self.finished_signal.emit()
+                return
+
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_MAP_IDS) as executor:
+                futures = {executor.submit(rgb_layer_url, self.geo_data, geometry,
+                                           scene_selection(sc['date'], sc['scene'])): i
+                           for i, sc in enumerate(scenes)}
+                for future in as_completed(futures):
+                    try:
+                        url = future.result()
+                    except Exception as e:
+                        print(f"Timeline Layer Error ({scenes[futures[future]]['date']}): {e}")
+                        continue
+                    if url:
+                        self.layer_signal.emit(futures[future], url)
+            self.finished_signal.emit()
+
+        except Exception as e:
+            print(f"Timeline Worker Error: {e}")
+            self.error_signal.emit(str(e))
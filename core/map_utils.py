@@ -1,24 +1,23 @@
-
 import ee
 import geemap.foliumap as geemap
 from folium import plugins
 import os
 
+BASEMAP_URL = "https://mt1.google.com/vt/lyrs=y&x={x}&y={y}&z={z}"
 
-def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, output_file="temp_map.html"):
-    if mode == "range":
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterDate(date1, date2).filter(
-            ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)).median()
-    else:
-        t = ee.Date(date1)
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterDate(t.advance(-15, 'day'),
-                                                                          t.advance(15, 'day')).median()
 
+def create_map_shell(center=None, zoom=None, output_file="temp_map.html", basemap_url=BASEMAP_URL):
+    """
+    Writes the map page once. Everything that changes afterwards (imagery layers,
+    saved geometries, view) goes through the JS API (window.mapApi), called from
+    Python via gui.map_bridge.MapBridge; map events are posted back the same way.
+    'basemap_url' may point at the local tile proxy (core.tile_proxy).
+    """
     # Use stored view if available, otherwise default to Turkey
     map_center = center if center else [39.0, 35.0]
     map_zoom = zoom if zoom else 6
 
-    m = geemap.Map(center=map_center, zoom=map_zoom, tiles="https://mt1.google.com/vt/lyrs=y&x={x}&y={y}&z={z}",
+    m = geemap.Map(center=map_center, zoom=map_zoom, tiles=basemap_url,
                    attr="Google Hybrid")
 
     draw = plugins.Draw(export=False, position='topleft',
@@ -46,16 +45,75 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
         box-shadow: 0 2px 5px rgba(0,0,0,0.3);
         display: none;
     }
+    .class-overlay {
+        image-rendering: pixelated;
+    }
     #btnExitView:hover {
         background-color: #B71C1C;
     }
     </style>
     <button id="btnExitView" onclick="exitSavedView()">Alan Görünümünden Çık</button>
+    <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
     <script>
     document.addEventListener("DOMContentLoaded", function() {
         var mapInstance = null;
         var attempts = 0;
         var viewDebounceTimer = null;
+        var readyQueue = [];
+        var drawnLayers = [];
+
+        // --- Python bridge (QWebChannel, see gui/map_bridge.py) ---
+        var bridge = null;
+        var outbox = [];
+        var flushScheduled = false;
+
+        // Messages are queued and posted as one batch per tick; a newer view/moving
+        // event replaces an unsent one of the same type, nothing else is dropped.
+        function sendToPython(msg) {
+            if (msg.type === 'view' || msg.type === 'moving') {
+                outbox = outbox.filter(function(m) { return m.type !== msg.type; });
+            }
+            outbox.push(msg);
+            scheduleFlush();
+        }
+
+        function scheduleFlush() {
+            if (flushScheduled || !bridge) return;
+            flushScheduled = true;
+            setTimeout(function() {
+                flushScheduled = false;
+                if (!outbox.length) return;
+                var batch = outbox;
+                outbox = [];
+                bridge.post(JSON.stringify(batch));
+            }, 0);
+        }
+
+        // Geometry travels as base64 Float64 [lng, lat, ...] plus ring lengths
+        function packGeometry(geom) {
+            var rings;
+            if (geom.type === 'Polygon') rings = geom.coordinates;
+            else if (geom.type === 'LineString') rings = [geom.coordinates];
+            else rings = [[geom.coordinates]];
+
+            var n = 0;
+            rings.forEach(function(r) { n += r.length; });
+            var buf = new Float64Array(n * 2), i = 0;
+            rings.forEach(function(r) {
+                r.forEach(function(c) { buf[i++] = c[0]; buf[i++] = c[1]; });
+            });
+            var bytes = new Uint8Array(buf.buffer), bin = '';
+            for (var j = 0; j < bytes.length; j += 0x8000) {
+                bin += String.fromCharCode.apply(null, bytes.subarray(j, j + 0x8000));
+            }
+            return {type: 'geometry', geomType: geom.type,
+                    parts: rings.map(function(r) { return r.length; }), coords: btoa(bin)};
+        }
+
+        // Runs fn now, or as soon as the Leaflet map has been found
+        function whenReady(fn) {
+            if (mapInstance) { fn(); } else { readyQueue.push(fn); }
+        }
 
         function findMap() {
             var found = false;
@@ -70,7 +128,7 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
                     // --- NEW: Track Map Movement with JS Debounce ---
                     map.on('movestart', function() {
                         clearTimeout(viewDebounceTimer);
-                        document.title = "MOVING";
+                        sendToPython({type: 'moving'});
                     });
 
                     map.on('moveend', function() {
@@ -78,21 +136,23 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
                         viewDebounceTimer = setTimeout(function() {
                             var center = map.getCenter();
                             var zoom = map.getZoom();
-                            // Send view state to Python via title after 3s stability
-                            document.title = "VIEW:" + center.lat + "," + center.lng + "," + zoom;
+                            // Send view state to Python after 3s stability
+                            sendToPython({type: 'view', lat: center.lat, lng: center.lng, zoom: zoom});
                         }, 3000);
                     });
 
                     map.on(L.Draw.Event.CREATED, function(e){
                         var layer = e.layer;
                         var geojson = layer.toGeoJSON();
-                        document.title = "GEOJSON:" + JSON.stringify(geojson);
+                        sendToPython(packGeometry(geojson.geometry));
                         map.addLayer(layer);
+                        drawnLayers.push(layer);
                     });
                     map.on(L.Draw.Event.DELETED, function(e){
-                        document.title = "RESET";
+                        sendToPython({type: 'reset'});
                     });
                     found = true;
+                    while (readyQueue.length) { readyQueue.shift()(); }
                     break;
                 }
             }
@@ -103,10 +163,10 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
         }
         findMap();
         window.flyToLocation = function(lat, lon, zoom) {
-            if (mapInstance) {
+            whenReady(function() {
                 var z = zoom || 12;
                 mapInstance.flyTo([lat, lon], z, {animate: true, duration: 1.5});
-            }
+            });
         };
 
         // --- NEW: Show Saved Polygon & Zoom ---
@@ -144,7 +204,7 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
                 var btn = document.getElementById('btnExitView');
                 if(btn) btn.style.display = 'none';
 
-                document.title = "EXIT_VIEW";
+                sendToPython({type: 'exit_view'});
             }
         };
 
@@ -152,29 +212,164 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
         window.sentinelLayer = null;
 
         window.addSentinelLayer = function(url, opacity) {
-            if (mapInstance) {
+            whenReady(function() {
                 if (window.sentinelLayer) {
                     mapInstance.removeLayer(window.sentinelLayer);
                 }
                 var op = opacity !== undefined ? opacity : 1.0;
-                window.sentinelLayer = L.tileLayer(url, {
-                    attribution: 'Sentinel-2',
-                    opacity: op,
-                    maxZoom: 18
-                });
+                // Locally rendered rasters come as "<png url>#bounds=south,west,north,east"
+                var overlay = /#bounds=([-0-9.]+),([-0-9.]+),([-0-9.]+),([-0-9.]+)$/.exec(url);
+                if (overlay) {
+                    window.sentinelLayer = L.imageOverlay(url.slice(0, overlay.index),
+                        [[+overlay[1], +overlay[2]], [+overlay[3], +overlay[4]]],
+                        {opacity: op, className: 'class-overlay'});
+                } else {
+                    window.sentinelLayer = L.tileLayer(url, {
+                        attribution: 'Sentinel-2',
+                        opacity: op,
+                        maxZoom: 18
+                    });
+                }
                 window.sentinelLayer.addTo(mapInstance);
 
                 console.log("Sentinel Layer Added: " + url + " Opacity: " + op);
-            }
+            });
         };
 
         window.removeSentinelLayer = function() {
-            if (mapInstance && window.sentinelLayer) {
-                mapInstance.removeLayer(window.sentinelLayer);
-                window.sentinelLayer = null;
-                console.log("Sentinel Layer Removed");
+            whenReady(function() {
+                if (window.sentinelLayer) {
+                    mapInstance.removeLayer(window.sentinelLayer);
+                    window.sentinelLayer = null;
+                    console.log("Sentinel Layer Removed");
+                }
+            });
+        };
+
+        window.setMapView = function(lat, lon, zoom) {
+            whenReady(function() {
+                mapInstance.setView([lat, lon], zoom || mapInstance.getZoom(), {animate: false});
+            });
+        };
+
+        window.deleteSelectedArea = function() {
+            whenReady(function() {
+                drawnLayers.forEach(function(layer) { mapInstance.removeLayer(layer); });
+                drawnLayers = [];
+            });
+        };
+
+        // --- Saved fields layer: every record, culled to the viewport, clustered when zoomed out ---
+        var savedFields = [];
+        var savedFieldsGroup = null;
+        var savedFieldsRenderer = null;
+        var CLUSTER_BELOW_ZOOM = 12;
+        var CLUSTER_CELL_PX = 60;
+
+        // payload from core/saved_fields.pack_saved_fields (quantized Int32 deltas)
+        window.setSavedFields = function(payload) {
+            whenReady(function() {
+                var bin = atob(payload.coords || ''), bytes = new Uint8Array(bin.length);
+                for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+                var q = new Int32Array(bytes.buffer);
+                var ox = payload.origin[0], oy = payload.origin[1], step = payload.quantum, pos = 0;
+
+                savedFields = payload.fields.map(function(f) {
+                    var rings = [], s = 90, w = 180, n = -90, e = -180;
+                    f.parts.forEach(function(len) {
+                        var ring = [], x = 0, y = 0;
+                        for (var k = 0; k < len; k++) {
+                            x += q[pos++];
+                            y += q[pos++];
+                            var lng = ox + x * step, lat = oy + y * step;
+                            ring.push([lat, lng]);
+                            if (lat < s) s = lat;
+                            if (lat > n) n = lat;
+                            if (lng < w) w = lng;
+                            if (lng > e) e = lng;
+                        }
+                        rings.push(ring);
+                    });
+                    return {name: f.name, color: f.color, health: f.health, rings: rings, layer: null,
+                            bounds: L.latLngBounds([s, w], [n, e]), center: L.latLng((s + n) / 2, (w + e) / 2)};
+                });
+
+                if (!savedFieldsGroup) {
+                    savedFieldsRenderer = L.canvas({padding: 0.2});
+                    savedFieldsGroup = L.layerGroup().addTo(mapInstance);
+                    mapInstance.on('moveend', renderSavedFields);
+                }
+                renderSavedFields();
+            });
+        };
+
+        function renderSavedFields() {
+            savedFieldsGroup.clearLayers();
+            var view = mapInstance.getBounds().pad(0.2);
+            var zoom = mapInstance.getZoom();
+            var visible = savedFields.filter(function(f) { return view.intersects(f.bounds); });
+
+            if (zoom < CLUSTER_BELOW_ZOOM) {
+                // Grid clustering in screen space: one marker per cell, dominant health colour
+                var cells = {};
+                visible.forEach(function(f) {
+                    var p = mapInstance.project(f.center, zoom);
+                    var key = Math.floor(p.x / CLUSTER_CELL_PX) + ':' + Math.floor(p.y / CLUSTER_CELL_PX);
+                    var c = cells[key] || (cells[key] = {fields: [], colors: {}, bounds: L.latLngBounds(f.bounds.getSouthWest(), f.bounds.getNorthEast())});
+                    c.fields.push(f);
+                    c.colors[f.color] = (c.colors[f.color] || 0) + 1;
+                    c.bounds.extend(f.bounds);
+                });
+                Object.keys(cells).forEach(function(key) {
+                    var c = cells[key], n = c.fields.length;
+                    var color = Object.keys(c.colors).sort(function(a, b) { return c.colors[b] - c.colors[a]; })[0];
+                    L.circleMarker(c.bounds.getCenter(), {
+                        renderer: savedFieldsRenderer, radius: Math.min(22, 6 + 3 * Math.log2(n + 1)),
+                        color: '#ffffff', weight: 1.5, fillColor: color, fillOpacity: 0.85
+                    }).bindTooltip(n === 1 ? c.fields[0].name : n + ' saved fields')
+                      .on('click', function() { mapInstance.fitBounds(c.bounds.pad(0.1)); })
+                      .addTo(savedFieldsGroup);
+                });
+                return;
             }
+
+            visible.forEach(function(f) {
+                if (!f.layer) {
+                    f.layer = L.polygon(f.rings, {renderer: savedFieldsRenderer, color: f.color,
+                                                  weight: 1.5, fillOpacity: 0.3})
+                        .bindTooltip(f.name + (f.health ? ' (health ' + f.health + ')' : ''));
+                }
+                savedFieldsGroup.addLayer(f.layer);
+            });
+        }
+
+        // Single entry point for Python: mapApi.<command>(...)
+        window.mapApi = {
+            deleteSelectedArea: window.deleteSelectedArea,
+            addLayer: window.addSentinelLayer,
+            removeLayer: window.removeSentinelLayer,
+            flyTo: window.flyToLocation,
+            setView: window.setMapView,
+            showGeometry: window.showSavedGeometry,
+            exitSavedView: window.exitSavedView,
+            setSavedFields: window.setSavedFields
         };
+
+        if (typeof qt !== 'undefined' && typeof QWebChannel !== 'undefined') {
+            new QWebChannel(qt.webChannelTransport, function(channel) {
+                bridge = channel.objects.bridge;
+                bridge.command.connect(function(name, argsJson) {
+                    var fn = window.mapApi[name];
+                    if (fn) {
+                        fn.apply(null, JSON.parse(argsJson));
+                    } else {
+                        console.error("Unknown map command: " + name);
+                    }
+                });
+                outbox.unshift({type: 'ready'});
+                scheduleFlush();
+            });
+        }
     });
     </script>
     """
@@ -189,7 +384,3 @@ def create_map_html(date1, date2=None, mode="range", center=None, zoom=None, out
             f.write(new_content)
     except Exception as e:
         print(f"Map file error: {e}")
-
-
-
-
@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from core.cache_utils import cache_manager, geometry_hash
+from core.trend_series import TrendSeries
+from core.smoothing import smooth_series
+
+SEASON_THRESHOLD = 0.20   # SOS/EOS at 20% of the seasonal amplitude
+PEAK_WINDOW_DAYS = 10     # +/- days around the peak reported as "peak"
+MIN_AMPLITUDE = 0.10      # Below this NDVI/EVI amplitude there is no real season
+MAX_MEMO_METRICS = 64
+
+_lock = threading.Lock()
+_memo = OrderedDict()  # (field, year, index, labels, newest date, scene count) -> metrics
+
+
+def extract_metrics(dates, values, threshold=SEASON_THRESHOLD):
+    """
+    Vectorized season metrics for many series at once.
+
+    dates  : (T,) day numbers of a regular, gap-free grid (e.g. smoothed TrendSeries)
+    values : (N, T) smoothed NDVI/EVI
+
+    Returns a dict of (N,) float arrays; dates are day numbers, NaN where undefined:
+    'sos', 'eos', 'peak_date', 'peak_value', 'amplitude', 'greenup_rate' (per day).
+    """
+    x = np.asarray(dates, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[None, :]
+    n, t_len = y.shape
+    idx = np.arange(t_len)
+    rows = np.arange(n)
+
+    valid_row = ~np.isnan(y).all(axis=1)
+    y_f = np.where(np.isnan(y), -np.inf, y)
+    peak = np.argmax(y_f, axis=1)
+    peak_value = np.where(valid_row, y[rows, peak], np.nan)
+
+    left = idx[None, :] <= peak[:, None]
+    right = idx[None, :] >= peak[:, None]
+    finite = ~np.isnan(y)
+    base_left = np.where(left & finite, y, np.inf).min(axis=1)
+    base_right = np.where(right & finite, y, np.inf).min(axis=1)
+    base_left = np.where(np.isfinite(base_left), base_left, np.nan)
+    base_right = np.where(np.isfinite(base_right), base_right, np.nan)
+
+    th_left = base_left + threshold * (peak_value - base_left)
+    th_right = base_right + threshold * (peak_value - base_right)
+
+    # SOS: last sample before the peak below the left threshold, then interpolate upward
+    below_l = (y < th_left[:, None]) & (idx[None, :] < peak[:, None])
+    j = np.where(below_l, idx[None, :], -1).max(axis=1)
+    j_ok = j >= 0
+    j_c = np.clip(j, 0, t_len - 2)
+    y0, y1 = y[rows, j_c], y[rows, j_c + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.clip((th_left - y0) / (y1 - y0), 0.0, 1.0)
+    sos = np.where(j_ok, x[j_c] + frac * (x[j_c + 1] - x[j_c]), np.nan)
+
+    # EOS: first sample after the peak below the right threshold, interpolate downward
+    below_r = (y < th_right[:, None]) & (idx[None, :] > peak[:, None])
+    k = np.where(below_r, idx[None, :], t_len).min(axis=1)
+    k_ok = k < t_len
+    k_c = np.clip(k, 1, t_len - 1)
+    y0, y1 = y[rows, k_c - 1], y[rows, k_c]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.clip((y0 - th_right) / (y0 - y1), 0.0, 1.0)
+    eos = np.where(k_ok, x[k_c - 1] + frac * (x[k_c] - x[k_c - 1]), np.nan)
+
+    # Green-up rate: steepest rise between SOS and the peak
+    slope = np.diff(y, axis=1) / np.diff(x)[None, :]
+    rising = (idx[None, :-1] >= j_c[:, None]) & (idx[None, :-1] < peak[:, None])
+    greenup = np.where(rising & ~np.isnan(slope), slope, -np.inf).max(axis=1)
+    greenup = np.where(np.isfinite(greenup) & j_ok, greenup, np.nan)
+
+    amplitude = peak_value - np.fmin(base_left, base_right)
+    no_season = ~valid_row | ~(amplitude >= MIN_AMPLITUDE)
+    out = {
+        'sos': sos,
+        'eos': eos,
+        'peak_date': x[peak].astype(np.float64),
+        'peak_value': peak_value,
+        'amplitude': amplitude,
+        'greenup_rate': greenup,
+    }
+    for key in ('sos', 'eos', 'peak_date', 'greenup_rate'):
+        out[key] = np.where(no_season, np.nan, out[key])
+    return out
+
+
+def series_metrics(series, index_name='NDVI', method='whittaker'):
+    """
+    Season metrics for every class of a TrendSeries.
+    Returns {class_name: {'sos': 'YYYY-MM-DD'|None, 'eos', 'peak_date', 'peak_value',
+                          'amplitude', 'greenup_rate', 'observations'}}.
+    """
+    if series is None or series.is_empty():
+        return {}
+    smoothed = smooth_series(series, method)
+    idx = series.index_of(index_name)
+    metrics = extract_metrics(smoothed.dates, smoothed.values[:, idx, :])
+    observations = (~np.isnan(series.values[:, idx, :])).sum(axis=1)
+
+    result = {}
+    for c, name in enumerate(series.classes):
+        result[name] = {
+            'sos': _day_str(metrics['sos'][c]),
+            'eos': _day_str(metrics['eos'][c]),
+            'peak_date': _day_str(metrics['peak_date'][c]),
+            'peak_value': _float(metrics['peak_value'][c]),
+            'amplitude': _float(metrics['amplitude'][c]),
+            'greenup_rate': _float(metrics['greenup_rate'][c]),
+            'observations': int(observations[c]),
+        }
+    return result
+
+
+def field_metrics(geometry, year, label_mapping=None, index_name='NDVI'):
+    """
+    Season metrics of a field from the cached trend scenes (no EE call).
+    Memoized per field-season and label mapping (labels name and merge the
+    class rows); the key includes the newest cached date so new scenes invalidate it.
+    """
+    field_hash = geometry_hash(geometry)
+    rows = list(cache_manager.get_trend_scenes(field_hash, year).values())
+    if not rows:
+        return None
+    last_date = max(r['date'] for r in rows)
+    labels_key = geometry_hash(sorted((str(k), v) for k, v in (label_mapping or {}).items()))[:12]
+    variant = f"{index_name}_{len(rows)}_{labels_key}"
+    memo_key = (field_hash, int(year), index_name, labels_key, last_date, len(rows))
+
+    with _lock:
+        if memo_key in _memo:
+            _memo.move_to_end(memo_key)
+            return _memo[memo_key]
+
+    cached = cache_manager.get(field_hash, year, last_date, variant, analysis_type="phenology")
+    if cached is None:
+        series = TrendSeries.from_rows(rows, label_mapping)
+        cached = series_metrics(series, index_name)
+        cache_manager.set(field_hash, year, last_date, variant, cached, analysis_type="phenology")
+
+    with _lock:
+        _memo[memo_key] = cached
+        while len(_memo) > MAX_MEMO_METRICS:
+            _memo.popitem(last=False)
+    return cached
+
+
+def estimate_stage(metrics, date_str):
+    """Maps a date onto the season curve of one class. Returns a stage name or None."""
+    if not metrics or not metrics.get('peak_date') or not metrics.get('sos'):
+        return None
+    day = np.datetime64(date_str[:10], 'D')
+    sos = np.datetime64(metrics['sos'], 'D')
+    peak = np.datetime64(metrics['peak_date'], 'D')
+    eos = np.datetime64(metrics['eos'], 'D') if metrics.get('eos') else None
+    window = np.timedelta64(PEAK_WINDOW_DAYS, 'D')
+
+    if day < sos:
+        return "Pre-Season / Emergence"
+    if day < peak - window:
+        return "Green-up (Vegetative Growth)"
+    if day <= peak + window:
+        return "Peak Period (Flowering / Heading)"
+    if eos is None or day < eos:
+        return "Senescence / Maturation"
+    return "Harvest / Post-Season"
+
+
+def stage_from_cache(geometry, year, date_str, label_mapping=None):
+    """
+    Growth stage of the field's best-observed class from its whole season curve.
+    Returns {'stage', 'class', 'metrics'} or None when no cached trend exists.
+    """
+    per_class = field_metrics(geometry, year, label_mapping)
+    if not per_class:
+        return None
+    candidates = [(m['observations'], name) for name, m in per_class.items() if m.get('sos')]
+    if not candidates:
+        return None
+    _, cls_name = max(candidates)
+    stage = estimate_stage(per_class[cls_name], date_str)
+    if not stage:
+        return None
+    return {'stage': stage, 'class': cls_name, 'metrics': per_class[cls_name]}
+
+
+def _day_str(day):
+    if day is None or np.isnan(day):
+        return None
+    return str(np.datetime64(int(round(day)), 'D'))
+
+
+def _float(value):
+    return None if value is None or np.isnan(value) else float(value)
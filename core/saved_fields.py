@@ -0,0 +1,81 @@
+import base64
+import json
+import numpy as np
+from core.geometry_pipeline import simplify_ring
+
+# --- SAVED FIELDS LAYER SETTINGS ---
+SIMPLIFY_TOLERANCE = 2e-5   # Degrees (~2 m); plenty for an overview layer
+QUANTUM = 1e-6              # Coordinate step after quantization (~0.1 m)
+
+# Same thresholds / colours as the health card
+HEALTH_COLORS = (("#EF5350", 40), ("#FFB74D", 70), ("#4CAF50", None))
+NO_DATA_COLOR = "#90A4AE"
+
+
+def health_color(record):
+    """Fill colour of a saved field from its stored health score (NDVI as a fallback)."""
+    try:
+        score = float(record.get("health_score") or 0)
+    except (TypeError, ValueError):
+        score = 0
+    if score <= 0:
+        try:
+            ndvi = float((record.get("indices") or {}).get("NDVI"))
+        except (TypeError, ValueError):
+            return NO_DATA_COLOR
+        score = ndvi / 0.7 * 100
+    for color, limit in HEALTH_COLORS:
+        if limit is None or score < limit:
+            return color
+    return NO_DATA_COLOR
+
+
+def _outer_rings(record):
+    geo = record.get("geometry")
+    if isinstance(geo, str):
+        try:
+            geo = json.loads(geo)
+        except ValueError:
+            return []
+    if not isinstance(geo, dict):
+        return []
+    geo = geo.get("geometry", geo)
+    if geo.get("type") == "Polygon":
+        return [geo["coordinates"][0]]
+    if geo.get("type") == "MultiPolygon":
+        return [poly[0] for poly in geo["coordinates"]]
+    return []
+
+
+def pack_saved_fields(records):
+    """
+    All saved field outlines in one compact payload for the map:
+    {'origin': [lng, lat], 'quantum': QUANTUM,
+     'fields': [{'name', 'color', 'health', 'parts': [ring lengths]}, ...],
+     'coords': base64 little-endian Int32 deltas [dlng, dlat, ...] (per ring, first point from origin)}
+    Rings are simplified and quantized; the browser rebuilds, culls and clusters them.
+    """
+    fields, rings = [], []
+    for name, record in records.items():
+        outer = [simplify_ring(r, SIMPLIFY_TOLERANCE) for r in _outer_rings(record) if len(r) >= 4]
+        if not outer:
+            continue
+        fields.append({'name': name, 'color': health_color(record),
+                       'health': record.get("health_score"), 'parts': [len(r) for r in outer]})
+        rings.extend(outer)
+
+    if not rings:
+        return {'origin': [0, 0], 'quantum': QUANTUM, 'fields': [], 'coords': ""}
+
+    origin = np.min([r.min(axis=0) for r in rings], axis=0)
+    deltas = []
+    for ring in rings:
+        q = np.round((ring - origin) / QUANTUM).astype(np.int64)
+        deltas.append(np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)))
+    packed = np.concatenate(deltas).astype('<i4')
+    return {
+        'origin': origin.tolist(),
+        'quantum': QUANTUM,
+        'fields': fields,
+        'coords': base64.b64encode(packed.tobytes()).decode('ascii'),
+    }
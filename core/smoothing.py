@@ -0,0 +1,209 @@
+import numpy as np
+from core.trend_series import TrendSeries
+
+# Methods offered to the UI: key -> label
+SMOOTHING_METHODS = {
+    'raw': 'Raw',
+    'linear': 'Linear gap-fill',
+    'harmonic': 'Harmonic fit',
+    'savgol': 'Savitzky-Golay',
+    'whittaker': 'Whittaker',
+}
+
+DEFAULT_STEP_DAYS = 5  # S2 revisit; regular grid for Savitzky-Golay / Whittaker
+
+
+# All functions below work on arrays of shape (..., T): any number of leading
+# axes (fields, classes, indices) is processed in one vectorized pass.
+
+def mask_gaps(values, zero_is_gap=True):
+    """Returns a float copy with cloud gaps as NaN (older data stored gaps as 0.0)."""
+    out = np.array(values, dtype=np.float64)
+    if zero_is_gap:
+        out[out == 0.0] = np.nan
+    return out
+
+
+def fill_linear(values, dates=None):
+    """
+    Linear interpolation over NaN gaps along the last axis.
+    'dates' (T,) gives the x positions (defaults to 0..T-1); edges take the nearest value.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    shape = y.shape
+    t_len = shape[-1]
+    flat = y.reshape(-1, t_len)
+    x = np.arange(t_len, dtype=np.float64) if dates is None else np.asarray(dates, dtype=np.float64)
+
+    valid = ~np.isnan(flat)
+    pos = np.arange(t_len)
+    prev_idx = np.maximum.accumulate(np.where(valid, pos, -1), axis=1)
+    next_idx = np.minimum.accumulate(np.where(valid, pos, t_len)[:, ::-1], axis=1)[:, ::-1]
+
+    has_prev = prev_idx >= 0
+    has_next = next_idx < t_len
+    p = np.clip(prev_idx, 0, t_len - 1)
+    n = np.clip(next_idx, 0, t_len - 1)
+    rows = np.arange(flat.shape[0])[:, None]
+    y_prev = flat[rows, p]
+    y_next = flat[rows, n]
+
+    span = x[n] - x[p]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(span > 0, (x[None, :] - x[p]) / span, 0.0)
+    interp = y_prev + w * (y_next - y_prev)
+
+    out = np.where(has_prev & has_next, interp, np.where(has_prev, y_prev, y_next))
+    out[~(has_prev | has_next)] = np.nan
+    out[valid] = flat[valid]
+    return out.reshape(shape)
+
+
+def fill_harmonic(values, dates, n_harmonics=2, period=365.25, fill_only=True):
+    """
+    Least-squares harmonic (Fourier) fit per series; gaps are filled from the fit.
+    Set fill_only=False to return the fitted curve everywhere.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    shape = y.shape
+    flat = y.reshape(-1, shape[-1])
+    t = np.asarray(dates, dtype=np.float64)
+
+    cols = [np.ones_like(t)]
+    for k in range(1, n_harmonics + 1):
+        w = 2.0 * np.pi * k * t / period
+        cols.extend([np.cos(w), np.sin(w)])
+    design = np.stack(cols, axis=1)  # (T, p)
+
+    weights = (~np.isnan(flat)).astype(np.float64)
+    y0 = np.nan_to_num(flat)
+    # Batched weighted normal equations: (X^T W X) beta = X^T W y
+    lhs = np.einsum('tp,nt,tq->npq', design, weights, design)
+    lhs += np.eye(design.shape[1]) * 1e-6  # keeps sparse series solvable
+    rhs = np.einsum('tp,nt->np', design, weights * y0)
+    beta = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+    fitted = beta @ design.T
+
+    # Series with too few points for the model stay as they were
+    enough = weights.sum(axis=1) >= design.shape[1]
+    fitted[~enough] = flat[~enough]
+
+    if fill_only:
+        fitted = np.where(np.isnan(flat), fitted, flat)
+    return fitted.reshape(shape)
+
+
+def savitzky_golay(values, window=5, order=2):
+    """
+    Savitzky-Golay filter along the last axis (regularly spaced samples).
+    Gaps are linearly filled first; ends are padded with the edge value.
+    """
+    if window % 2 == 0:
+        window += 1
+    y = fill_linear(values)
+    t_len = y.shape[-1]
+    if t_len < window:
+        return y
+    half = window // 2
+
+    # Smoothing coefficients = first row of the pseudo-inverse of the Vandermonde matrix
+    offsets = np.arange(-half, half + 1, dtype=np.float64)
+    vander = offsets[:, None] ** np.arange(order + 1)[None, :]
+    coeffs = np.linalg.pinv(vander)[0]
+
+    pad = [(0, 0)] * (y.ndim - 1) + [(half, half)]
+    padded = np.pad(y, pad, mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1)
+    return windows @ coeffs
+
+
+def _penalty_bands(t_len, lam, diff_order):
+    """Bands of lam * D^T D: bands[k, i] = element (i, i - k), k = 0..diff_order."""
+    coefs = np.diff(np.eye(diff_order + 1), n=diff_order, axis=0)[0]
+    rows = np.arange(t_len - diff_order)
+    bands = np.zeros((diff_order + 1, t_len))
+    for q in range(diff_order + 1):
+        for k in range(q + 1):
+            np.add.at(bands[k], rows + q, coefs[q] * coefs[q - k])
+    return lam * bands
+
+
+def whittaker(values, lam=10.0, diff_order=2):
+    """
+    Whittaker smoother with zero weight on gaps (smooths and fills in one solve):
+        (W + lam * D^T D) z = W y
+    The system is banded, so every series is solved at once with a banded
+    Cholesky factorization (O(T) per series instead of a dense T x T solve).
+    Series with fewer observations than the penalty needs are returned as NaN.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    shape = y.shape
+    t_len = shape[-1]
+    flat = y.reshape(-1, t_len)
+    if t_len <= diff_order:
+        return y.copy()
+
+    weights = (~np.isnan(flat)).astype(np.float64)
+    out = np.full_like(flat, np.nan)
+    # Fewer observations leave the system singular (D^T D has a polynomial null space)
+    solvable = weights.sum(axis=1) >= max(2, diff_order)
+    if not solvable.any():
+        return out.reshape(shape)
+    w = weights[solvable]
+    rhs = w * np.nan_to_num(flat[solvable])
+
+    p = diff_order
+    bands = _penalty_bands(t_len, lam, p)
+    chol = np.zeros((w.shape[0], t_len, p + 1))  # chol[:, i, k] = L[i, i - k]
+    for i in range(t_len):
+        for k in range(min(p, i), 0, -1):
+            j = i - k
+            acc = np.full(w.shape[0], bands[k, i])
+            for q in range(1, min(p - k, j) + 1):
+                acc -= chol[:, i, k + q] * chol[:, j, q]
+            chol[:, i, k] = acc / chol[:, j, 0]
+        diag = bands[0, i] + w[:, i] - np.sum(chol[:, i, 1:min(p, i) + 1] ** 2, axis=1)
+        chol[:, i, 0] = np.sqrt(diag)
+
+    # L u = W y, then L^T z = u
+    u = np.empty_like(rhs)
+    for i in range(t_len):
+        acc = rhs[:, i].copy()
+        for k in range(1, min(p, i) + 1):
+            acc -= chol[:, i, k] * u[:, i - k]
+        u[:, i] = acc / chol[:, i, 0]
+    z = np.empty_like(rhs)
+    for i in range(t_len - 1, -1, -1):
+        acc = u[:, i].copy()
+        for k in range(1, min(p, t_len - 1 - i) + 1):
+            acc -= chol[:, i + k, k] * z[:, i + k]
+        z[:, i] = acc / chol[:, i, 0]
+
+    out[solvable] = z
+    return out.reshape(shape)
+
+
+def smooth_series(series, method='whittaker', step_days=DEFAULT_STEP_DAYS, zero_is_gap=True, **kwargs):
+    """
+    Applies a gap-filling / smoothing method to every class and index of a TrendSeries.
+    Savitzky-Golay and Whittaker run on a regular 'step_days' grid.
+    """
+    if method == 'raw' or series is None or series.is_empty():
+        return series
+
+    if method in ('savgol', 'whittaker'):
+        series = series.resample(step_days)
+    values = mask_gaps(series.values, zero_is_gap)
+
+    if method == 'linear':
+        out = fill_linear(values, series.dates)
+    elif method == 'harmonic':
+        out = fill_harmonic(values, series.dates, **kwargs)
+    elif method == 'savgol':
+        out = savitzky_golay(values, **kwargs)
+    elif method == 'whittaker':
+        out = whittaker(values, **kwargs)
+    else:
+        raise ValueError(f"Unknown smoothing method: {method}")
+
+    return TrendSeries(series.dates, series.classes, out.astype(np.float32))
@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from core.image_selection import target_image, scene_selection
+from core.map_layer_worker import RGB_VIS
+
+# --- THUMBNAIL SETTINGS ---
+THUMB_DIR = os.path.join(os.getcwd(), 'thumbnails')
+THUMB_SIZE = 256               # Longest side in pixels
+MAX_PARALLEL_THUMBS = 4
+THUMB_TIMEOUT = 30
+
+
+def thumbnail_path(field_key, scene_id):
+    """On-disk location of a scene preview: one file per (field geometry hash, scene id)."""
+    return os.path.join(THUMB_DIR, f"{field_key}_{scene_id}.png")
+
+
+def _fetch_thumbnail(geometry, field_key, candidate):
+    path = thumbnail_path(field_key, candidate['scene'])
+    if os.path.exists(path):
+        return path
+    try:
+        # The candidate's own granule, as the analysis shows it once the date is picked
+        image = target_image(geometry, scene_selection(candidate['date'], candidate['scene']))
+        url = image.clip(geometry).getThumbURL({
+            **RGB_VIS, 'dimensions': THUMB_SIZE, 'region': geometry, 'format': 'png'})
+        response = requests.get(url, timeout=THUMB_TIMEOUT)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Thumbnail Error ({candidate['date']}): {e}")
+        return None
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def attach_thumbnails(geometry, field_key, candidates):
+    """
+    Adds 'thumb' (PNG path, or None if unavailable) to every candidate scene.
+    Previews are downloaded in parallel and cached on disk, so the date
+    selection dialog opens with them already in place.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_THUMBS) as pool:
+        paths = list(pool.map(lambda c: _fetch_thumbnail(geometry, field_key, c), candidates))
+    for cand, path in zip(candidates, paths):
+        cand['thumb'] = path
+    print(f"DEBUG: {sum(1 for p in paths if p)}/{len(candidates)} candidate thumbnails ready")
+    return candidates
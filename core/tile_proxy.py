@@ -0,0 +1,300 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+# --- TILE PROXY SETTINGS ---
+TILE_CACHE_DIR = os.path.join(os.getcwd(), 'tile_cache')
+MAX_CACHE_BYTES = 512 * 1024 * 1024   # On-disk LRU budget
+MAX_UPSTREAM_FETCHES = 8              # Concurrent tile downloads for visible tiles
+MAX_PREFETCH_FETCHES = 2              # ...and for the prefetch ring
+MAX_PREFETCH_QUEUE = 64               # Pending prefetches beyond this are skipped
+PREFETCH_RING = 1                     # Neighbouring tiles fetched around each request
+MAX_OVERLAYS = 16                     # Locally rendered overlay images kept in memory
+NON_FINAL_TILE_AGE = 6 * 3600         # Seconds tiles of a still-changing layer are reused
+UPSTREAM_TIMEOUT = 15
+
+
+def layer_key(params):
+    """Directory / URL key of a layer from its parameters (any repr-able value)."""
+    return hashlib.md5(repr(params).encode('utf-8')).hexdigest()[:16]
+
+
+def content_type(data):
+    if data[:4] == b'\x89PNG':
+        return 'image/png'
+    if data[:2] == b'\xff\xd8':
+        return 'image/jpeg'
+    return 'application/octet-stream'
+
+
+class TileStore:
+    """
+    On-disk LRU of tiles: <root>/<layer key>/<z>/<x>_<y>.tile.
+    Access order survives restarts through the file mtimes.
+    """
+
+    def __init__(self, root=TILE_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # path -> size, least recently used first
+        self.total = 0
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total += size
+        self._evict()
+
+    def path(self, key, z, x, y):
+        return os.path.join(self.root, key, str(z), f"{x}_{y}.tile")
+
+    def has(self, key, z, x, y):
+        with self.lock:
+            return self.path(key, z, x, y) in self.entries
+
+    def get(self, key, z, x, y):
+        path = self.path(key, z, x, y)
+        with self.lock:
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self.lock:
+                self.total -= self.entries.pop(path, 0)
+            return None
+
+    def put(self, key, z, x, y, data):
+        path = self.path(key, z, x, y)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Tile Store Error: {e}")
+            return
+        with self.lock:
+            self.total -= self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self.total += len(data)
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock (or is the constructor)
+        while self.total > self.max_bytes and self.entries:
+            path, size = self.entries.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    # GET /tiles/<layer key>/<z>/<x>/<y>  or  /overlays/<name>.png
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'overlays':
+            self.send_data(self.server.proxy.get_overlay(parts[1]))
+            return
+        if len(parts) != 5 or parts[0] != 'tiles':
+            self.send_error(404)
+            return
+        try:
+            key, z, x, y = parts[1], int(parts[2]), int(parts[3]), int(parts[4])
+        except ValueError:
+            self.send_error(404)
+            return
+
+        proxy = self.server.proxy
+        data = proxy.get_tile(key, z, x, y)
+        proxy.prefetch_ring(key, z, x, y)
+        self.send_data(data)
+
+    def send_data(self, data):
+        if data is None:
+            self.send_error(404)
+            return
+
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', content_type(data))
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Cache-Control', 'max-age=86400')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Leaflet cancelled the tile (map moved on)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileProxy:
+    """
+    Local HTTP tile proxy for EE and basemap layers.
+
+    Workers call register_layer() with the remote {z}/{x}/{y} template and the
+    parameters the layer was built from; Leaflet then loads tiles from
+    127.0.0.1, which serves them from the TileStore or downloads them
+    (concurrently, one download per tile) and prefetches the surrounding ring.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.layers = {}    # layer key -> remote URL template
+        self.inflight = {}  # (key, z, x, y) -> Future
+        self.overlays = OrderedDict()  # name -> PNG bytes
+        self.prefetch_pending = 0
+        self.store = None
+        self.server = None
+        self.port = None
+        self.fetch_pool = ThreadPoolExecutor(max_workers=MAX_UPSTREAM_FETCHES)
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=MAX_PREFETCH_FETCHES)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_UPSTREAM_FETCHES + MAX_PREFETCH_FETCHES)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def start(self, cache_dir=TILE_CACHE_DIR, max_bytes=MAX_CACHE_BYTES, port=0):
+        """Starts the server on 127.0.0.1 (any free port by default). Returns the port or None."""
+        if self.server is not None:
+            return self.port
+        try:
+            self.store = TileStore(cache_dir, max_bytes)
+            server = ThreadingHTTPServer(('127.0.0.1', port), _TileHandler)
+            server.daemon_threads = True
+            server.proxy = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.server = server
+            self.port = server.server_address[1]
+            print(f"Tile proxy listening on 127.0.0.1:{self.port}")
+        except Exception as e:
+            print(f"Tile Proxy Error: {e}")
+            self.server = None
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def register_layer(self, url_template, params=None, max_age=None):
+        """
+        Returns the local URL template for a remote tile layer. 'params' identifies
+        the layer content (recipe); tiles cached under the same params are reused even
+        when EE hands out a new map id. Without a running proxy the remote URL is returned.
+
+        Layers whose content can still change (current-year classification, recent
+        scenes) pass 'max_age' in seconds: the key then includes the age period, so
+        their tiles are fetched again once it has passed and the old ones age out of the LRU.
+        """
+        if self.server is None:
+            return url_template
+        params = params if params is not None else url_template
+        if max_age:
+            params = (params, int(time.time() // max_age))
+        key = layer_key(params)
+        with self.lock:
+            self.layers[key] = url_template
+        return f"http://127.0.0.1:{self.port}/tiles/{key}/{{z}}/{{x}}/{{y}}"
+
+    def register_overlay(self, name, png):
+        """Serves a locally rendered image; returns its URL (None without a running proxy)."""
+        if self.server is None:
+            return None
+        file_name = f"{layer_key(name)}.png"
+        with self.lock:
+            self.overlays[file_name] = png
+            self.overlays.move_to_end(file_name)
+            while len(self.overlays) > MAX_OVERLAYS:
+                self.overlays.popitem(last=False)
+        return f"http://127.0.0.1:{self.port}/overlays/{file_name}"
+
+    def get_overlay(self, file_name):
+        with self.lock:
+            return self.overlays.get(file_name)
+
+    def get_tile(self, key, z, x, y):
+        data = self.store.get(key, z, x, y)
+        if data is not None:
+            return data
+        future = self._fetch_async((key, z, x, y), self.fetch_pool)
+        return future.result() if future is not None else None
+
+    def prefetch_ring(self, key, z, x, y):
+        n = 2 ** z
+        for dy in range(-PREFETCH_RING, PREFETCH_RING + 1):
+            for dx in range(-PREFETCH_RING, PREFETCH_RING + 1):
+                ny = y + dy
+                if (dx == 0 and dy == 0) or not 0 <= ny < n:
+                    continue
+                tile = (key, z, (x + dx) % n, ny)
+                if self.prefetch_pending >= MAX_PREFETCH_QUEUE:
+                    return
+                if not self.store.has(*tile):
+                    self._fetch_async(tile, self.prefetch_pool, prefetch=True)
+
+    def _fetch_async(self, tile, pool, prefetch=False):
+        with self.lock:
+            future = self.inflight.get(tile)
+            if future is not None:
+                return future
+            template = self.layers.get(tile[0])
+            if template is None:
+                return None
+            future = pool.submit(self._fetch, template, tile)
+            self.inflight[tile] = future
+            if prefetch:
+                self.prefetch_pending += 1
+        future.add_done_callback(lambda f: self._fetch_done(tile, prefetch))
+        return future
+
+    def _fetch_done(self, tile, prefetch):
+        with self.lock:
+            self.inflight.pop(tile, None)
+            if prefetch:
+                self.prefetch_pending -= 1
+
+    def _fetch(self, template, tile):
+        key, z, x, y = tile
+        url = template.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
+        try:
+            response = self.session.get(url, timeout=UPSTREAM_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"Tile Fetch Error: {e}")
+            return None
+        if response.status_code != 200 or not response.content:
+            return None
+        self.store.put(key, z, x, y, response.content)
+        return response.content
+
+
+# Global instance
+tile_proxy = TileProxy()
@@ -0,0 +1,266 @@
+import base64
+import csv
+import hashlib
+import json
+import numpy as np
+
+# Order of the per-class means returned by TrendWorker's grouped reducer
+INDEX_NAMES = ('NDVI', 'GNDVI', 'NDWI', 'NDRE', 'RENDVI', 'EVI', 'SAVI')
+
+
+
+def labels_key(label_mapping):
+    """Short stable key of a class label mapping (labels name and merge series rows)."""
+    items = sorted((str(k), str(v)) for k, v in (label_mapping or {}).items())
+    return hashlib.md5(json.dumps(items).encode('utf-8')).hexdigest()[:12]
+
+
+class TrendSeries:
+    """
+    Columnar per-class index time series.
+
+    dates   : int64 vector, days since 1970-01-01 (sorted, unique)
+    classes : list of class names (row labels of 'values')
+    values  : float32 array (classes x indices x dates), NaN where there is no data
+    """
+
+    def __init__(self, dates=None, classes=None, values=None):
+        self.dates = np.asarray(dates if dates is not None else [], dtype=np.int64)
+        self.classes = list(classes or [])
+        if values is None:
+            values = np.full((len(self.classes), len(INDEX_NAMES), len(self.dates)), np.nan, dtype=np.float32)
+        self.values = np.asarray(values, dtype=np.float32)
+
+    # --- CONSTRUCTION ---
+
+    @classmethod
+    def from_rows(cls, rows, label_mapping=None):
+        """
+        Builds a series from per-scene rows:
+        [{'date': 'YYYY-MM-DD', 'groups': [[class, 7 means], ...]}, ...]
+        Groups in the older {'class': 1, 'mean': [7 values]} form are accepted too.
+        """
+        days, class_ids, means = [], [], []
+        n_idx = len(INDEX_NAMES)
+        for row in rows:
+            for grp in row.get('groups') or []:
+                if isinstance(grp, dict):
+                    cls_id, mean_vals = grp.get('class'), grp.get('mean')
+                    if not mean_vals or not isinstance(mean_vals, list):
+                        continue
+                else:
+                    cls_id, mean_vals = grp[0], grp[1:]
+                days.append(row['date'])
+                class_ids.append(cls_id)
+                means.append((list(mean_vals[:n_idx]) + [None] * n_idx)[:n_idx])
+        if not days:
+            return cls()
+        days = np.array(days, dtype='datetime64[D]').astype(np.int64)
+        return cls.from_table(days, class_ids, np.array(means, dtype=np.float32), label_mapping)
+
+    @classmethod
+    def from_table(cls, days, class_ids, means, label_mapping=None):
+        """
+        Vectorized build from flat per-(date, class) rows, as decoded from the packed
+        server payload: days (N,) day numbers, class_ids (N,), means (N, 7).
+        Ids sharing a label are averaged per date (NaN-aware; legacy 0.0 gaps are
+        left out of the mean and kept only where a date has nothing else).
+        """
+        label_mapping = label_mapping or {}
+        days = np.asarray(days, dtype=np.int64)
+        if days.size == 0:
+            return cls()
+        class_ids = np.asarray(class_ids, dtype=np.float64).astype(np.int64)
+        means = np.asarray(means, dtype=np.float32)
+
+        dates, col = np.unique(days, return_inverse=True)
+        ids, id_pos = np.unique(class_ids, return_inverse=True)
+
+        # Several ids may share a label; they end up on the same row
+        classes = []
+        for cls_id in ids:
+            name = label_mapping.get(str(int(cls_id)), f"Class {int(cls_id)}")
+            if name not in classes:
+                classes.append(name)
+        row_of_id = np.array([classes.index(label_mapping.get(str(int(i)), f"Class {int(i)}")) for i in ids])
+
+        # Accumulated as (classes, dates, indices), transposed at the end
+        means = means[:, :len(INDEX_NAMES)].astype(np.float64)
+        valid = ~np.isnan(means) & (means != 0.0)
+        shape = (len(classes), len(dates), len(INDEX_NAMES))
+        sums, counts, zeros = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool)
+        rows = row_of_id[id_pos]
+        np.add.at(sums, (rows, col), np.where(valid, means, 0.0))
+        np.add.at(counts, (rows, col), valid)
+        np.logical_or.at(zeros, (rows, col), means == 0.0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(counts > 0, sums / counts, np.where(zeros, 0.0, np.nan))
+        return cls(dates, classes, values.transpose(0, 2, 1).astype(np.float32))
+
+    # --- ACCESS ---
+
+    def is_empty(self):
+        return len(self.classes) == 0 or self.dates.size == 0
+
+    def __len__(self):
+        return int(self.dates.size)
+
+    def dates_as_datetime64(self):
+        return self.dates.astype('datetime64[D]')
+
+    def index_of(self, index_name):
+        return INDEX_NAMES.index(index_name)
+
+    def get(self, class_name, index_name):
+        """Values of one class/index over all dates (float32, NaN gaps)."""
+        return self.values[self.classes.index(class_name), self.index_of(index_name)]
+
+    # --- TRANSFORMS ---
+
+    def merge(self, other):
+        """Union of both series; where both have a value 'other' wins."""
+        if other is None or other.is_empty():
+            return self
+        if self.is_empty():
+            return other
+
+        dates = np.union1d(self.dates, other.dates)
+        classes = self.classes + [c for c in other.classes if c not in self.classes]
+        values = np.full((len(classes), len(INDEX_NAMES), len(dates)), np.nan, dtype=np.float32)
+
+        for series in (self, other):
+            rows = np.array([classes.index(c) for c in series.classes])
+            cols = np.searchsorted(dates, series.dates)
+            block = values[rows][:, :, cols]
+            present = ~np.isnan(series.values)
+            block[present] = series.values[present]
+            values[np.ix_(rows, np.arange(len(INDEX_NAMES)), cols)] = block
+        return TrendSeries(dates, classes, values)
+
+    def slice(self, start=None, end=None):
+        """Dates within [start, end]; bounds are 'YYYY-MM-DD' strings or day numbers."""
+        lo = _to_day(start) if start is not None else np.iinfo(np.int64).min
+        hi = _to_day(end) if end is not None else np.iinfo(np.int64).max
+        sel = (self.dates >= lo) & (self.dates <= hi)
+        return TrendSeries(self.dates[sel], self.classes, self.values[:, :, sel])
+
+    def select_classes(self, names):
+        rows = [self.classes.index(n) for n in names if n in self.classes]
+        return TrendSeries(self.dates, [self.classes[r] for r in rows], self.values[rows])
+
+    def resample(self, step_days, origin=None):
+        """
+        Averages the series into regular 'step_days' bins (NaN-aware).
+        Bins are labelled with their first day; empty bins are NaN.
+        """
+        if self.is_empty():
+            return self
+        origin = self.dates[0] if origin is None else _to_day(origin)
+        bins = (self.dates - origin) // step_days
+        n_bins = int(bins.max()) + 1
+        onehot = np.zeros((len(self.dates), n_bins), dtype=np.float32)
+        onehot[np.arange(len(self.dates)), bins] = 1.0
+
+        flat = self.values.reshape(-1, len(self.dates))
+        valid = ~np.isnan(flat)
+        sums = np.where(valid, flat, 0.0) @ onehot
+        counts = valid.astype(np.float32) @ onehot
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts, np.nan)
+
+        dates = origin + np.arange(n_bins, dtype=np.int64) * step_days
+        return TrendSeries(dates, self.classes, means.reshape(len(self.classes), len(INDEX_NAMES), n_bins))
+
+    # --- SERIALIZATION ---
+
+    def to_dict(self):
+        """Compact JSON-safe form (values as base64 float32)."""
+        return {
+            'dates': self.dates.tolist(),
+            'classes': self.classes,
+            'values': base64.b64encode(self.values.astype('<f4').tobytes()).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        dates = np.asarray(data['dates'], dtype=np.int64)
+        classes = data['classes']
+        values = np.frombuffer(base64.b64decode(data['values']), dtype='<f4')
+        return cls(dates, classes, values.reshape(len(classes), len(INDEX_NAMES), len(dates)).copy())
+
+    def to_csv(self, path):
+        """Long-format export: one row per (date, class) with all indices."""
+        date_strs = self.dates_as_datetime64().astype(str)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['date', 'class'] + list(INDEX_NAMES))
+            for c, name in enumerate(self.classes):
+                block = self.values[c]
+                for d, date_str in enumerate(date_strs):
+                    if np.isnan(block[:, d]).all():
+                        continue
+                    writer.writerow([date_str, name] +
+                                    ["" if np.isnan(v) else f"{v:.4f}" for v in block[:, d]])
+
+
+def _to_day(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+class MultiYearSeries:
+    """
+    Several seasons of the same field aligned by day of year.
+
+    years   : list of years (one row per season)
+    days    : int64 vector, day of year of each bin (0 = 1 January, may be negative
+              for windows that start in the previous year)
+    classes : list of class names (union over all years)
+    values  : float32 array (years x classes x indices x days), NaN where there is no data
+    """
+
+    def __init__(self, years, days, classes, values):
+        self.years = list(years)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.classes = list(classes)
+        self.values = np.asarray(values, dtype=np.float32)
+
+    @classmethod
+    def from_series(cls, series_by_year, step_days=5):
+        """Resamples each year's TrendSeries onto one common day-of-year grid."""
+        items = [(y, s) for y, s in sorted(series_by_year.items()) if s is not None and not s.is_empty()]
+        if not items:
+            return cls([], [], [], np.empty((0, 0, len(INDEX_NAMES), 0), dtype=np.float32))
+
+        jan1 = {y: _to_day(f"{y}-01-01") for y, _ in items}
+        lo = min(int(s.dates.min()) - jan1[y] for y, s in items)
+        hi = max(int(s.dates.max()) - jan1[y] for y, s in items)
+        lo = (lo // step_days) * step_days
+        n_bins = (hi - lo) // step_days + 1
+
+        classes = []
+        for _, s in items:
+            classes.extend(c for c in s.classes if c not in classes)
+
+        years = [y for y, _ in sorted(series_by_year.items())]
+        values = np.full((len(years), len(classes), len(INDEX_NAMES), n_bins), np.nan, dtype=np.float32)
+        for y, s in items:
+            res = s.resample(step_days, origin=jan1[y] + lo)
+            rows = [classes.index(c) for c in res.classes]
+            cols = (res.dates - (jan1[y] + lo)) // step_days
+            values[years.index(y)][np.ix_(rows, np.arange(len(INDEX_NAMES)), cols)] = res.values
+        days = lo + np.arange(n_bins, dtype=np.int64) * step_days
+        return cls(years, days, classes, values)
+
+    def is_empty(self):
+        return len(self.years) == 0 or self.days.size == 0
+
+    def get(self, year, class_name, index_name):
+        """Values of one season/class/index over the day-of-year grid (NaN gaps)."""
+        if class_name not in self.classes:
+            return np.full(self.days.shape, np.nan, dtype=np.float32)
+        return self.values[self.years.index(year), self.classes.index(class_name), INDEX_NAMES.index(index_name)]
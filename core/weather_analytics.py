@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from datetime import datetime, timedelta
+from core.cache_utils import cache_manager
+
+# --- AGRO-CLIMATE SETTINGS ---
+GDD_BASE_TEMP = 10.0      # °C, base temperature for most field crops
+GDD_CAP_TEMP = 30.0       # °C, development does not speed up above this
+HEAT_STRESS_TEMP = 35.0   # °C, daily max counted as a heat-stress day
+CELL_SIZE_DEG = 0.1       # Open-Meteo grid is ~0.1°, nearby fields share a cell
+ARCHIVE_LAG_DAYS = 5      # The archive API has no data for the most recent days yet
+MAX_SEASON_MEMO = 64
+
+# Daily variables requested from Open-Meteo and kept in the cache
+DAILY_VARIABLES = ["weathercode", "temperature_2m_max", "temperature_2m_min",
+                   "precipitation_sum", "et0_fao_evapotranspiration"]
+
+_lock = threading.Lock()
+_season_memo = OrderedDict()  # (cell, start, end, base_temp) -> metrics dict
+
+
+def cell_key(lat, lon):
+    """Snaps a coordinate to the weather grid cell it belongs to."""
+    c_lat = round(round(float(lat) / CELL_SIZE_DEG) * CELL_SIZE_DEG, 2)
+    c_lon = round(round(float(lon) / CELL_SIZE_DEG) * CELL_SIZE_DEG, 2)
+    return f"{c_lat:.2f},{c_lon:.2f}"
+
+
+def season_window(start_date, end_date=None, days_back=120):
+    """
+    Returns the (start, end) window used for season metrics.
+    Single dates look back 'days_back' days, ranges are used as given.
+    """
+    if end_date:
+        return start_date, end_date
+    end = datetime.strptime(start_date, "%Y-%m-%d")
+    return (end - timedelta(days=days_back)).strftime("%Y-%m-%d"), start_date
+
+
+def load_daily_series(lat, lon):
+    """
+    Returns the cached daily arrays for the cell as NumPy arrays:
+    {'time', 'checked' (day last fetched): datetime64[D], 'tmax', 'tmin', 'precip', 'et0', 'code': float64}
+    or None if nothing is cached yet.
+    """
+    raw = cache_manager.get(cell_key(lat, lon), None, None, "daily", analysis_type="weather")
+    if not raw or not raw.get('time'):
+        return None
+    return _to_arrays(raw)
+
+
+def missing_range(lat, lon, start_date, end_date):
+    """
+    Returns the (start, end) sub-window that is not in the cache yet,
+    or None if the cached series already covers the whole window.
+
+    Days within ARCHIVE_LAG_DAYS of today are not requested (the archive does not
+    have them yet), and days still empty after a fetch made once they were past
+    the lag are known to be unavailable, so they do not trigger a download either.
+    """
+    last_available = np.datetime64(datetime.now().date()) - ARCHIVE_LAG_DAYS
+    end = min(np.datetime64(end_date), last_available)
+    if np.datetime64(start_date) > end:
+        return None
+    wanted = np.arange(np.datetime64(start_date), end + 1)
+
+    series = load_daily_series(lat, lon)
+    if series is None:
+        return str(wanted[0]), str(wanted[-1])
+
+    known = ~np.isnan(series['tmax']) | (series['checked'] - series['time'] >= ARCHIVE_LAG_DAYS)
+    missing = wanted[~np.isin(wanted, series['time'][known])]
+    if missing.size == 0:
+        return None
+    return str(missing.min()), str(missing.max())
+
+
+def store_daily_series(lat, lon, daily):
+    """
+    Merges an Open-Meteo 'daily' block into the cached series of the cell.
+    Newer values replace older ones for the same day.
+    """
+    key = cell_key(lat, lon)
+    with _lock:
+        raw = cache_manager.get(key, None, None, "daily", analysis_type="weather") or {}
+        checked_on = raw.get('checked_on') or [None] * len(raw.get('time', []))
+        today = datetime.now().strftime("%Y-%m-%d")
+        merged = {}
+        for i, day in enumerate(raw.get('time', [])):
+            merged[day] = {var: raw[var][i] for var in DAILY_VARIABLES if var in raw}
+            merged[day]['checked_on'] = checked_on[i]
+        for i, day in enumerate(daily.get('time', [])):
+            row = merged.setdefault(day, {})
+            row['checked_on'] = today  # Fetched: an empty value now means "not in the archive"
+            for var in DAILY_VARIABLES:
+                values = daily.get(var)
+                if values is not None and i < len(values) and values[i] is not None:
+                    row[var] = values[i]
+
+        days = sorted(merged.keys())
+        out = {'time': days}
+        for var in DAILY_VARIABLES + ['checked_on']:
+            out[var] = [merged[d].get(var) for d in days]
+        cache_manager.set(key, None, None, "daily", out, analysis_type="weather")
+
+        # Drop memoized metrics of this cell, the series has changed
+        for memo_key in [k for k in _season_memo if k[0] == key]:
+            del _season_memo[memo_key]
+
+
+def season_metrics(lat, lon, start_date, end_date, base_temp=GDD_BASE_TEMP):
+    """
+    Computes agro-climate metrics for a season window from the cached series.
+    Memoized per (cell, window, base temperature); no download is made here.
+
+    Returns a dict with daily arrays ('dates', 'gdd_cumulative', 'deficit_cumulative')
+    and totals ('gdd_total', 'precip_total', 'et0_total', 'water_deficit',
+    'heat_stress_days', 'coverage'), or None if the window has no cached data.
+    """
+    memo_key = (cell_key(lat, lon), start_date, end_date, base_temp)
+    with _lock:
+        if memo_key in _season_memo:
+            _season_memo.move_to_end(memo_key)
+            return _season_memo[memo_key]
+
+    series = load_daily_series(lat, lon)
+    if series is None:
+        return None
+
+    t = series['time']
+    sel = (t >= np.datetime64(start_date)) & (t <= np.datetime64(end_date))
+    if not sel.any():
+        return None
+
+    tmax = series['tmax'][sel]
+    tmin = series['tmin'][sel]
+    precip = series['precip'][sel]
+    et0 = series['et0'][sel]
+
+    # Modified GDD: clamp max at the cap and min at the base before averaging
+    tmin_f = np.where(np.isnan(tmin), tmax, tmin)
+    t_hi = np.minimum(tmax, GDD_CAP_TEMP)
+    t_lo = np.maximum(np.minimum(tmin_f, t_hi), base_temp)
+    gdd = np.clip((t_hi + t_lo) / 2.0 - base_temp, 0.0, None)
+    gdd_cum = np.cumsum(np.nan_to_num(gdd))
+
+    # Water balance: positive deficit means evaporative demand exceeded rainfall
+    daily_deficit = np.nan_to_num(et0) - np.nan_to_num(precip)
+    deficit_cum = np.cumsum(daily_deficit)
+
+    n_days = int((np.datetime64(end_date) - np.datetime64(start_date)).astype(int)) + 1
+    metrics = {
+        'dates': t[sel],
+        'gdd_cumulative': gdd_cum,
+        'deficit_cumulative': deficit_cum,
+        'gdd_total': float(gdd_cum[-1]),
+        'precip_total': float(np.nansum(precip)),
+        'et0_total': float(np.nansum(et0)) if not np.isnan(et0).all() else None,
+        'water_deficit': float(deficit_cum[-1]) if not np.isnan(et0).all() else None,
+        'heat_stress_days': int(np.count_nonzero(tmax >= HEAT_STRESS_TEMP)),
+        'coverage': float(np.count_nonzero(~np.isnan(tmax))) / max(n_days, 1),
+    }
+
+    with _lock:
+        _season_memo[memo_key] = metrics
+        while len(_season_memo) > MAX_SEASON_MEMO:
+            _season_memo.popitem(last=False)
+    return metrics
+
+
+def summarize(metrics):
+    """JSON-safe view of season_metrics (drops the daily arrays)."""
+    if not metrics:
+        return None
+    return {k: v for k, v in metrics.items()
+            if k not in ('dates', 'gdd_cumulative', 'deficit_cumulative')}
+
+
+def _to_arrays(raw):
+    def col(name):
+        values = raw.get(name) or [None] * len(raw['time'])
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    checked = raw.get('checked_on') or [None] * len(raw['time'])
+    return {
+        'time': np.array(raw['time'], dtype='datetime64[D]'),
+        'checked': np.array(['NaT' if v is None else v for v in checked], dtype='datetime64[D]'),
+        'tmax': col('temperature_2m_max'),
+        'tmin': col('temperature_2m_min'),
+        'precip': col('precipitation_sum'),
+        'et0': col('et0_fao_evapotranspiration'),
+        'code': col('weathercode'),
+    }
@@ -1,6 +1,8 @@
 import requests
+import numpy as np
 from datetime import datetime
 from PyQt5.QtCore import QObject, pyqtSignal, QThread
+from core import weather_analytics
 
 class WeatherWorker(QThread):
     finished = pyqtSignal(dict)
@@ -18,64 +20,92 @@ class WeatherWorker(QThread):
 
     def fetch_weather(self):
         try:
-            # Open-Meteo Archive API
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            
             # If dates are missing or invalid, fail gracefully
             if not self.start_date:
                 return {"error": "No Date"}
 
-            params = {
-                "latitude": self.lat,
-                "longitude": self.lon,
-                "start_date": self.start_date,
-                "end_date": self.end_date if self.end_date else self.start_date,
-                "daily": "weathercode,temperature_2m_max,precipitation_sum",
-                "timezone": "auto"
-            }
+            end_date = self.end_date if self.end_date else self.start_date
+            season_start, season_end = weather_analytics.season_window(self.start_date, self.end_date)
 
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code != 200:
-                print(f"Weather API Error: {response.text}")
-                return {"error": "API Error"}
-            
-            data = response.json()
-            
-            if 'daily' not in data:
-                return {"error": "No Data"}
+            # Only download the days the cell cache does not have yet
+            gap = weather_analytics.missing_range(self.lat, self.lon, season_start, season_end)
+            if gap:
+                error = self.download_daily(gap[0], gap[1])
+                if error:
+                    return {"error": error}
 
-            daily = data['daily']
-            if not daily.get('temperature_2m_max'):
-                return {"error": "Empty Data"}
+            series = weather_analytics.load_daily_series(self.lat, self.lon)
+            if series is None:
+                return {"error": "No Data"}
 
-            # Calculate Averages/Sums
-            temps = [t for t in daily['temperature_2m_max'] if t is not None]
-            precips = [p for p in daily['precipitation_sum'] if p is not None]
-            codes = [c for c in daily['weathercode'] if c is not None]
+            # Calculate Averages/Sums for the requested window
+            t = series['time']
+            sel = (t >= np.datetime64(self.start_date)) & (t <= np.datetime64(end_date))
+            temps = series['tmax'][sel]
+            temps = temps[~np.isnan(temps)]
+            precips = series['precip'][sel]
+            codes = series['code'][sel]
+            codes = codes[~np.isnan(codes)].astype(int)
 
-            if not temps:
+            if temps.size == 0:
                 return {"error": "No Data"}
 
-            avg_temp = sum(temps) / len(temps)
-            total_precip = sum(precips)
-            
+            avg_temp = float(temps.mean())
+            total_precip = float(np.nansum(precips))
+
             # Most common weather code (simple approach)
-            most_common_code = max(set(codes), key=codes.count) if codes else 0
-            
+            most_common_code = int(np.bincount(codes).argmax()) if codes.size else 0
+
             condition, icon = self.get_weather_desc(most_common_code)
 
+            season = weather_analytics.season_metrics(self.lat, self.lon, season_start, season_end)
+
             return {
                 "error": None,
                 "temp": f"{avg_temp:.1f}°C",
                 "precip": f"{total_precip:.1f} mm",
                 "condition": condition,
-                "icon": icon
+                "icon": icon,
+                "season": weather_analytics.summarize(season),
+                "season_window": [season_start, season_end],
+                "lat": self.lat,
+                "lon": self.lon
             }
 
         except Exception as e:
             print(f"Weather Fetch Exception: {e}")
             return {"error": str(e)}
 
+    def download_daily(self, start_date, end_date):
+        """Fetches daily data from the archive API into the cell cache. Returns an error string or None."""
+        # Open-Meteo Archive API
+        url = "https://archive-api.open-meteo.com/v1/archive"
+        params = {
+            "latitude": self.lat,
+            "longitude": self.lon,
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": ",".join(weather_analytics.DAILY_VARIABLES),
+            "timezone": "auto"
+        }
+
+        response = requests.get(url, params=params, timeout=10)
+        if response.status_code != 200:
+            print(f"Weather API Error: {response.text}")
+            return "API Error"
+
+        data = response.json()
+
+        if 'daily' not in data:
+            return "No Data"
+
+        daily = data['daily']
+        if not daily.get('temperature_2m_max'):
+            return "Empty Data"
+
+        weather_analytics.store_daily_series(self.lat, self.lon, daily)
+        return None
+
     def get_weather_desc(self, code):
         # WMO Weather interpretation codes (WW)
         # 0: Clear sky
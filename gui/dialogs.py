@@ -2,7 +2,7 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QPushButton, QListWid
                              QHBoxLayout, QListWidgetItem, QGridLayout, QFrame, QTableWidget, QHeaderView, QTableWidgetItem, QWidget, QMessageBox, QFileDialog)
 import csv
 import os
-from PyQt5.QtGui import QFont, QColor
+from PyQt5.QtGui import QFont, QColor, QPixmap
 from PyQt5.QtCore import Qt, QSize
 
 # --- RECORDS DIALOG ---
@@ -417,11 +417,14 @@ class ComparisonReportDialog(QDialog):
         return frame
 
 
+THUMB_PREVIEW_SIZE = 96  # Candidate imagery preview (px)
+
+
 class DateSelectionDialog(QDialog):
     def __init__(self, candidates, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Date Selection")
-        self.resize(450, 350)
+        self.resize(450, 400)
         self.candidates = candidates
         self.selected_date = None
         
@@ -539,8 +542,18 @@ class DateSelectionDialog(QDialog):
             w_layout.addLayout(info_layout)
             w_layout.addStretch()
             
+            # Imagery preview (prefetched by the worker)
+            row_height = 80
+            pixmap = QPixmap(cand['thumb']) if cand.get('thumb') else QPixmap()
+            if not pixmap.isNull():
+                thumb_lbl = QLabel()
+                thumb_lbl.setPixmap(pixmap.scaled(THUMB_PREVIEW_SIZE, THUMB_PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+                thumb_lbl.setStyleSheet("border: 1px solid #ddd; border-radius: 4px;")
+                w_layout.addWidget(thumb_lbl)
+                row_height = THUMB_PREVIEW_SIZE + 16
+            
             # Add widget to item
-            item.setSizeHint(QSize(widget.sizeHint().width(), 80))
+            item.setSizeHint(QSize(widget.sizeHint().width(), row_height))
             self.list_widget.addItem(item)
             self.list_widget.setItemWidget(item, widget)
             
@@ -0,0 +1,104 @@
+import base64
+import json
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtWebChannel import QWebChannel
+
+# Name under which the bridge is published to the page (window.bridge on the JS side)
+BRIDGE_NAME = "bridge"
+
+
+def decode_geometry(msg):
+    """
+    Rebuilds a GeoJSON geometry from the packed form sent by the map:
+    {'geomType': 'Polygon', 'parts': [ring lengths], 'coords': base64 little-endian Float64 [lng, lat, ...]}.
+    """
+    coords = np.frombuffer(base64.b64decode(msg['coords']), dtype='<f8').reshape(-1, 2)
+    rings, pos = [], 0
+    for n in msg.get('parts') or [len(coords)]:
+        rings.append(coords[pos:pos + n].tolist())
+        pos += n
+
+    geom_type = msg.get('geomType', 'Polygon')
+    if geom_type == 'Point':
+        return {'type': 'Point', 'coordinates': rings[0][0]}
+    if geom_type == 'LineString':
+        return {'type': 'LineString', 'coordinates': rings[0]}
+    return {'type': 'Polygon', 'coordinates': rings}
+
+
+class MapBridge(QObject):
+    """
+    Typed, bidirectional map <-> Python channel (QWebChannel).
+
+    JS -> Python: the page queues events and posts them in batches through post();
+    every message is dispatched to one of the signals below, none are overwritten.
+    Python -> JS: call() emits 'command'; calls made before the page is connected
+    are queued and flushed once the page reports 'ready'.
+    """
+    geometry_drawn = pyqtSignal(dict)   # GeoJSON geometry of a new drawing
+    view_changed = pyqtSignal(dict)     # {'center': [lat, lon], 'zoom': z}
+    moving = pyqtSignal()
+    reset_requested = pyqtSignal()      # Drawing deleted on the map
+    exit_view = pyqtSignal()            # "Exit saved view" clicked
+    page_ready = pyqtSignal()
+
+    command = pyqtSignal(str, str)      # (mapApi function name, JSON argument list) -> JS
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.connected = False
+        self.pending = []
+
+    def attach(self, page):
+        """Publishes the bridge on a QWebEnginePage (before the map is loaded)."""
+        self.channel = QWebChannel(page)
+        self.channel.registerObject(BRIDGE_NAME, self)
+        page.setWebChannel(self.channel)
+
+    def call(self, name, *args):
+        """Calls window.mapApi[name](*args) on the page."""
+        payload = json.dumps(list(args))
+        if not self.connected:
+            self.pending.append((name, payload))
+            return
+        self.command.emit(name, payload)
+
+    def disconnect_page(self):
+        # The page is gone (reload / crash); queue commands until it reconnects
+        self.connected = False
+
+    @pyqtSlot(str)
+    def post(self, batch_json):
+        """Receives a JSON list of {'type': ..., ...} messages from the page."""
+        try:
+            messages = json.loads(batch_json)
+        except ValueError as e:
+            print(f"Map Bridge Error: {e}")
+            return
+        for msg in messages:
+            try:
+                self.dispatch(msg)
+            except Exception as e:
+                print(f"Map Bridge Error ({msg.get('type')}): {e}")
+
+    def dispatch(self, msg):
+        kind = msg.get('type')
+        if kind == 'ready':
+            self.connected = True
+            pending, self.pending = self.pending, []
+            for name, payload in pending:
+                self.command.emit(name, payload)
+            self.page_ready.emit()
+        elif kind == 'geometry':
+            self.geometry_drawn.emit(decode_geometry(msg))
+        elif kind == 'view':
+            self.view_changed.emit({'center': [float(msg['lat']), float(msg['lng'])], 'zoom': int(msg['zoom'])})
+        elif kind == 'moving':
+            self.moving.emit()
+        elif kind == 'reset':
+            self.reset_requested.emit()
+        elif kind == 'exit_view':
+            self.exit_view.emit()
+        else:
+            print(f"Map Bridge: unknown message {kind}")
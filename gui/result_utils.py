@@ -2,6 +2,7 @@
 from PyQt5.QtWidgets import (QMessageBox, QFrame, QVBoxLayout, QLabel, QTableWidgetItem)
 from PyQt5.QtGui import QFont, QColor, QPixmap, QIcon, QPainter
 from PyQt5.QtCore import Qt
+import core.phenology_metrics as phenology_metrics
 
 def display_results(app, stats):
     """
@@ -412,7 +413,8 @@ def display_engineer_results(app, stats):
     
     # helper for cleanup
     keys_to_clear = ["HealthLine", "HealthHeader", "HealthFrame", "HealthScore", "HealthStage",
-                     "SoilLine", "SoilHeader", "SoilFrame", "SoilScore", "SoilStage"]
+                     "SoilLine", "SoilHeader", "SoilFrame", "SoilScore", "SoilStage",
+                     "BaselineHeader", "BaselineText"]
     for k in keys_to_clear:
         if k in app.index_labels:
             try:
@@ -545,6 +547,12 @@ def display_engineer_results(app, stats):
 
         final_score = min(100, max(0, health_score * 100))
 
+        # Whole-season curve from cached trend data beats the single-delta guess
+        curve = season_stage(app)
+        if curve:
+            stage_name = curve['stage']
+            app.current_analysis_memory["phenology"] = curve
+
         app.current_analysis_memory["stage"] = stage_name
         app.current_analysis_memory["health_score"] = f"{final_score:.1f}"
 
@@ -601,6 +609,28 @@ def display_engineer_results(app, stats):
         app.index_labels["HealthScore"] = lbl_score_val
         app.index_labels["HealthStage"] = lbl_stage
 
+        # --- CHANGE VS BASELINE WINDOWS ---
+        baselines = stats.get('baselines') or {}
+        if baselines:
+            lbl_head_base = QLabel("Change vs Baselines")
+            lbl_head_base.setFont(QFont("Segoe UI", 11, QFont.Bold))
+            lbl_head_base.setAlignment(Qt.AlignCenter)
+            lbl_head_base.setStyleSheet("color: #333; margin-top: 10px;")
+            layout_target.addWidget(lbl_head_base)
+
+            def fmt_delta(v):
+                return "—" if v is None else f"{v:+.2f}"
+
+            lines = [f"{b['label']}:  NDVI {fmt_delta(b['ndvi_change'])}   NDMI {fmt_delta(b['ndmi_change'])}"
+                     for b in baselines.values()]
+            lbl_base = QLabel("\n".join(lines))
+            lbl_base.setAlignment(Qt.AlignCenter)
+            lbl_base.setStyleSheet("color: #555; font-size: 12px;")
+            layout_target.addWidget(lbl_base)
+
+            app.index_labels["BaselineHeader"] = lbl_head_base
+            app.index_labels["BaselineText"] = lbl_base
+
         # --- NEW: AI BASED SOIL ANALYSIS UI (SMI) ---
         smi_raw = stats.get('soil_moisture', 0.0)
         smi_percent = min(100.0, max(0.0, (smi_raw * 100.0) + 10.0))
@@ -696,6 +726,21 @@ def display_engineer_results(app, stats):
         QMessageBox.information(app, "Radar Analysis",
                                 f"No optical data. Radar used.\nVH: {vh:.1f} dB\nStatus: {bitki_durumu}")
 
+def season_stage(app):
+    """Stage estimate from the cached season curve of the current field (no EE call)."""
+    memory = app.current_analysis_memory
+    geometry = memory.get('geometry')
+    date_str = memory.get('specific_date') or memory.get('date1')
+    if not isinstance(geometry, dict) or not date_str:
+        return None
+    try:
+        year = int(date_str.split("-")[0])
+        labels = (memory.get('classification') or {}).get('label_mapping')
+        return phenology_metrics.stage_from_cache(geometry, year, date_str, labels)
+    except Exception as e:
+        print(f"Season Stage Error: {e}")
+        return None
+
 def display_classification(app, results):
     app.table_class.setRowCount(0)
     app.current_analysis_memory["classification"] = results
@@ -3,76 +3,215 @@ matplotlib.use('Qt5Agg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
-from datetime import datetime
+from matplotlib.dates import DateFormatter
+import numpy as np
 
-from PyQt5.QtWidgets import QDialog, QVBoxLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QMessageBox,
+                             QComboBox, QLabel)
+from PyQt5.QtCore import Qt, pyqtSignal
+
+from core.trend_series import TrendSeries, INDEX_NAMES
+from core.smoothing import SMOOTHING_METHODS, smooth_series
 
 
 class TrendGraphDialog(QDialog):
+    compare_requested = pyqtSignal()  # User asked for the previous seasons
+
     def __init__(self, data, legend_colors, parent=None):
         super().__init__(parent)
         self.setAttribute(Qt.WA_DeleteOnClose)
         self.setWindowTitle("Historical Analysis Trends")
         self.resize(1000, 800)
-        self.data = data
+        self.data = data if data is not None else TrendSeries()
         self.legend_colors = legend_colors
-        
+        self.smoothing = 'raw'
+        self.comparison = None  # MultiYearSeries once loaded
+
         # Layout
         layout = QVBoxLayout(self)
-        
+
         # Matplotlib Figure
         self.figure = Figure(figsize=(15, 12))
         self.canvas = FigureCanvas(self.figure)
         self.toolbar = NavigationToolbar(self.canvas, self)
-        
-        layout.addWidget(self.toolbar)
+
+        top_bar = QHBoxLayout()
+        top_bar.addWidget(self.toolbar)
+        top_bar.addStretch()
+
+        top_bar.addWidget(QLabel("Smoothing:"))
+        self.combo_smoothing = QComboBox()
+        for key, label in SMOOTHING_METHODS.items():
+            self.combo_smoothing.addItem(label, key)
+        self.combo_smoothing.currentIndexChanged.connect(self.on_smoothing_changed)
+        top_bar.addWidget(self.combo_smoothing)
+
+        self.btn_compare = QPushButton("Compare Years")
+        self.btn_compare.setCheckable(True)
+        self.btn_compare.toggled.connect(self.on_compare_toggled)
+        top_bar.addWidget(self.btn_compare)
+
+        # Class shown in comparison mode (one line per year)
+        self.combo_class = QComboBox()
+        self.combo_class.currentIndexChanged.connect(lambda _: self.plot_graphs())
+        self.combo_class.hide()
+        top_bar.addWidget(self.combo_class)
+
+        btn_export = QPushButton("Export CSV")
+        btn_export.clicked.connect(self.export_csv)
+        top_bar.addWidget(btn_export)
+
+        layout.addLayout(top_bar)
         layout.addWidget(self.canvas)
-        
+
+        self.plot_graphs()
+
+    def append_data(self, partial):
+        """Merges a streamed chunk of trend data and redraws."""
+        self.data = self.data.merge(partial)
+        self.plot_graphs()
+
+    def set_data(self, data):
+        """Replaces the plotted data with the final (complete) series."""
+        self.data = data
         self.plot_graphs()
-        
+
+    def on_compare_toggled(self, checked):
+        if checked and self.comparison is None:
+            # Load once; the button stays disabled until the seasons arrive
+            self.btn_compare.setEnabled(False)
+            self.btn_compare.setText("Loading...")
+            self.compare_requested.emit()
+            return
+        self.combo_class.setVisible(checked)
+        self.plot_graphs()
+
+    def set_comparison(self, multi):
+        """Receives the MultiYearSeries (None if loading failed)."""
+        self.btn_compare.setEnabled(True)
+        self.btn_compare.setText("Compare Years")
+        if multi is None or multi.is_empty():
+            self.btn_compare.setChecked(False)
+            return
+        self.comparison = multi
+        self.combo_class.blockSignals(True)
+        self.combo_class.clear()
+        self.combo_class.addItems(multi.classes)
+        self.combo_class.blockSignals(False)
+        self.combo_class.show()
+        self.plot_graphs()
+
+    def on_smoothing_changed(self, index):
+        self.smoothing = self.combo_smoothing.itemData(index)
+        self.plot_graphs()
+
+    def export_csv(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trend Data", "trend_data.csv", "CSV Files (*.csv)")
+        if not path:
+            return
+        try:
+            self.data.to_csv(path)
+            QMessageBox.information(self, "Success", f"Trend data exported to:\n{path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to export: {e}")
+
     def plot_graphs(self):
+        if self.btn_compare.isChecked() and self.comparison is not None:
+            self.plot_comparison()
+            return
         self.figure.clear()
-        
+
         # Create subplots manually
         axes = self.figure.subplots(4, 2)
         self.figure.suptitle("Historical Trends", fontsize=16)
         axes = axes.flatten()
-        
+
         indices = ['NDVI', 'GNDVI', 'NDWI', 'NDRE', 'EVI', 'SAVI', 'RENDVI']
-        
+        dates = self.data.dates_as_datetime64()
+        smoothed = smooth_series(self.data, self.smoothing) if self.smoothing != 'raw' else None
+        date_fmt = DateFormatter("%d.%m")  # Remove year (YYYY-MM-DD -> DD.MM)
+
         for i, idx_name in enumerate(indices):
             ax = axes[i]
-            for cls_name, cls_data in self.data.items():
-                c = self.legend_colors.get(cls_name, 'black')
-                
-                dates = cls_data['dates']
-                vals = cls_data[idx_name]
-                
-                # Format dates to remove year (YYYY-MM-DD -> DD.MM)
-                formatted_dates = []
-                for d in dates:
-                    try:
-                        dt = datetime.strptime(d, "%Y-%m-%d")
-                        formatted_dates.append(dt.strftime("%d.%m"))
-                    except:
-                        formatted_dates.append(d)
-                
-                ax.plot(formatted_dates, vals, marker='o', label=cls_name, color=c)
-            
+            idx_pos = self.data.index_of(idx_name)
+            for c, cls_name in enumerate(self.data.classes):
+                color = self.legend_colors.get(cls_name, 'black')
+                vals = self.data.values[c, idx_pos]
+
+                # Skip gaps so cloudy dates do not break the line
+                valid = ~np.isnan(vals)
+                if smoothed is None:
+                    ax.plot(dates[valid], vals[valid], marker='o', label=cls_name, color=color)
+                else:
+                    # Raw observations as faint points, smoothed curve as the line
+                    ax.plot(dates[valid], vals[valid], 'o', color=color, alpha=0.35, markersize=4)
+                    s_vals = smoothed.values[c, idx_pos]
+                    s_valid = ~np.isnan(s_vals)
+                    ax.plot(smoothed.dates_as_datetime64()[s_valid], s_vals[s_valid], label=cls_name, color=color)
+
             ax.set_title(idx_name)
             ax.grid(True, linestyle='--', alpha=0.6)
-            
+            ax.xaxis.set_major_formatter(date_fmt)
+
             # Rotate labels
             ax.tick_params(axis='x', rotation=30, labelsize=8)
-            
+
         # Hide 8th subplot axis lines but use it for legend
         axes[7].axis('off')
-        
+
         # Add legend to the empty 8th subplot
         handles, labels = axes[0].get_legend_handles_labels()
         if handles:
             axes[7].legend(handles, labels, loc='center', fontsize='10', title="Product Legend", frameon=True)
-        
+
+        self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_comparison(self):
+        """One line per season for the selected class, aligned by day of year."""
+        self.figure.clear()
+        axes = self.figure.subplots(4, 2).flatten()
+        multi = self.comparison
+        cls_name = self.combo_class.currentText()
+        self.figure.suptitle(f"Season Comparison - {cls_name}", fontsize=16)
+
+        # Seasons of one class as the rows of a TrendSeries, so smoothing applies per year
+        ref_day = np.datetime64(f"{multi.years[-1]}-01-01", 'D').astype(np.int64)
+        c = multi.classes.index(cls_name) if cls_name in multi.classes else None
+        values = (multi.values[:, c] if c is not None
+                  else np.full((len(multi.years), len(INDEX_NAMES), multi.days.size), np.nan, dtype=np.float32))
+        seasons = TrendSeries(ref_day + multi.days, [str(y) for y in multi.years], values)
+        smoothed = smooth_series(seasons, self.smoothing) if self.smoothing != 'raw' else None
+
+        dates = seasons.dates_as_datetime64()
+        colors = matplotlib.colormaps['tab10']
+        indices = ['NDVI', 'GNDVI', 'NDWI', 'NDRE', 'EVI', 'SAVI', 'RENDVI']
+        for i, idx_name in enumerate(indices):
+            ax = axes[i]
+            idx_pos = seasons.index_of(idx_name)
+            for y, year in enumerate(multi.years):
+                current = y == len(multi.years) - 1
+                style = dict(color='black' if current else colors(y % 10),
+                             linewidth=2.5 if current else 1.2,
+                             alpha=1.0 if current else 0.8)
+                vals = seasons.values[y, idx_pos]
+                valid = ~np.isnan(vals)
+                if smoothed is None:
+                    ax.plot(dates[valid], vals[valid], marker='o', markersize=3, label=str(year), **style)
+                else:
+                    s_vals = smoothed.values[y, idx_pos]
+                    s_valid = ~np.isnan(s_vals)
+                    ax.plot(smoothed.dates_as_datetime64()[s_valid], s_vals[s_valid], label=str(year), **style)
+
+            ax.set_title(idx_name)
+            ax.grid(True, linestyle='--', alpha=0.6)
+            ax.xaxis.set_major_formatter(DateFormatter("%d.%m"))
+            ax.tick_params(axis='x', rotation=30, labelsize=8)
+
+        axes[7].axis('off')
+        handles, labels = axes[0].get_legend_handles_labels()
+        if handles:
+            axes[7].legend(handles, labels, loc='center', fontsize='10', title="Season", frameon=True)
+
         self.figure.tight_layout()
         self.canvas.draw()
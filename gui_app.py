@@ -10,7 +10,7 @@ from geopy.geocoders import Nominatim
 from PyQt5.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QGridLayout,
                              QWidget, QLabel, QFrame, QDateEdit, QPushButton, QMessageBox, QComboBox,
                              QStackedWidget, QSizePolicy, QLineEdit, QInputDialog, QTableWidget, QTableWidgetItem,
-                             QHeaderView, QGraphicsDropShadowEffect, QScrollArea)
+                             QHeaderView, QGraphicsDropShadowEffect, QScrollArea, QSlider)
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtCore import QUrl, QDate, Qt, QSize, QTimer, QThread
 from PyQt5.QtGui import QFont, QColor, QIcon
@@ -18,18 +18,25 @@ from datetime import datetime
 
 # --- Core modules ---
 from core.analysis_worker import AnalysisWorker, PhenologyWorker
-from core.map_layer_worker import MapLayerWorker
-from core.deforestation_worker import DeforestationWorker
+from core.map_layer_worker import MapLayerWorker, TimelineWorker
+from core.geometry_pipeline import to_ee_geometry
+from core.deforestation_worker import DeforestationWorker, ChangeMapWorker
+from core.landcover_history import LandCoverHistoryWorker
 from core.classification import PRODUCT_LABELS
 from core.weather_service import WeatherWorker
-from core.historical_analysis import TrendWorker
+import core.weather_analytics as weather_analytics
+from core.historical_analysis import TrendWorker, MultiYearTrendWorker
 import core.map_utils as map_utils
 import core.geo_utils as geo_utils
+from core.cache_utils import geometry_hash
+from core.tile_proxy import tile_proxy
+from core.saved_fields import pack_saved_fields
 
 # --- GUI modules ---
 from gui.dialogs import RecordsDialog, ComparisonSelectionDialog, DateSelectionDialog, InfoDialog
 import gui.result_utils as result_utils
 from gui.trend_dialog import TrendGraphDialog
+from gui.map_bridge import MapBridge
 
 
 
@@ -93,6 +100,16 @@ class NeoAgroApp(QMainWindow):
         left_container.setLayout(left_layout)
 
         self.browser = QWebEngineView()
+        # Typed map <-> Python channel (replaces document.title messages)
+        self.map_bridge = MapBridge(self)
+        self.map_bridge.attach(self.browser.page())
+        self.map_bridge.geometry_drawn.connect(self.on_map_geometry)
+        self.map_bridge.view_changed.connect(self.on_map_view_changed)
+        self.map_bridge.moving.connect(self.on_map_moving)
+        self.map_bridge.reset_requested.connect(self.on_map_reset)
+        self.map_bridge.exit_view.connect(self.on_map_exit_view)
+        self.map_bridge.page_ready.connect(self.refresh_saved_fields_layer)
+        self.browser.loadStarted.connect(self.map_bridge.disconnect_page)
         self.current_start_date = "2023-06-01"
         self.current_end_date = "2023-09-30"
         self.analysis_mode = "range"
@@ -122,10 +139,10 @@ class NeoAgroApp(QMainWindow):
         self.last_map_view = None
         self.pre_navigation_view = None # Stores view before "Go to Area"
 
-        self.create_map_html(self.current_start_date, self.current_end_date, mode="range")
+        # The map page is written and loaded once; later changes go through its JS API
+        self.create_map_shell()
         file_path = os.path.abspath("temp_map.html")
         self.browser.setUrl(QUrl.fromLocalFile(file_path))
-        self.browser.titleChanged.connect(self.on_map_interaction)
 
         left_layout.addWidget(self.browser)
         main_layout.addWidget(left_container, stretch=1)
@@ -140,6 +157,9 @@ class NeoAgroApp(QMainWindow):
         self.setup_right_panel(main_layout)
 
         self.map_worker = None
+        self.timeline_worker = None
+        self.timeline_scenes = []
+        self.timeline_urls = {}
         self.stats_worker = None
         self.phenology_worker = None
         self.defor_worker = None
@@ -521,7 +541,9 @@ class NeoAgroApp(QMainWindow):
                     "desc": "Soil moisture reserves are depleted.",
                     "action": "Deep irrigation recommended to restore soil capacity."
                 })
-            
+
+            recs.extend(self.weather_recommendations())
+            recs.extend(self.anomaly_recommendations())
             return recs
 
         # --- ENGINEER/FALLBACK LOGIC ---
@@ -591,7 +613,72 @@ class NeoAgroApp(QMainWindow):
                 "desc": "Overall biomass and density are low.",
                 "action": "Scout field for pests, diseases, or soil compaction."
             })
-        
+
+        recs.extend(self.weather_recommendations())
+        recs.extend(self.anomaly_recommendations())
+        return recs
+
+    def anomaly_recommendations(self):
+        """Comparison with the same date in previous years (cached climatology)."""
+        recs = []
+        z_scores = self.current_analysis_memory.get('anomaly_z') or {}
+        n_years = len((self.current_analysis_memory.get('climatology') or {}).get('years', []))
+        z_ndvi = z_scores.get('NDVI')
+        z_ndmi = z_scores.get('NDMI')
+
+        if z_ndvi is not None and z_ndvi <= -1.5:
+            recs.append({
+                "title": "Below-Normal Vegetation",
+                "icon": "📉",
+                "desc": f"NDVI is {abs(z_ndvi):.1f} standard deviations below the {n_years}-year average for this date.",
+                "action": "Check for late sowing, emergence problems, pests or nutrient shortage."
+            })
+        elif z_ndvi is not None and z_ndvi >= 1.5:
+            recs.append({
+                "title": "Above-Normal Vegetation",
+                "icon": "📈",
+                "desc": f"NDVI is {z_ndvi:.1f} standard deviations above the {n_years}-year average for this date.",
+                "action": "Crop is ahead of usual; review nitrogen and irrigation timing accordingly."
+            })
+
+        if z_ndmi is not None and z_ndmi <= -1.5:
+            recs.append({
+                "title": "Drier Than Usual",
+                "icon": "🏜️",
+                "desc": f"Canopy moisture (NDMI) is {abs(z_ndmi):.1f} standard deviations below normal for this date.",
+                "action": "Verify soil moisture and bring irrigation forward if needed."
+            })
+        return recs
+
+    def weather_recommendations(self):
+        """Season weather advice from cached daily weather (no new download)."""
+        recs = []
+        weather = getattr(self, 'current_weather', None) or {}
+        season = weather.get('season')
+        if not season:
+            return recs
+
+        start, end = weather.get('season_window', ["?", "?"])
+        heat_days = season.get('heat_stress_days', 0)
+        deficit = season.get('water_deficit')
+
+        if heat_days >= 3:
+            recs.append({
+                "title": "Heat Stress Period",
+                "icon": "🔥",
+                "desc": f"{heat_days} days above {weather_analytics.HEAT_STRESS_TEMP:.0f}°C between {start} and {end}.",
+                "action": "Irrigate in the early morning and watch for flower/grain set losses."
+            })
+
+        if deficit is not None and deficit > 100:
+            recs.append({
+                "title": "Seasonal Rainfall Deficit",
+                "icon": "🌵",
+                "desc": f"Evaporative demand exceeded rainfall by {deficit:.0f} mm "
+                        f"(rain {season.get('precip_total', 0):.0f} mm, GDD {season.get('gdd_total', 0):.0f}).",
+                "action": "Plan supplementary irrigation; rainfall alone will not cover crop water use."
+            })
+
         return recs
 
     def show_smart_recommendations(self):
@@ -738,7 +825,7 @@ class NeoAgroApp(QMainWindow):
         """)
         self.add_shadow(self.date_panel)
         self.date_panel.setFixedWidth(280)
-        self.date_panel.setFixedHeight(380)
+        self.date_panel.setFixedHeight(460)
 
         panel_grid = QGridLayout()
         panel_grid.setContentsMargins(20, 20, 20, 20)
@@ -823,6 +910,20 @@ class NeoAgroApp(QMainWindow):
         action_layout.addWidget(btn_save)
         action_layout.addWidget(btn_compare_main)
 
+        # --- Timeline (all scenes of the period, layers prepared in the background) ---
+        self.btn_timeline = QPushButton("Timeline")
+        self.btn_timeline.setCursor(Qt.PointingHandCursor)
+        self.btn_timeline.setStyleSheet(
+            "QPushButton { background-color: #00897B; color: white; border:none; padding: 6px; border-radius: 8px; }"
+            "QPushButton:hover { background-color: #00695C; } QPushButton:disabled { background-color: #B0BEC5; }")
+        self.btn_timeline.clicked.connect(self.start_timeline)
+
+        self.timeline_slider = QSlider(Qt.Horizontal)
+        self.timeline_slider.setEnabled(False)
+        self.timeline_slider.valueChanged.connect(self.on_timeline_moved)
+        self.lbl_timeline = QLabel("Timeline: all scenes of the period")
+        self.lbl_timeline.setStyleSheet("font-weight: normal; color: #777; font-size: 11px;")
+
         # Layout Rows
         row = 1
         panel_grid.addWidget(QLabel("User Mode:"), row, 0); panel_grid.addWidget(self.combo_user_mode, row, 1); row += 1
@@ -838,7 +939,10 @@ class NeoAgroApp(QMainWindow):
         panel_grid.addWidget(self.lbl_end, row, 0); panel_grid.addWidget(self.date_end, row, 1); row += 1
         
         panel_grid.addWidget(btn_update, row, 0, 1, 2); row += 1
-        panel_grid.addLayout(action_layout, row, 0, 1, 2)
+        panel_grid.addLayout(action_layout, row, 0, 1, 2); row += 1
+        panel_grid.addWidget(self.btn_timeline, row, 0, 1, 2); row += 1
+        panel_grid.addWidget(self.timeline_slider, row, 0, 1, 2); row += 1
+        panel_grid.addWidget(self.lbl_timeline, row, 0, 1, 2)
 
         self.date_panel.show()
     
@@ -1132,6 +1236,50 @@ class NeoAgroApp(QMainWindow):
         change_layout.addWidget(self.lbl_defor_verdict)
         layout_defor.addWidget(frame_change)
 
+        # Gross change from the per-pixel transition matrix
+        self.lbl_defor_gross = QLabel("")
+        self.lbl_defor_gross.setStyleSheet("color: #444; font-size: 12px;")
+        self.lbl_defor_gross.setWordWrap(True)
+        layout_defor.addWidget(self.lbl_defor_gross)
+
+        self.btn_change_map = QPushButton("Show Change Map")
+        self.btn_change_map.setCursor(Qt.PointingHandCursor)
+        self.btn_change_map.setStyleSheet("""
+            QPushButton {
+                background-color: #1B5E20;
+                color: white;
+                border-radius: 8px;
+                padding: 8px;
+                font-weight: bold;
+            }
+            QPushButton:hover { background-color: #2E7D32; }
+        """)
+        self.btn_change_map.hide()
+        self.btn_change_map.clicked.connect(self.show_change_map)
+        layout_defor.addWidget(self.btn_change_map)
+
+        # Multi-year land cover / crop rotation (per-year class histograms)
+        self.btn_history = QPushButton("Show Land Cover History")
+        self.btn_history.setCursor(Qt.PointingHandCursor)
+        self.btn_history.setStyleSheet("""
+            QPushButton {
+                background-color: #33691E;
+                color: white;
+                border-radius: 8px;
+                padding: 8px;
+                font-weight: bold;
+            }
+            QPushButton:hover { background-color: #558B2F; }
+        """)
+        self.btn_history.hide()
+        self.btn_history.clicked.connect(self.trigger_landcover_history)
+        layout_defor.addWidget(self.btn_history)
+
+        self.lbl_history = QLabel("")
+        self.lbl_history.setStyleSheet("color: #444; font-size: 12px;")
+        self.lbl_history.setWordWrap(True)
+        layout_defor.addWidget(self.lbl_history)
+
         layout_defor.addStretch()
         scroll_defor.setWidget(content_defor)
         page_defor_layout.addWidget(scroll_defor)
@@ -1300,13 +1448,12 @@ class NeoAgroApp(QMainWindow):
             opacity = 1.0
             if is_class_view and self.combo_analysis_mode.currentIndex() == 1:
                 opacity = 0.6
-            js = f"window.addSentinelLayer('{target_url}', {opacity})"
-            self.browser.page().runJavaScript(js)
+            self.map_bridge.call('addLayer', target_url, opacity)
         else:
             if is_class_view and not target_url:
-                 self.browser.page().runJavaScript("removeSentinelLayer()")
+                 self.map_bridge.call('removeLayer')
             elif not is_class_view and not target_url:
-                 self.browser.page().runJavaScript("removeSentinelLayer()")
+                 self.map_bridge.call('removeLayer')
 
         # Trend Button Visibility
         if self.user_mode == "Engineer" and is_class_view and 'classified_image' in self.current_analysis_memory.get('classification', {}):
@@ -1341,11 +1488,11 @@ class NeoAgroApp(QMainWindow):
         # Reset data and remove area on mode change (Per Request)
         self.reset_analysis_state()
         if hasattr(self, 'browser'):
-             self.browser.page().runJavaScript("if(window.deleteSelectedArea) { window.deleteSelectedArea(); }")
+             self.map_bridge.call('deleteSelectedArea')
 
     def resizeEvent(self, event):
         if hasattr(self, 'date_panel') and hasattr(self, 'browser'):
-            self.date_panel.move(25, self.browser.height() - 410)
+            self.date_panel.move(25, self.browser.height() - 490)
 
         if hasattr(self, 'search_panel') and hasattr(self, 'browser'):
             # Center Search Panel
@@ -1376,7 +1523,7 @@ class NeoAgroApp(QMainWindow):
         # Reset data and remove area on mode change
         self.reset_analysis_state()
         if hasattr(self, 'browser'):
-             self.browser.page().runJavaScript("if(window.deleteSelectedArea) { window.deleteSelectedArea(); }")
+             self.map_bridge.call('deleteSelectedArea')
 
     def on_analysis_mode_change(self, index):
         # 0: Area Scanning, 1: Product Scanning
@@ -1387,7 +1534,7 @@ class NeoAgroApp(QMainWindow):
         # Reset data and remove area on mode change
         self.reset_analysis_state()
         if hasattr(self, 'browser'):
-             self.browser.page().runJavaScript("if(window.deleteSelectedArea) { window.deleteSelectedArea(); }")
+             self.map_bridge.call('deleteSelectedArea')
 
     def search_location(self):
         query = self.txt_search.text()
@@ -1397,8 +1544,7 @@ class NeoAgroApp(QMainWindow):
             geolocator = Nominatim(user_agent="neoagro_app")
             location = geolocator.geocode(query)
             if location:
-                js_code = f"window.flyToLocation({location.latitude}, {location.longitude});"
-                self.browser.page().runJavaScript(js_code)
+                self.map_bridge.call('flyTo', location.latitude, location.longitude)
                 self.lbl_status.setText(f"Found: {query}")
                 self.update_weather(location.latitude, location.longitude) # Update weather for new location
             else:
@@ -1407,95 +1553,140 @@ class NeoAgroApp(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Connection error: {str(e)}")
 
-    def create_map_html(self, date1, date2=None, mode="range", center=None, zoom=None):
-        map_utils.create_map_html(date1, date2, mode, center, zoom, output_file="temp_map.html")
-
-    def on_browser_load_finished(self, success):
-        # Triggered when map reload completes
-        if success and self.pending_analysis_geo:
-            print("Restoring analysis on reloaded map...")
-            # Restore analysis (Fetch Data)
-            # Fetch data handles the calculation and UI update. 
-            # It also triggers MapLayerWorker -> adds Sentinel Layer.
-            # However, the originally drawn POLYGON is lost visually on map.
-            # If we want to support further interactions with that area, we should ideally restore it.
-            # For now, running analysis restores the 'result' view which is the primary goal.
-            self.fetch_data(self.pending_analysis_geo)
-            self.pending_analysis_geo = None
+    def create_map_shell(self, center=None, zoom=None):
+        # Basemap and EE layers are served (and disk-cached) by the local tile proxy
+        tile_proxy.start()
+        basemap_url = tile_proxy.register_layer(map_utils.BASEMAP_URL, 'basemap_hybrid')
+        map_utils.create_map_shell(center, zoom, output_file="temp_map.html", basemap_url=basemap_url)
 
     def update_map_date(self):
-        d1 = self.date_start.date().toString("yyyy-MM-dd")
-        d2 = self.date_end.date().toString("yyyy-MM-dd")
-        
         # Capture current geometry before reset
         current_geo = self.current_analysis_memory.get('geometry')
 
-        # Reset Interface (Clears results, sentinel layers, etc.)
+        # Reset Interface (Clears results, sentinel layers, etc.).
+        # The map page stays loaded, so the drawn polygon and the view are kept.
         self.reset_analysis_state()
 
-        # Get stored view state
-        center = self.last_map_view['center'] if self.last_map_view else None
-        zoom = self.last_map_view['zoom'] if self.last_map_view else None
-
-        if self.analysis_mode == "range":
-            self.create_map_html(d1, d2, "range", center=center, zoom=zoom)
-        else:
-            self.create_map_html(d1, mode="single", center=center, zoom=zoom)
-            
-        # Set pending geometry if we had one, so it restores after reload
+        # Re-run the analysis for the new dates; MapLayerWorker swaps in the new tile layer
         if current_geo:
-            self.pending_analysis_geo = current_geo
-            
-        self.browser.reload()
-    
+            self.fetch_data(current_geo)
+
         # Update weather immediately in update_map_date since it's a manual action
         center = self.last_map_view['center'] if self.last_map_view else [39.0, 35.0]
         self.update_weather(center[0], center[1])
 
-    def on_map_interaction(self, title):
-        if title == "RESET":
-            self.reset_analysis_state()
-        elif title == "MOVING":
-            # Map is being moved/dragged. Show placeholder.
-            self.set_weather_placeholder()
-        elif title == "EXIT_VIEW":
-            # Restore previous view
-            if self.pre_navigation_view:
-                c = self.pre_navigation_view.get('center')
-                z = self.pre_navigation_view.get('zoom', 6)
-                if c:
-                    self.browser.page().runJavaScript(f"window.flyToLocation({c[0]}, {c[1]}, {z});")
-                    self.lbl_status.setText("Restored previous map view.")
-            else:
-                self.browser.page().runJavaScript("window.flyToLocation(39.0, 35.0, 6);")
-        elif title.startswith("VIEW:"):
-            # Use geo_utils to parse view
-            data = geo_utils.parse_view_title(title)
-            if data:
-                self.last_map_view = data
-                center = data['center']
-                self.update_weather(center[0], center[1])
-            else:
-                 print("VIEW Parse Error (handled in utils)")
+    # --- MAP BRIDGE EVENTS ---
+    def on_map_reset(self):
+        self.reset_analysis_state()
+
+    def on_map_moving(self):
+        # Map is being moved/dragged. Show placeholder.
+        self.set_weather_placeholder()
+
+    def on_map_exit_view(self):
+        # Restore previous view
+        if self.pre_navigation_view:
+            c = self.pre_navigation_view.get('center')
+            z = self.pre_navigation_view.get('zoom', 6)
+            if c:
+                self.map_bridge.call('flyTo', c[0], c[1], z)
+                self.lbl_status.setText("Restored previous map view.")
+        else:
+            self.map_bridge.call('flyTo', 39.0, 35.0, 6)
+
+    def on_map_view_changed(self, view):
+        self.last_map_view = view
+        center = view['center']
+        self.update_weather(center[0], center[1])
+
+    def on_map_geometry(self, geo_dict):
+        if geo_dict:
+            self.fetch_data(geo_dict)
+        else:
+            self.lbl_status.setText(f"⚠ Error parsing Geometry")
 
-        elif title.startswith("GEOJSON:"):
-            geo_dict = geo_utils.parse_geojson_title(title)
-            if geo_dict:
-                self.fetch_data(geo_dict)
-            else:
-                 self.lbl_status.setText(f"⚠ Error parsing Geometry")
- 
     def on_map_layer_ready(self, url):
         self.current_analysis_memory['rgb_url'] = url
         
         # If currently looking at Bands (0) or Indices (1), show this RGB layer
         # If looking at Classification (2), do NOT show it yet (wait for class result)
         if self.stack.currentIndex() != 2:
-            js = f"window.addSentinelLayer('{url}')"
-            self.browser.page().runJavaScript(js)
+            self.map_bridge.call('addLayer', url)
         
         self.lbl_status.setText("Sentinel-2 Image Loaded.")
 
+    # --- TIMELINE ---
+    def start_timeline(self):
+        geo_data = self.current_analysis_memory.get('geometry')
+        if not geo_data:
+            QMessageBox.warning(self, "No Area", "Please select an area on the map first.")
+            return
+
+        d1 = self.date_start.date()
+        if self.analysis_mode == "range":
+            d2 = self.date_end.date()
+        else:
+            # Single date: the surrounding three months
+            d1, d2 = d1.addDays(-45), d1.addDays(45)
+
+        self.reset_timeline()
+        self.btn_timeline.setEnabled(False)
+        self.lbl_timeline.setText("Listing scenes...")
+        self.timeline_worker = TimelineWorker(geo_data, d1.toString("yyyy-MM-dd"), d2.toString("yyyy-MM-dd"))
+        self.timeline_worker.scenes_signal.connect(self.on_timeline_scenes)
+        self.timeline_worker.layer_signal.connect(self.on_timeline_layer)
+        self.timeline_worker.finished_signal.connect(lambda: self.btn_timeline.setEnabled(True))
+        self.timeline_worker.error_signal.connect(self.on_timeline_error)
+        self.timeline_worker.start()
+
+    def reset_timeline(self):
+        self.timeline_scenes = []
+        self.timeline_urls = {}
+        if hasattr(self, 'timeline_slider'):
+            self.timeline_slider.blockSignals(True)
+            self.timeline_slider.setRange(0, 0)
+            self.timeline_slider.blockSignals(False)
+            self.timeline_slider.setEnabled(False)
+            self.btn_timeline.setEnabled(True)
+            self.lbl_timeline.setText("Timeline: all scenes of the period")
+
+    def on_timeline_scenes(self, scenes):
+        self.timeline_scenes = scenes
+        if not scenes:
+            self.lbl_timeline.setText("No usable scenes in this period")
+            return
+        self.timeline_slider.blockSignals(True)
+        self.timeline_slider.setRange(0, len(scenes) - 1)
+        self.timeline_slider.setValue(0)
+        self.timeline_slider.blockSignals(False)
+        self.timeline_slider.setEnabled(True)
+        self.on_timeline_moved(0)
+
+    def on_timeline_layer(self, index, url):
+        self.timeline_urls[index] = url
+        if index == self.timeline_slider.value():
+            self.on_timeline_moved(index)
+        else:
+            self.lbl_timeline.setText(self.timeline_label(self.timeline_slider.value()))
+
+    def on_timeline_moved(self, index):
+        if not 0 <= index < len(self.timeline_scenes):
+            return
+        self.lbl_timeline.setText(self.timeline_label(index))
+        url = self.timeline_urls.get(index)
+        if url:
+            self.map_bridge.call('addLayer', url)
+
+    def timeline_label(self, index):
+        scene = self.timeline_scenes[index]
+        status = "" if index in self.timeline_urls else " (preparing...)"
+        return (f"{scene['date']}  ☁ {scene['cloud']:.0f}%  "
+                f"[{len(self.timeline_urls)}/{len(self.timeline_scenes)} ready]{status}")
+
+    def on_timeline_error(self, message):
+        self.btn_timeline.setEnabled(True)
+        self.lbl_timeline.setText(f"Timeline error: {message}")
+
     def reset_analysis_state(self):
         """Cancels all pending workers and timers to prevent ghost results."""
         # 1. Cancel Stats Worker
@@ -1523,7 +1714,15 @@ class NeoAgroApp(QMainWindow):
         if hasattr(self, 'defor_timer'):
             self.defor_timer.stop()
 
-        # 5. Clear UI (via reset_interface or selective clearing)
+        # 5. Cancel Timeline Worker (the timeline belongs to the previous field/period)
+        if hasattr(self, 'timeline_worker') and self.timeline_worker is not None:
+            if self.timeline_worker.isRunning():
+                self.timeline_worker.terminate()
+                self.timeline_worker.wait()
+            self.timeline_worker = None
+        self.reset_timeline()
+
+        # 6. Clear UI (via reset_interface or selective clearing)
         # reset_interface clears Map too, which we might strictly want or not.
         # But fetch_data starts new analysis, so clearing everything is safer.
         self.reset_interface()
@@ -1613,6 +1812,14 @@ class NeoAgroApp(QMainWindow):
         except Exception as e:
              print(f"Error saving records: {e}")
              QMessageBox.warning(self, "Save Error", f"Could not save record to disk: {e}")
+        self.refresh_saved_fields_layer()
+
+    def refresh_saved_fields_layer(self):
+        """Sends every saved field (simplified, quantized) to the map's saved-fields layer."""
+        try:
+            self.map_bridge.call('setSavedFields', pack_saved_fields(self.records))
+        except Exception as e:
+            print(f"Saved Fields Layer Error: {e}")
              
     def handle_date_selection(self, candidates, geo_data):
         self.lbl_status.setText("Waiting for user selection...")
@@ -1688,6 +1895,11 @@ class NeoAgroApp(QMainWindow):
                 "analysis_params": analysis_params
             }
 
+            # Compact columnar trend series (if trends were generated)
+            trend = self.current_analysis_memory.get("trend")
+            if trend is not None and not trend.is_empty():
+                record_data["trend"] = trend.to_dict()
+
             self.records[name] = record_data
             self.save_records_to_disk()
             
@@ -1902,6 +2114,10 @@ class NeoAgroApp(QMainWindow):
         """
         result_utils.display_results(self, stats)
 
+        # Same-date climatology anomalies (for recommendations)
+        self.current_analysis_memory['climatology'] = stats.get('climatology')
+        self.current_analysis_memory['anomaly_z'] = stats.get('anomaly_z')
+
         # Sequential Chaining: Trigger Phenology Worker
         source = stats.get('source', 'S2')
         if source == 'S2':
@@ -1947,8 +2163,7 @@ class NeoAgroApp(QMainWindow):
             if self.stack.currentIndex() == 2:
                 # Determine opacity: 0.6 for Product Scanning (Radar-like), 1.0 for Area
                 opacity = 0.6 if self.combo_analysis_mode.currentIndex() == 1 else 1.0
-                js = f"window.addSentinelLayer('{results['tile_url']}', {opacity})"
-                self.browser.page().runJavaScript(js)
+                self.map_bridge.call('addLayer', results['tile_url'], opacity)
                 
                 # Also show trend button if we have label mapping (relaxed check)
                 # Previously checked for 'classified_image', but that is not saved in records.
@@ -1969,7 +2184,7 @@ class NeoAgroApp(QMainWindow):
     def generate_trends(self):
         print("DEBUG: generate_trends called")
         cls_data = self.current_analysis_memory.get("classification")
-        # Relaxed check: We don't strictly need 'classified_image' anymore as TrendWorker rebuilds it.
+        # Relaxed check: TrendWorker takes the model from the shared registry (or rebuilds it).
         if not cls_data:
             QMessageBox.warning(self, "Error", "Classification data not ready.")
             return
@@ -2003,10 +2218,7 @@ class NeoAgroApp(QMainWindow):
         print("DEBUG: Preparing TrendWorker arguments...", flush=True)
         try:
             # Serializing Geometry to JSON string for thread safety
-            if isinstance(geom, dict):
-                ee_geom = ee.Geometry(geom)
-            else:
-                ee_geom = geom
+            ee_geom = to_ee_geometry(geom)
             
             geo_json = ee_geom.serialize()
             
@@ -2018,20 +2230,30 @@ class NeoAgroApp(QMainWindow):
             QMessageBox.critical(self, "Error", f"Failed to prepare arguments: {e}")
             return
 
+        # Close the previous trend window, the new one opens with the first chunk
+        self.close_trend_window()
+        self.trend_window_dismissed = False
+        self.btn_trends.setEnabled(False)
+        self.lbl_status.setText("Loading trend data...")
+
         # 2. Create Thread and Worker
         legend_colors = cls_data.get('legend_colors')
+        # Kept for the season comparison requested from the trend window
+        self.trend_args = dict(geometry_json=geo_json, year=year,
+                               start_date_str=d1, end_date_str=d2,
+                               legend_colors=legend_colors,
+                               label_mapping=cls_data.get('label_mapping'),
+                               field_hash=geometry_hash(geom) if isinstance(geom, dict) else None)
         self.trend_thread = QThread()
-        self.trend_worker = TrendWorker(geo_json, 
-                                        year, 
-                                        d1, d2, 
-                                        legend_colors,
-                                        label_mapping=cls_data.get('label_mapping'))
+        self.trend_worker = TrendWorker(**self.trend_args)
         
         # 2. Move Worker to Thread
         self.trend_worker.moveToThread(self.trend_thread)
         
         # 3. Connect Signals
         self.trend_thread.started.connect(self.trend_worker.process)
+        self.trend_worker.partial_signal.connect(self.on_trends_partial)
+        self.trend_worker.status_signal.connect(lambda msg: self.lbl_status.setText(msg))
         self.trend_worker.finished_signal.connect(self.on_trends_ready)
         self.trend_worker.finished_signal.connect(self.trend_thread.quit)
         self.trend_worker.finished_signal.connect(self.trend_worker.deleteLater)
@@ -2043,41 +2265,116 @@ class NeoAgroApp(QMainWindow):
         print("DEBUG: Starting Thread...")
         self.trend_thread.start()
 
+    def close_trend_window(self):
+        # Cleanup previous window if exists
+        if hasattr(self, 'trend_window') and self.trend_window is not None:
+            try:
+                self.trend_window.close()
+                self.trend_window.deleteLater()
+            except RuntimeError:
+                pass
+            self.trend_window = None
+
+    def on_trends_partial(self, data):
+        """Shows streamed trend chunks as they arrive."""
+        if data is None or data.is_empty():
+            return
+        if getattr(self, 'trend_window_dismissed', False):
+            return  # Closed by the user while loading; not reopened for every chunk
+        try:
+            if getattr(self, 'trend_window', None) is not None:
+                self.trend_window.append_data(data)
+            else:
+                self.open_trend_window(data)
+        except RuntimeError:
+            self.trend_window = None
+
     def on_trends_ready(self, data):
         print("DEBUG: on_trends_ready called")
         self.btn_trends.setEnabled(True)
         
-        if not data:
+        if data is None or data.is_empty():
+            self.close_trend_window()
             QMessageBox.warning(self, "No Data", "No historical data found for this period (possibly due to clouds).")
             self.lbl_status.setText("Trend Generation Failed (No Data).")
             return
 
         self.lbl_status.setText("Trend Graphs Generated.")
+        self.current_analysis_memory['trend'] = data
         
+        if getattr(self, 'trend_window_dismissed', False):
+            self.lbl_status.setText("Trend data loaded (window closed). Use 'Generate Trend Graphs' to view it.")
+            return
+
         try:
-            # Cleanup previous window if exists
-            if hasattr(self, 'trend_window') and self.trend_window is not None:
+            # Window already streamed the chunks, just draw the final series
+            if getattr(self, 'trend_window', None) is not None:
                 try:
-                    self.trend_window.close()
-                    self.trend_window.deleteLater()
+                    self.trend_window.set_data(data)
+                    return
                 except RuntimeError:
-                    pass
-                self.trend_window = None
+                    self.trend_window = None
 
             # Use the new Dialog
-            print("DEBUG: Creating TrendGraphDialog...")
-            colors = self.current_analysis_memory["classification"].get('legend_colors', {})
-            self.trend_window = TrendGraphDialog(data, colors, self)
-            print("DEBUG: Showing TrendGraphDialog...")
-            self.trend_window.show() # Modeless
-            # or self.trend_window.exec_() # Modal
+            self.open_trend_window(data)
         except Exception as e:
             QMessageBox.warning(self, "Plot Error", str(e))
 
+    def open_trend_window(self, data):
+        print("DEBUG: Creating TrendGraphDialog...")
+        colors = self.current_analysis_memory["classification"].get('legend_colors', {})
+        self.trend_window = TrendGraphDialog(data, colors, self)
+        self.trend_window.compare_requested.connect(self.generate_trend_comparison)
+        window = self.trend_window
+        self.trend_window.destroyed.connect(lambda _=None: self.on_trend_window_destroyed(window))
+        print("DEBUG: Showing TrendGraphDialog...")
+        self.trend_window.show() # Modeless
+        # or self.trend_window.exec_() # Modal
+
+    def on_trend_window_destroyed(self, window):
+        """Forgets a trend window closed by the user (it deletes itself on close)."""
+        if getattr(self, 'trend_window', None) is window:
+            self.trend_window = None
+            if not self.btn_trends.isEnabled():
+                # Still loading: keep the remaining chunks out of a new window
+                self.trend_window_dismissed = True
+
+    def generate_trend_comparison(self):
+        """Loads the same window for the previous seasons (cached seasons are reused)."""
+        args = getattr(self, 'trend_args', None)
+        if not args:
+            return
+        self.lbl_status.setText("Loading previous seasons...")
+
+        self.compare_thread = QThread()
+        self.compare_worker = MultiYearTrendWorker(**args)
+        self.compare_worker.moveToThread(self.compare_thread)
+
+        self.compare_thread.started.connect(self.compare_worker.process)
+        self.compare_worker.status_signal.connect(lambda msg: self.lbl_status.setText(msg))
+        self.compare_worker.finished_signal.connect(self.on_trend_comparison_ready)
+        self.compare_worker.finished_signal.connect(self.compare_thread.quit)
+        self.compare_worker.finished_signal.connect(self.compare_worker.deleteLater)
+        self.compare_thread.finished.connect(self.compare_thread.deleteLater)
+        self.compare_worker.error_signal.connect(lambda e: (self.on_trend_comparison_ready(None),
+                                                           QMessageBox.critical(self, "Error", e),
+                                                           self.compare_thread.quit()))
+        self.compare_thread.start()
+
+    def on_trend_comparison_ready(self, multi):
+        if multi is not None:
+            self.lbl_status.setText("Season comparison ready.")
+        try:
+            if getattr(self, 'trend_window', None) is not None:
+                self.trend_window.set_comparison(multi)
+        except RuntimeError:
+            # Window was closed by the user while loading
+            self.trend_window = None
+
     def reset_interface(self):
         # 1. Remove Map Layers (Visuals)
         if hasattr(self, 'browser'):
-            self.browser.page().runJavaScript("removeSentinelLayer()")
+            self.map_bridge.call('removeLayer')
             
         # 2. Clear Engineer Data (Index Labels)
         for lbl in self.band_labels.values(): lbl.setText("---")
@@ -2086,7 +2383,8 @@ class NeoAgroApp(QMainWindow):
         # Dynamic keys from Engineer results (Health/Soil cards in Engineer mode)
         dynamic_keys = [
             "HealthFrame", "HealthScore", "HealthStage", "HealthHeader", "HealthLine",
-            "SoilFrame", "SoilScore", "SoilStage", "SoilHeader", "SoilLine"
+            "SoilFrame", "SoilScore", "SoilStage", "SoilHeader", "SoilLine",
+            "BaselineHeader", "BaselineText"
         ]
 
         for key, widget in self.index_labels.items():
@@ -2124,6 +2422,10 @@ class NeoAgroApp(QMainWindow):
             self.lbl_defor_change.setText("— %")
             self.lbl_defor_change.setStyleSheet("color: #9E9E9E; border: none;")
             self.lbl_defor_verdict.setText("")
+            self.lbl_defor_gross.setText("")
+            self.btn_change_map.hide()
+            self.btn_history.hide()
+            self.lbl_history.setText("")
 
         # 5. Hide Action Buttons
         if hasattr(self, 'rec_btn'): self.rec_btn.hide()
@@ -2163,6 +2465,9 @@ class NeoAgroApp(QMainWindow):
         self.lbl_weather_desc.setText(data['condition'])
         self.lbl_weather_icon.setText(data['icon'])
 
+        # Keep season metrics (GDD, water balance, heat stress) for recommendations
+        self.current_weather = data
+
     # ---- DEFORESTATION METHODS ----
 
     def trigger_deforestation_analysis(self):
@@ -2189,18 +2494,13 @@ class NeoAgroApp(QMainWindow):
 
         # Build EE geometry
         try:
-            if isinstance(geo, dict):
-                if 'geometry' in geo:
-                    ee_geometry = ee.Geometry(geo['geometry'])
-                else:
-                    ee_geometry = ee.Geometry(geo)
-            else:
-                ee_geometry = geo
+            ee_geometry = to_ee_geometry(geo)
         except Exception as e:
             self.lbl_defor_status.setText(f"Geometry error: {e}")
             return
 
-        self.defor_worker = DeforestationWorker(ee_geometry, mode, d1, d2)
+        field_hash = geometry_hash(geo) if isinstance(geo, dict) else None
+        self.defor_worker = DeforestationWorker(ee_geometry, mode, d1, d2, field_hash=field_hash)
         self.defor_worker.status_signal.connect(lambda msg: self.lbl_defor_status.setText(msg))
         self.defor_worker.error_signal.connect(lambda err: self.lbl_defor_status.setText(f"Error: {err}"))
         self.defor_worker.finished_signal.connect(self.on_deforestation_result)
@@ -2257,11 +2557,93 @@ class NeoAgroApp(QMainWindow):
             self.lbl_defor_verdict.setText("Insufficient data for comparison")
             self.lbl_defor_verdict.setStyleSheet("color: #666; border: none;")
 
+        # Gross loss / gain and largest class changes (transition matrix)
+        if data.get('transitions'):
+            lines = [f"Forest loss: {data['forest_loss_pct']:.1f}%   Forest gain: {data['forest_gain_pct']:.1f}%"]
+            for change_row in data.get('top_changes', []):
+                lines.append(f"{change_row['from']} → {change_row['to']}: {change_row['pct']:.1f}%")
+            self.lbl_defor_gross.setText("\n".join(lines))
+            self.btn_change_map.show()
+        else:
+            self.lbl_defor_gross.setText("")
+            self.btn_change_map.hide()
+
+        self.btn_history.show()
+        if self.current_analysis_memory.get('landcover_history'):
+            self.on_landcover_history(self.current_analysis_memory['landcover_history'])
+
         self.lbl_defor_status.setText("Analysis complete.")
         self.lbl_defor_status.setStyleSheet("color: #2E7D32; font-style: italic; font-size: 12px;")
         self.lbl_status.setText("Analysis Finished")
         self.lbl_status.setStyleSheet("color: #2E7D32; font-style: italic; font-size: 13px; margin-bottom: 15px;")
 
+    def show_change_map(self):
+        """Shows the forest change map (red: loss, green: gain, yellow: other change)."""
+        data = self.current_analysis_memory.get('deforestation') or {}
+        geo = self.current_analysis_memory.get("geometry")
+        if not data.get('transitions') or not geo:
+            return
+
+        cached_url = self.current_analysis_memory.get('change_url')
+        if cached_url:
+            self.map_bridge.call('addLayer', cached_url, 0.8)
+            return
+
+        ee_geometry = to_ee_geometry(geo)
+        field_hash = geometry_hash(geo) if isinstance(geo, dict) else None
+
+        self.btn_change_map.setEnabled(False)
+        self.lbl_defor_status.setText("Preparing change map...")
+        self.change_map_worker = ChangeMapWorker(ee_geometry, data['period1_year'], data['period2_year'],
+                                                 field_hash=field_hash)
+        self.change_map_worker.finished_signal.connect(self.on_change_map_ready)
+        self.change_map_worker.error_signal.connect(lambda err: (self.lbl_defor_status.setText(f"Error: {err}"),
+                                                                 self.btn_change_map.setEnabled(True)))
+        self.change_map_worker.start()
+
+    def on_change_map_ready(self, url):
+        self.btn_change_map.setEnabled(True)
+        self.current_analysis_memory['change_url'] = url
+        self.map_bridge.call('addLayer', url, 0.8)
+        self.lbl_defor_status.setText("Change map: red = forest loss, green = forest gain, yellow = other change.")
+
+    def trigger_landcover_history(self):
+        """Classifies the last seasons of the field and shows its crop rotation."""
+        geo = self.current_analysis_memory.get("geometry")
+        if not geo:
+            return
+        if self.current_analysis_memory.get('landcover_history'):
+            self.on_landcover_history(self.current_analysis_memory['landcover_history'])
+            return
+
+        ee_geometry = to_ee_geometry(geo)
+        field_hash = geometry_hash(geo) if isinstance(geo, dict) else None
+
+        self.btn_history.setEnabled(False)
+        self.lbl_history.setText("Loading land cover history...")
+        self.history_worker = LandCoverHistoryWorker(ee_geometry, field_hash=field_hash)
+        self.history_worker.status_signal.connect(lambda msg: self.lbl_history.setText(msg))
+        self.history_worker.finished_signal.connect(self.on_landcover_history)
+        self.history_worker.error_signal.connect(lambda err: (self.lbl_history.setText(f"Error: {err}"),
+                                                              self.btn_history.setEnabled(True)))
+        self.history_worker.start()
+
+    def on_landcover_history(self, history):
+        self.btn_history.setEnabled(True)
+        self.current_analysis_memory['landcover_history'] = history
+        stats = history.rotation_stats()
+        if not stats['dominant']:
+            self.lbl_history.setText("No classified seasons found for this field.")
+            return
+
+        lines = [f"{year}: {label}" for year, label in sorted(stats['dominant'].items())]
+        if stats['rotation_index'] is not None:
+            lines.append(f"Crop changes: {stats['changes']} (rotation index {stats['rotation_index']:.2f})")
+        lines.append(f"Longest monoculture: {stats['longest_monoculture']} years")
+        if stats['fallow_years']:
+            lines.append("Fallow years: " + ", ".join(str(y) for y in stats['fallow_years']))
+        self.lbl_history.setText("\n".join(lines))
+
             
 if __name__ == "__main__":
     # Global Exception Hook to catch silent crashes
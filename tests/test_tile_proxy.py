@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import requests
+from core import tile_proxy as tile_proxy_module
+from core.tile_proxy import TileProxy
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    # Stand-in tile server: counts requests per path, optionally holds them until released
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+        server.requested.set()
+        server.release.wait(5)
+        data = b'\x89PNG' + self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = Counter()
+    server.requested = threading.Event()
+    server.release = threading.Event()
+    server.release.set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    proxy = TileProxy()
+    assert proxy.start(cache_dir=str(tmp_path), max_bytes=1024 * 1024)
+    yield proxy
+    proxy.stop()
+
+
+def _template(upstream):
+    return f"http://127.0.0.1:{upstream.server_address[1]}/{{z}}/{{x}}/{{y}}"
+
+
+def _tile_url(local_template, z, x, y):
+    return local_template.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_cached_tile_is_served_without_upstream(proxy, upstream):
+    local = proxy.register_layer(_template(upstream), ('rgb', 'field', '2024-05-01'))
+    first = requests.get(_tile_url(local, 3, 4, 2), timeout=5)
+    second = requests.get(_tile_url(local, 3, 4, 2), timeout=5)
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content == b'\x89PNG/3/4/2'
+    assert first.headers['Content-Type'] == 'image/png'
+    assert upstream.hits['/3/4/2'] == 1
+
+    # A new map id for the same recipe reuses the cached tiles
+    again = proxy.register_layer(_template(upstream) + '?token=new', ('rgb', 'field', '2024-05-01'))
+    assert again == local
+    assert requests.get(_tile_url(again, 3, 4, 2), timeout=5).content == first.content
+    assert upstream.hits['/3/4/2'] == 1
+
+
+def test_concurrent_requests_share_one_download(proxy, upstream):
+    local = proxy.register_layer(_template(upstream), 'layer')
+    key = local.split('/tiles/')[1].split('/')[0]
+    upstream.release.clear()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(proxy.get_tile, key, 5, 10, 12) for _ in range(4)]
+        assert upstream.requested.wait(5)
+        time.sleep(0.1)  # Let every caller reach the in-flight download
+        upstream.release.set()
+        results = [f.result(timeout=5) for f in futures]
+
+    assert results == [b'\x89PNG/5/10/12'] * 4
+    assert upstream.hits['/5/10/12'] == 1
+    assert not proxy.inflight
+
+
+def test_neighbouring_tiles_are_prefetched(proxy, upstream):
+    local = proxy.register_layer(_template(upstream), 'layer')
+    key = local.split('/tiles/')[1].split('/')[0]
+    assert requests.get(_tile_url(local, 4, 0, 7), timeout=5).status_code == 200
+
+    # x wraps around the antimeridian
+    ring = [(x, y) for y in (6, 7, 8) for x in (15, 0, 1) if (x, y) != (0, 7)]
+    assert _wait_for(lambda: all(proxy.store.has(key, 4, x, y) for x, y in ring))
+    assert all(upstream.hits[f'/4/{x}/{y}'] == 1 for x, y in ring)
+
+    requests.get(_tile_url(local, 4, 1, 7), timeout=5)
+    assert upstream.hits['/4/1/7'] == 1
+    assert _wait_for(lambda: proxy.prefetch_pending == 0)
+
+
+def test_non_final_layers_expire(proxy, upstream, monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(tile_proxy_module.time, 'time', lambda: now[0])
+    recipe = ('class', 'field', 2026, 'product', None)
+
+    local = proxy.register_layer(_template(upstream), recipe, max_age=3600)
+    assert proxy.register_layer(_template(upstream), recipe, max_age=3600) == local
+    requests.get(_tile_url(local, 2, 1, 1), timeout=5)
+
+    now[0] += 3600
+    renewed = proxy.register_layer(_template(upstream), recipe, max_age=3600)
+    assert renewed != local
+    requests.get(_tile_url(renewed, 2, 1, 1), timeout=5)
+    assert upstream.hits['/2/1/1'] == 2
+
+    # Final layers keep their tiles
+    assert proxy.register_layer(_template(upstream), recipe) == proxy.register_layer(_template(upstream), recipe)
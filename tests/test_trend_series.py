@@ -0,0 +1,35 @@
+import numpy as np
+from core.trend_series import TrendSeries, INDEX_NAMES
+
+
+def _means(value):
+    return [value] * len(INDEX_NAMES)
+
+
+def test_ids_sharing_a_label_are_averaged():
+    rows = [
+        {'date': '2024-05-01', 'groups': [[1] + _means(0.2), [5] + _means(0.6), [3] + _means(0.9)]},
+        {'date': '2024-05-06', 'groups': [[1] + _means(0.4)]},
+    ]
+    series = TrendSeries.from_rows(rows, {'1': 'Grain', '5': 'Grain', '3': 'Orchard'})
+
+    assert series.classes == ['Grain', 'Orchard']
+    np.testing.assert_allclose(series.get('Grain', 'NDVI'), [0.4, 0.4], rtol=1e-6)
+    np.testing.assert_allclose(series.get('Orchard', 'NDVI'), [0.9, np.nan], rtol=1e-6)
+
+
+def test_merged_ids_skip_gaps():
+    rows = [{'date': '2024-05-01', 'groups': [[1] + _means(0.3), [5] + _means(None), [7] + _means(0.0)]},
+            {'date': '2024-05-06', 'groups': [[7] + _means(0.0)]}]
+    series = TrendSeries.from_rows(rows, {'1': 'Grain', '5': 'Grain', '7': 'Grain'})
+
+    # NaN and legacy 0.0 gaps do not pull the mean down; a date with only a gap keeps it
+    np.testing.assert_allclose(series.get('Grain', 'NDVI'), [0.3, 0.0], rtol=1e-6)
+
+
+def test_distinct_labels_keep_separate_rows():
+    rows = [{'date': '2024-05-01', 'groups': [[1] + _means(0.2), [5] + _means(0.6)]}]
+    series = TrendSeries.from_rows(rows)
+
+    assert series.classes == ['Class 1', 'Class 5']
+    np.testing.assert_allclose(series.values[:, 0, 0], [0.2, 0.6], rtol=1e-6)